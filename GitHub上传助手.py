@@ -15,7 +15,98 @@ from pathlib import Path
 import threading
 from datetime import datetime
 
+from projects.delta_sync import DeltaSync
+from projects.gitignore import GitIgnore
+from projects.remote_push import AUTH_AGENT, AUTH_TOKEN, RemoteGitPipeline
+from projects.git_pipeline import (GitCommandError, GitUploadPipeline, PrePushError, UploadJob,
+                                   LARGE_FILE_ABORT, LARGE_FILE_EXCLUDE, LARGE_FILE_LFS)
+from monitor.log_sink import BatchedLogSink
+from monitor.logging_setup import setup_logging, install_gui_handler
+
+# 上传前写入项目的.gitignore
+GITIGNORE_TEMPLATE = """# Python
+__pycache__/
+*.py[cod]
+*$py.class
+*.so
+.Python
+build/
+develop-eggs/
+dist/
+downloads/
+eggs/
+.eggs/
+lib/
+lib64/
+parts/
+sdist/
+var/
+wheels/
+*.egg-info/
+.installed.cfg
+*.egg
+
+# Virtual Environment
+venv/
+env/
+ENV/
+
+# IDE
+.vscode/
+.idea/
+*.swp
+*.swo
+
+# Logs
+logs/
+*.log
+
+# Temporary files
+*.tmp
+*.temp
+.DS_Store
+Thumbs.db
+
+# Large files
+*.tar.gz
+*.zip
+*.7z
+
+# Model files
+*.pth
+*.pt
+*.ckpt
+*.model
+
+# Data files
+datasets/
+data/
+results/
+checkpoints/
+wandb/
+
+# Backup files
+backups/
+*.backup
+"""
+
 class GitHubUploadHelper:
+    # 文件预览每个目录最多显示的条目数
+    PREVIEW_PAGE_SIZE = 500
+    
+    # 推送方式：本地推送需要先下载项目，服务器推送直接在服务器上提交并推送
+    PUSH_MODES = {
+        "本地推送": None,
+        "服务器推送(令牌)": AUTH_TOKEN,
+        "服务器推送(SSH代理)": AUTH_AGENT
+    }
+    
+    LARGE_FILE_ACTIONS = {
+        "排除不上传": LARGE_FILE_EXCLUDE,
+        "使用Git LFS": LARGE_FILE_LFS,
+        "中止上传": LARGE_FILE_ABORT
+    }
+    
     def __init__(self, root):
         self.root = root
         self.root.title("📤 GitHub上传助手")
@@ -40,6 +131,12 @@ class GitHubUploadHelper:
         # SSH管理器（从主程序导入）
         self.ssh_manager = None
         
+        # 文件预览：树节点 -> 尚未展开的目录
+        self._preview_paths = {}
+        self._preview_generation = 0
+        self._preview_root = None
+        self._preview_ignore = GitIgnore()
+        
         self.setup_ui()
     
     def setup_ui(self):
@@ -96,13 +193,30 @@ class GitHubUploadHelper:
         self.git_email_var = tk.StringVar()
         ttk.Entry(git_frame, textvariable=self.git_email_var, width=20).grid(row=1, column=1, pady=2, padx=(5, 0))
         
+        # 超过GitHub单文件上限(100MB)的文件的处理方式
+        ttk.Label(git_frame, text="大文件:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.large_file_var = tk.StringVar(value="排除不上传")
+        ttk.Combobox(git_frame, textvariable=self.large_file_var, values=list(self.LARGE_FILE_ACTIONS),
+                     state="readonly", width=17).grid(row=2, column=1, pady=2, padx=(5, 0))
+        
+        ttk.Label(git_frame, text="推送方式:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.push_mode_var = tk.StringVar(value="本地推送")
+        ttk.Combobox(git_frame, textvariable=self.push_mode_var, values=list(self.PUSH_MODES),
+                     state="readonly", width=17).grid(row=3, column=1, pady=2, padx=(5, 0))
+        
+        # 增量同步：只下载有变化的文件，本地目录需保留上次下载的内容
+        self.delta_sync_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(left_frame, text="增量同步（只下载变化的文件）",
+                        variable=self.delta_sync_var).grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+        
         # 操作按钮
         button_frame = ttk.Frame(left_frame)
-        button_frame.grid(row=5, column=0, columnspan=2, pady=(20, 0))
+        button_frame.grid(row=6, column=0, columnspan=2, pady=(20, 0))
         
         ttk.Button(button_frame, text="📥 从服务器下载", command=self.download_from_server).grid(row=0, column=0, padx=(0, 5))
         ttk.Button(button_frame, text="📤 上传到GitHub", command=self.upload_to_github).grid(row=0, column=1, padx=5)
         ttk.Button(button_frame, text="🔄 完整流程", command=self.full_upload_process).grid(row=0, column=2, padx=(5, 0))
+        ttk.Button(button_frame, text="📦 批量上传", command=self.upload_all_to_github).grid(row=1, column=0, columnspan=3, pady=(5, 0))
         
         # 右侧：文件预览和日志
         right_frame = ttk.Frame(main_frame)
@@ -114,6 +228,7 @@ class GitHubUploadHelper:
         
         self.file_tree = ttk.Treeview(preview_frame, height=15)
         self.file_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.file_tree.bind("<<TreeviewOpen>>", self.on_preview_open)
         
         tree_scroll = ttk.Scrollbar(preview_frame, orient="vertical", command=self.file_tree.yview)
         tree_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
@@ -148,6 +263,11 @@ class GitHubUploadHelper:
         # 设置默认值
         self.local_path_var.set(str(Path.home() / "Downloads" / "github_upload"))
         
+        # 日志批量刷新到界面，完整日志写入文件
+        self.log_sink = BatchedLogSink(self.root, lambda: self.log_text,
+                                       log_file="logs/github_upload.log", timestamp=True)
+        self.log_sink.start()
+        
         # 初始化日志
         self.log("🎉 GitHub上传助手已启动")
         self.log("💡 使用说明:")
@@ -157,11 +277,8 @@ class GitHubUploadHelper:
         self.log("")
     
     def log(self, message):
-        """添加日志消息"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update()
+        """添加日志消息（可在任意线程调用）"""
+        self.log_sink.write(message)
     
     def on_project_select(self, event=None):
         """项目选择事件"""
@@ -202,6 +319,8 @@ class GitHubUploadHelper:
             messagebox.showerror("错误", "请填写完整的路径信息")
             return
         
+        delta_sync = self.delta_sync_var.get()
+        
         def download_task():
             try:
                 self.log(f"📥 开始从服务器下载项目: {project_name}")
@@ -213,6 +332,15 @@ class GitHubUploadHelper:
                 # 获取排除模式
                 exclude_patterns = self.github_repos.get(project_name, {}).get('exclude_patterns', [])
                 
+                if delta_sync:
+                    stats = DeltaSync(self.ssh_manager, exclude_patterns).sync(server_path, local_project_path)
+                    if not stats["success"]:
+                        self.log("❌ 增量同步失败")
+                        return False
+                    self.root.after(0, self.update_file_preview, local_project_path)
+                    self.log(f"✅ 项目同步完成: {local_project_path}")
+                    return True
+                
                 # 创建tar排除选项
                 exclude_options = ""
                 for pattern in exclude_patterns:
@@ -251,7 +379,7 @@ class GitHubUploadHelper:
                 self.ssh_manager.execute_command(f"rm -f {remote_tar_path}")
                 
                 # 更新文件预览
-                self.update_file_preview(local_project_path)
+                self.root.after(0, self.update_file_preview, local_project_path)
                 
                 self.log(f"✅ 项目下载完成: {local_project_path}")
                 return True
@@ -278,78 +406,103 @@ class GitHubUploadHelper:
             messagebox.showerror("错误", "请填写Git用户信息")
             return
         
+        auth = self.PUSH_MODES.get(self.push_mode_var.get())
+        if auth:
+            # 服务器推送：直接使用服务器上的项目目录
+            if not self.ssh_manager or not self.ssh_manager.is_connected():
+                messagebox.showerror("错误", "请先在主程序中连接服务器")
+                return
+            server_path = self.server_path_var.get().strip()
+            if not server_path:
+                messagebox.showerror("错误", "请填写服务器路径")
+                return
+            token = None
+            if auth == AUTH_TOKEN:
+                # 令牌只在本次推送中使用，不保存
+                token = os.environ.get("GITHUB_TOKEN") or simpledialog.askstring(
+                    "GitHub令牌", "请输入GitHub访问令牌（仅用于本次推送）:", show="*", parent=self.root)
+                if not token:
+                    return
+            job = UploadJob(project_name, server_path, repo_url, git_user, git_email)
+            pipeline = RemoteGitPipeline(self.ssh_manager, auth, token, gitignore=GITIGNORE_TEMPLATE,
+                                         large_file_action=self._large_file_action())
+        else:
+            job = UploadJob(project_name, Path(local_path) / project_name, repo_url, git_user, git_email)
+            pipeline = self._upload_pipeline()
+        
         def upload_task():
+            where = "（在服务器上推送）" if auth else ""
+            self.log(f"📤 开始上传到GitHub{where}: {repo_url}")
             try:
-                project_path = Path(local_path) / project_name
-                
-                if not project_path.exists():
-                    self.log(f"❌ 本地项目不存在: {project_path}")
-                    return False
-                
-                self.log(f"📤 开始上传到GitHub: {repo_url}")
-                
-                # 进入项目目录
-                os.chdir(project_path)
-                
-                # 配置Git用户信息
-                self.log("🔧 配置Git用户信息...")
-                subprocess.run(["git", "config", "user.name", git_user], check=True)
-                subprocess.run(["git", "config", "user.email", git_email], check=True)
-                
-                # 检查是否已经是Git仓库
-                if not (project_path / ".git").exists():
-                    self.log("🆕 初始化Git仓库...")
-                    subprocess.run(["git", "init"], check=True)
-                    subprocess.run(["git", "remote", "add", "origin", repo_url], check=True)
-                else:
-                    self.log("🔍 检查远程仓库...")
-                    # 检查远程仓库URL
-                    result = subprocess.run(["git", "remote", "get-url", "origin"], 
-                                          capture_output=True, text=True)
-                    if result.returncode == 0:
-                        current_url = result.stdout.strip()
-                        if current_url != repo_url:
-                            self.log("🔄 更新远程仓库URL...")
-                            subprocess.run(["git", "remote", "set-url", "origin", repo_url], check=True)
-                    else:
-                        subprocess.run(["git", "remote", "add", "origin", repo_url], check=True)
-                
-                # 创建.gitignore文件
-                self.create_gitignore(project_path)
-                
-                # 添加所有文件
-                self.log("📝 添加文件到Git...")
-                subprocess.run(["git", "add", "."], check=True)
-                
-                # 提交
-                commit_message = f"Upload {project_name} from server - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                self.log("💾 提交更改...")
-                subprocess.run(["git", "commit", "-m", commit_message], check=True)
-                
-                # 推送到GitHub
-                self.log("🚀 推送到GitHub...")
-                # 首次推送可能需要设置upstream
-                result = subprocess.run(["git", "push", "-u", "origin", "main"], 
-                                      capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    # 尝试推送到master分支
-                    self.log("🔄 尝试推送到master分支...")
-                    subprocess.run(["git", "push", "-u", "origin", "master"], check=True)
-                
-                self.log(f"✅ 上传完成: {repo_url}")
-                messagebox.showinfo("成功", f"项目已成功上传到GitHub！\n\n仓库地址:\n{repo_url}")
-                return True
-                
-            except subprocess.CalledProcessError as e:
+                branch = pipeline.upload(job, self._report_upload_progress)
+            except FileNotFoundError as e:
+                self.log(f"❌ {e}")
+                return False
+            except PrePushError as e:
+                self.log(f"🛑 推送前检查未通过: {e}")
+                return False
+            except GitCommandError as e:
                 self.log(f"❌ Git命令执行失败: {e}")
                 return False
             except Exception as e:
                 self.log(f"❌ 上传出错: {e}")
                 return False
+            
+            self.log(f"✅ 上传完成: {repo_url} ({branch})")
+            self.root.after(0, lambda: messagebox.showinfo(
+                "成功", f"项目已成功上传到GitHub！\n\n仓库地址:\n{repo_url}"))
+            return True
         
         threading.Thread(target=upload_task, daemon=True).start()
     
+    def upload_all_to_github(self):
+        """把本地目录中已下载的所有预设项目同时上传到各自的仓库"""
+        local_path = self.local_path_var.get().strip()
+        git_user = self.git_user_var.get().strip()
+        git_email = self.git_email_var.get().strip()
+        
+        if not all([local_path, git_user, git_email]):
+            messagebox.showerror("错误", "请填写本地目录和Git用户信息")
+            return
+        
+        jobs = [UploadJob(name, Path(local_path) / name, config['url'], git_user, git_email)
+                for name, config in self.github_repos.items()
+                if (Path(local_path) / name).exists()]
+        if not jobs:
+            messagebox.showerror("错误", "本地目录中没有已下载的项目")
+            return
+        
+        def report_result(job, error):
+            if error:
+                self.log(f"❌ {job.project_name}: 上传失败")
+            else:
+                self.log(f"✅ {job.project_name}: 上传完成")
+        
+        def upload_task():
+            self.log(f"📦 开始批量上传 {len(jobs)} 个项目...")
+            results = self._upload_pipeline().upload_many(jobs, self._report_upload_progress, report_result)
+            failed = [name for name, error in results.items() if error]
+            self.log(f"🏁 批量上传结束: {len(results) - len(failed)}/{len(results)} 成功")
+            if failed:
+                self.root.after(0, lambda: messagebox.showwarning(
+                    "部分失败", "以下项目上传失败，详见日志:\n" + "\n".join(failed)))
+        
+        threading.Thread(target=upload_task, daemon=True).start()
+    
+    def _large_file_action(self):
+        return self.LARGE_FILE_ACTIONS.get(self.large_file_var.get(), LARGE_FILE_EXCLUDE)
+    
+    def _upload_pipeline(self):
+        return GitUploadPipeline(max_workers=3, prepare=self.create_gitignore,
+                                 large_file_action=self._large_file_action())
+    
+    def _report_upload_progress(self, job, stage, percent=None):
+        """上传进度回调（在工作线程中调用），推送进度每25%记录一次"""
+        if percent is None:
+            self.log(f"🔧 {job.project_name}: {stage}")
+        elif percent % 25 == 0:
+            self.log(f"🚀 {job.project_name}: {stage} {percent}%")
+    
     def full_upload_process(self):
         """完整的上传流程"""
         if not self.ssh_manager or not self.ssh_manager.is_connected():
@@ -361,6 +514,16 @@ class GitHubUploadHelper:
             messagebox.showerror("错误", "请选择要上传的项目")
             return
         
+        if self.PUSH_MODES.get(self.push_mode_var.get()):
+            # 服务器推送不经过本机，不需要先下载
+            if messagebox.askyesno("确认上传",
+                f"确定要在服务器上直接提交并推送吗？\n\n"
+                f"项目: {project_name}\n"
+                f"服务器路径: {self.server_path_var.get()}\n"
+                f"仓库: {self.repo_url_var.get()}"):
+                self.upload_to_github()
+            return
+        
         # 确认操作
         if not messagebox.askyesno("确认上传", 
             f"确定要执行完整的上传流程吗？\n\n"
@@ -404,107 +567,90 @@ class GitHubUploadHelper:
     
     def create_gitignore(self, project_path):
         """创建.gitignore文件"""
-        gitignore_content = """# Python
-__pycache__/
-*.py[cod]
-*$py.class
-*.so
-.Python
-build/
-develop-eggs/
-dist/
-downloads/
-eggs/
-.eggs/
-lib/
-lib64/
-parts/
-sdist/
-var/
-wheels/
-*.egg-info/
-.installed.cfg
-*.egg
-
-# Virtual Environment
-venv/
-env/
-ENV/
-
-# IDE
-.vscode/
-.idea/
-*.swp
-*.swo
-
-# Logs
-logs/
-*.log
-
-# Temporary files
-*.tmp
-*.temp
-.DS_Store
-Thumbs.db
-
-# Large files
-*.tar.gz
-*.zip
-*.7z
-
-# Model files
-*.pth
-*.pt
-*.ckpt
-*.model
-
-# Data files
-datasets/
-data/
-results/
-checkpoints/
-wandb/
-
-# Backup files
-backups/
-*.backup
-"""
         gitignore_path = project_path / ".gitignore"
         with open(gitignore_path, 'w', encoding='utf-8') as f:
-            f.write(gitignore_content)
+            f.write(GITIGNORE_TEMPLATE)
         
         self.log("📝 已创建.gitignore文件")
     
     def update_file_preview(self, project_path):
-        """更新文件预览"""
+        """更新文件预览（在界面线程调用）：只列出第一级，展开目录时再读取，文件数在后台统计"""
         # 清空现有内容
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
+        self._preview_paths = {}
+        self._preview_generation += 1
         
-        def add_directory(parent_id, dir_path, level=0):
-            if level > 3:  # 限制显示深度
-                return
-            
-            try:
-                for item in sorted(dir_path.iterdir()):
-                    if item.name.startswith('.') and item.name not in ['.gitignore', '.github']:
+        project_path = Path(project_path)
+        if not project_path.exists():
+            return
+        
+        self._preview_root = project_path
+        self._preview_ignore = GitIgnore.from_file(project_path / ".gitignore")
+        self._populate_preview("", project_path)
+        
+        generation = self._preview_generation
+        threading.Thread(target=self._count_preview_files, args=(project_path, generation),
+                         daemon=True).start()
+    
+    def _preview_entries(self, dir_path):
+        """目录下需要显示的条目（目录在前），跳过隐藏文件和.gitignore忽略的内容"""
+        entries = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.name.startswith('.') and entry.name not in ['.gitignore', '.github']:
                         continue
-                    
-                    item_id = self.file_tree.insert(parent_id, "end", text=item.name)
-                    
-                    if item.is_dir() and level < 3:
-                        add_directory(item_id, item, level + 1)
-            except PermissionError:
-                pass
-        
-        if project_path.exists():
-            add_directory("", project_path)
-            self.log(f"📂 文件预览已更新: {len(list(project_path.rglob('*')))} 个文件")
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    rel_path = Path(entry.path).relative_to(self._preview_root).as_posix()
+                    if self._preview_ignore.match(rel_path, is_dir):
+                        continue
+                    entries.append((not is_dir, entry.name, is_dir))
+        except OSError:
+            pass
+        return sorted(entries)
+    
+    def _populate_preview(self, parent_id, dir_path):
+        entries = self._preview_entries(dir_path)
+        for _, name, is_dir in entries[:self.PREVIEW_PAGE_SIZE]:
+            item_id = self.file_tree.insert(parent_id, "end", text=f"📁 {name}" if is_dir else name)
+            if is_dir:
+                self._preview_paths[item_id] = Path(dir_path) / name
+                # 占位子节点，让目录显示展开标记，展开时再读取真实内容
+                self.file_tree.insert(item_id, "end", text="…")
+        if len(entries) > self.PREVIEW_PAGE_SIZE:
+            self.file_tree.insert(parent_id, "end",
+                                  text=f"… 还有 {len(entries) - self.PREVIEW_PAGE_SIZE} 项未显示")
+    
+    def on_preview_open(self, event=None):
+        """展开目录节点时读取其内容（每个节点只读取一次）"""
+        item_id = self.file_tree.focus()
+        dir_path = self._preview_paths.pop(item_id, None)
+        if dir_path is None:
+            return
+        self.file_tree.delete(*self.file_tree.get_children(item_id))
+        self._populate_preview(item_id, dir_path)
+    
+    def _count_preview_files(self, project_path, generation):
+        """后台统计未被忽略的文件数，预览已刷新时放弃"""
+        ignore = self._preview_ignore
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(project_path):
+            if generation != self._preview_generation:
+                return
+            rel_dir = Path(dirpath).relative_to(project_path).as_posix()
+            prefix = "" if rel_dir == "." else rel_dir + "/"
+            dirnames[:] = [d for d in dirnames if d != ".git" and not ignore.match(prefix + d, True)]
+            count += sum(1 for f in filenames if not ignore.match(prefix + f))
+        if generation == self._preview_generation:
+            self.log(f"📂 文件预览已更新: {count} 个文件（不含.gitignore忽略的内容）")
 
 def main():
     """主函数"""
+    setup_logging()
     root = tk.Tk()
     app = GitHubUploadHelper(root)
+    install_gui_handler(app.log_sink.display)
     
     # 如果是作为独立程序运行，显示提示
     app.log("⚠️ 独立运行模式")
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+备份归档的成员索引
+备份时为每个 .tar.gz 生成旁路索引文件 <备份名>.index.json，记录每个成员的
+路径、大小、类型和在解压后tar流中的偏移，浏览备份时只读索引，不用解压归档。
+
+gzip流无法随机定位，选择性恢复时仍需在本地从头解压到最后一个需要的成员为止，
+但只有匹配的成员会被重新打包上传到服务器
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".index.json"
+
+_TYPE_NAMES = {
+    tarfile.REGTYPE: "file",
+    tarfile.AREGTYPE: "file",
+    tarfile.DIRTYPE: "dir",
+    tarfile.SYMTYPE: "symlink",
+    tarfile.LNKTYPE: "hardlink"
+}
+
+
+def backup_stem(backup_file):
+    """备份文件名去掉 .tar.gz 后缀"""
+    name = Path(backup_file).name
+    for suffix in (".tar.gz", ".tgz", ".tar"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(backup_file).stem
+
+
+def index_path(backup_file):
+    """备份文件对应的索引文件路径"""
+    backup_file = Path(backup_file)
+    return backup_file.with_name(backup_stem(backup_file) + INDEX_SUFFIX)
+
+
+class HashingReader:
+    """包装二进制文件对象，读取时同步计算sha256，可选按令牌桶限速"""
+
+    def __init__(self, fileobj, bucket=None):
+        self.fileobj = fileobj
+        self.bucket = bucket
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        if data:
+            if self.bucket:
+                self.bucket.consume(len(data))
+            self.digest.update(data)
+            self.bytes_read += len(data)
+        return data
+
+    def drain(self, chunk_size=1024 * 1024):
+        """读完剩余数据（tar结束块、gzip尾部），使摘要覆盖整个文件"""
+        while self.read(chunk_size):
+            pass
+        return self.digest.hexdigest()
+
+
+def build_index(backup_file):
+    """顺序读取一遍归档生成索引并保存，同时计算整个文件的sha256，返回索引字典"""
+    backup_file = Path(backup_file)
+    members = []
+    total_size = 0
+    with open(backup_file, 'rb') as raw:
+        reader = HashingReader(raw)
+        with tarfile.open(fileobj=reader, mode="r|*") as tar:
+            for member in tar:
+                members.append({
+                    "name": member.name,
+                    "type": _TYPE_NAMES.get(member.type, "other"),
+                    "size": member.size,
+                    "mode": member.mode,
+                    "mtime": member.mtime,
+                    "offset": member.offset,
+                    "offset_data": member.offset_data,
+                    "linkname": member.linkname or None
+                })
+                total_size += member.size
+        sha256 = reader.drain()
+
+    index = {
+        "version": INDEX_VERSION,
+        "archive": backup_file.name,
+        "archive_size": os.path.getsize(backup_file),
+        "sha256": sha256,
+        "created_at": datetime.now().isoformat(),
+        "member_count": len(members),
+        "total_size": total_size,
+        "members": members
+    }
+    with open(index_path(backup_file), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    return index
+
+
+def load_index(backup_file, build=True):
+    """读取索引，索引缺失或与归档大小不符时按需重建"""
+    path = index_path(backup_file)
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get("archive_size") == os.path.getsize(backup_file):
+                return index
+        except (OSError, ValueError):
+            pass
+    return build_index(backup_file) if build else None
+
+
+def _strip_root(name):
+    """去掉归档内的项目目录前缀，便于用项目内的相对路径匹配"""
+    parts = name.split("/", 1)
+    return parts[1] if len(parts) > 1 else ""
+
+
+def member_matches(name, patterns):
+    """
+    判断成员是否匹配任一模式，模式可以是：
+        精确路径   myproj/config/settings.yaml 或 config/settings.yaml
+        目录       config（匹配目录下所有内容）
+        通配符     *.yaml、config/*.json
+    """
+    candidates = [name.rstrip("/"), _strip_root(name).rstrip("/")]
+    for pattern in patterns:
+        pattern = pattern.strip().rstrip("/")
+        if not pattern:
+            continue
+        for candidate in candidates:
+            if not candidate:
+                continue
+            if candidate == pattern or candidate.startswith(pattern + "/"):
+                return True
+            if fnmatch.fnmatchcase(candidate, pattern):
+                return True
+    return False
+
+
+def select_members(index, patterns):
+    """从索引中挑出匹配的成员，按归档内顺序返回"""
+    return [m for m in index["members"] if member_matches(m["name"], patterns)]
+
+
+def link_targets(members):
+    """选中的硬链接所指向、但本身未被选中的成员名（恢复时需要取它们的数据）"""
+    names = {m["name"] for m in members}
+    return {m["linkname"] for m in members
+            if m["type"] == "hardlink" and m.get("linkname") and m["linkname"] not in names}
+
+
+class _QueueWriter:
+    """tarfile写入端，把数据块放入有界队列，由生成器一侧取走"""
+
+    def __init__(self, chunks, stopped):
+        self.chunks = chunks
+        self.stopped = stopped
+
+    def write(self, data):
+        if data:
+            data = bytes(data)
+            while True:
+                if self.stopped.is_set():
+                    raise BrokenPipeError("读取端已停止")
+                try:
+                    self.chunks.put(data, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def stream_members(backup_file, names, targets=(), queue_size=16):
+    """
+    生成只包含指定成员的 tar.gz 数据流（bytes块迭代器）
+    读取到最后一个需要的成员后立即停止，不再解压归档的剩余部分
+    targets: 硬链接目标中未被选中的成员名（见 link_targets），它们的数据先暂存，
+    指向它们的硬链接以普通文件输出，否则远端解压时找不到链接目标
+    """
+    wanted = set(names)
+    chunks = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    done = object()
+    errors = []
+
+    def produce():
+        held = {}     # {硬链接目标名: (暂存的数据, 大小)}
+        try:
+            remaining = set(wanted)
+            with tarfile.open(backup_file, mode="r|*") as source, \
+                    tarfile.open(fileobj=_QueueWriter(chunks, stopped), mode="w|gz") as target:
+                for member in source:
+                    if member.name in targets and member.isreg() and member.name not in held:
+                        data = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+                        shutil.copyfileobj(source.extractfile(member), data)
+                        held[member.name] = (data, member.size)
+                    if member.name not in remaining:
+                        continue
+                    remaining.discard(member.name)
+                    if member.isreg():
+                        target.addfile(member, source.extractfile(member))
+                    elif member.islnk() and member.linkname in held:
+                        data, member.size = held[member.linkname]
+                        data.seek(0)
+                        member.type, member.linkname = tarfile.REGTYPE, ""
+                        target.addfile(member, data)
+                    else:
+                        target.addfile(member)
+                    if not remaining:
+                        break
+        except Exception as e:
+            if not stopped.is_set():
+                errors.append(e)
+        finally:
+            for data, _ in held.values():
+                data.close()
+            chunks.put(done)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        # 调用方提前放弃（如远端tar出错退出）时让生产线程尽快结束
+        stopped.set()
+        while worker.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    if errors:
+        raise errors[0]
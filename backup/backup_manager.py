@@ -8,9 +8,32 @@ import os
 import json
 import time
 import shutil
+import shlex
 from pathlib import Path
 from datetime import datetime
 
+from backup.archive_index import (backup_stem, build_index, index_path, link_targets,
+                                  load_index, select_members, stream_members)
+from backup.catalog import BackupCatalog
+from backup.retention import plan_retention
+from backup.scheduler import CronExpression
+from backup.verify import STATUS_CORRUPT, STATUS_MISSING, STATUS_OK, BackupScrubber, file_sha256
+from connect.transfer_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE
+from monitor.metrics import instrument
+
+
+def _ssh_host(self, *args, **kwargs):
+    """从 (…, ssh_manager, …) 参数中取出主机地址"""
+    ssh_manager = args[1] if len(args) > 1 else kwargs.get("ssh_manager")
+    return getattr(ssh_manager, "ip_address", None)
+
+
+def _info_file(backup_file):
+    """备份文件对应的信息文件 <备份名>.json"""
+    backup_file = Path(backup_file)
+    return backup_file.with_name(backup_stem(backup_file) + ".json")
+
+
 class BackupManager:
     def __init__(self, backup_dir="./backups"):
         self.backup_dir = Path(backup_dir)
@@ -19,6 +42,19 @@ class BackupManager:
         # 配置文件
         self.config_file = self.backup_dir / "backup_config.json"
         self.load_config()
+        
+        # 服务器上的项目根目录
+        self.project_root = self.config.get("project_root", "/home/shared/projects")
+        
+        # 备份目录数据库，首次使用时导入已有的信息文件
+        self.catalog = BackupCatalog(self.backup_dir / "catalog.db")
+        imported = self.catalog.import_sidecars(self.backup_dir)
+        if imported:
+            print(f"📚 已导入 {imported} 个已有备份到目录数据库")
+        # 在程序之外被删除的归档只在启动时清理一次，列表和统计都只查数据库
+        pruned = self.catalog.prune_missing()
+        if pruned:
+            print(f"🧹 目录数据库中移除了 {pruned} 个归档已不存在的备份")
     
     def load_config(self):
         """加载备份配置"""
@@ -34,6 +70,15 @@ class BackupManager:
                 ],
                 "max_backups": 10,
                 "compress": True,
+                "streaming_restore": True,
+                "parallel": {"max_in_flight": 4, "compress_per_host": 2, "nice": 10},
+                "verify": {"workers": 2, "rate": 50 * 1024 * 1024},
+                "retention": {
+                    "default": {"keep_last": 3, "hourly": 24, "daily": 7, "weekly": 4, "monthly": 12},
+                    "types": {},
+                    "projects": {},
+                    "storage_budget": None
+                },
                 "backup_types": {
                     "full": "完整备份 - 包含所有文件",
                     "code": "代码备份 - 只包含源代码",
@@ -48,11 +93,27 @@ class BackupManager:
         with open(self.config_file, 'w', encoding='utf-8') as f:
             json.dump(self.config, f, indent=2, ensure_ascii=False)
     
-    def backup_project(self, project_name, ssh_manager, backup_type="code"):
-        """备份指定项目"""
+    @instrument("backup.backup_project", host=_ssh_host)
+    def backup_project(self, project_name, ssh_manager, backup_type="code", priority=PRIORITY_BULK):
+        """备份指定项目，下载默认按批量传输排队，会给交互操作让路"""
         print(f"💾 开始备份项目: {project_name}")
         print(f"📦 备份类型: {backup_type}")
         
+        job = self.create_remote_archive(project_name, ssh_manager, backup_type)
+        if job is None:
+            return False
+        if not self.fetch_remote_archive(job, ssh_manager, priority):
+            return False
+        return self.register_backup(job)["verify_status"] == STATUS_OK
+    
+    # 备份分为三个阶段，便于 backup.parallel_runner 让不同项目的压缩和下载重叠进行
+    
+    def create_remote_archive(self, project_name, ssh_manager, backup_type="code", nice=None):
+        """
+        阶段一：在服务器上压缩项目到 /tmp，返回后续阶段使用的备份任务信息，失败返回None
+        nice不为None时以该nice值（并尽量配合ionice尽力级的最低优先级 -c2 -n7）运行tar，降低对服务器的影响；
+        不用空闲级(-c3)，磁盘持续繁忙时空闲级的tar可能一直得不到IO而超时
+        """
         # 生成备份名称
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_name = f"{project_name}_{backup_type}_{timestamp}"
@@ -61,63 +122,104 @@ class BackupManager:
         project_backup_dir = self.backup_dir / project_name
         project_backup_dir.mkdir(exist_ok=True)
         
-        backup_file = project_backup_dir / f"{backup_name}.tar.gz"
-        
         # 获取项目路径
-        remote_project_path = f"/home/shared/projects/{project_name}"
+        remote_project_path = f"{self.project_root}/{project_name}"
         
         # 检查项目是否存在
         if not ssh_manager.file_exists(remote_project_path):
             print(f"❌ 项目不存在: {remote_project_path}")
-            return False
+            return None
         
         # 根据备份类型创建排除规则
         exclude_rules = self._get_exclude_rules(backup_type)
         
         # 创建备份命令
         exclude_options = " ".join([f"--exclude='{pattern}'" for pattern in exclude_rules])
-        backup_cmd = f"cd /home/shared/projects && tar -czf /tmp/{backup_name}.tar.gz {exclude_options} {project_name}"
+        tar_cmd = f"tar -czf /tmp/{backup_name}.tar.gz {exclude_options} {project_name}"
+        if nice is not None:
+            tar_cmd = (f"IONICE=$(command -v ionice >/dev/null 2>&1 && echo 'ionice -c2 -n7'); "
+                       f"$IONICE nice -n {int(nice)} {tar_cmd}")
+        backup_cmd = f"cd {self.project_root} && {tar_cmd}"
         
         print(f"🔧 执行备份命令...")
         stdout, stderr, exit_status = ssh_manager.execute_command(backup_cmd, timeout=1800)  # 30分钟超时
         
         if exit_status != 0:
             print(f"❌ 备份创建失败: {stderr}")
-            return False
+            ssh_manager.execute_command(f"rm -f /tmp/{backup_name}.tar.gz")
+            return None
         
-        # 下载备份文件
+        return {
+            "project_name": project_name,
+            "backup_type": backup_type,
+            "timestamp": timestamp,
+            "backup_name": backup_name,
+            "exclude_rules": exclude_rules,
+            "remote_path": f"/tmp/{backup_name}.tar.gz",
+            "backup_file": project_backup_dir / f"{backup_name}.tar.gz"
+        }
+    
+    def fetch_remote_archive(self, job, ssh_manager, priority=PRIORITY_BULK):
+        """阶段二：下载服务器上的备份归档并删除远程临时文件"""
         print(f"📥 下载备份文件...")
-        remote_backup_path = f"/tmp/{backup_name}.tar.gz"
-        
-        if not ssh_manager.download_file(remote_backup_path, str(backup_file)):
-            print(f"❌ 备份文件下载失败")
-            return False
+        downloaded = ssh_manager.download_file(job["remote_path"], str(job["backup_file"]), priority)
         
         # 清理远程临时文件
-        ssh_manager.execute_command(f"rm -f {remote_backup_path}")
+        ssh_manager.execute_command(f"rm -f {job['remote_path']}")
+        
+        if not downloaded:
+            print(f"❌ 备份文件下载失败")
+        return downloaded
+    
+    def register_backup(self, job):
+        """
+        阶段三：生成索引和信息文件，登记到目录数据库并按策略清理旧备份，返回备份信息
+        归档损坏时 verify_status 为 corrupt，不清理旧备份，调用方应按备份失败处理
+        """
+        backup_file = job["backup_file"]
+        
+        # 生成成员索引，之后浏览和选择性恢复都不用再解压整个归档；
+        # 同一遍读取顺带算出sha256，能完整读完也说明归档没有截断
+        try:
+            index = build_index(backup_file)
+            sha256, verify_status = index["sha256"], STATUS_OK
+        except Exception as e:
+            print(f"⚠️ 生成备份索引失败，归档可能已损坏: {e}")
+            index = None
+            sha256, verify_status = file_sha256(backup_file), STATUS_CORRUPT
         
         # 创建备份信息文件
         backup_info = {
-            "project_name": project_name,
-            "backup_type": backup_type,
-            "timestamp": timestamp,
+            "project_name": job["project_name"],
+            "backup_type": job["backup_type"],
+            "timestamp": job["timestamp"],
             "backup_file": str(backup_file),
             "size": os.path.getsize(backup_file),
             "created_at": datetime.now().isoformat(),
-            "exclude_rules": exclude_rules
+            "exclude_rules": job["exclude_rules"],
+            "index_file": str(index_path(backup_file)) if index else None,
+            "member_count": index["member_count"] if index else None,
+            "sha256": sha256,
+            "verify_status": verify_status,
+            "verified_at": datetime.now().isoformat()
         }
         
-        info_file = project_backup_dir / f"{backup_name}.json"
+        info_file = _info_file(backup_file)
         with open(info_file, 'w', encoding='utf-8') as f:
             json.dump(backup_info, f, indent=2, ensure_ascii=False)
+        self.catalog.add(backup_info)
+        
+        if verify_status != STATUS_OK:
+            # 损坏的归档不能占用保留名额，否则清理时可能删掉最早的一个完好备份
+            print(f"❌ 项目备份失败，归档已登记为损坏（未清理旧备份）: {backup_file}")
+            return backup_info
         
         # 清理旧备份
-        self._cleanup_old_backups(project_name)
+        self._cleanup_old_backups(job["project_name"])
         
         print(f"✅ 项目备份完成: {backup_file}")
         print(f"📊 备份大小: {self._format_size(backup_info['size'])}")
-        
-        return True
+        return backup_info
     
     def _get_exclude_rules(self, backup_type):
         """根据备份类型获取排除规则"""
@@ -145,24 +247,23 @@ class BackupManager:
         
         return base_excludes
     
+    def project_fingerprint(self, project_name, ssh_manager, backup_type="code"):
+        """
+        项目内容指纹：按与备份相同的排除规则列出文件的路径/大小/修改时间并取md5，
+        GNU tar 输出到 /dev/null 时不读取文件内容，开销只有一次目录遍历
+        tar出错（如项目目录不存在）时返回None，不能把空列表的md5当作指纹
+        """
+        exclude_options = " ".join([f"--exclude='{pattern}'" for pattern in self._get_exclude_rules(backup_type)])
+        pipeline = (f"set -o pipefail; cd {self.project_root} && "
+                    f"tar -cvvf /dev/null --full-time {exclude_options} {project_name} | md5sum")
+        stdout, stderr, exit_status = ssh_manager.execute_command(f"bash -c {shlex.quote(pipeline)}", timeout=600)
+        if exit_status != 0 or not stdout:
+            return None
+        return stdout.split()[0]
+    
     def list_backups(self, project_name=None):
-        """列出备份"""
-        backups = []
-        
-        if project_name:
-            # 列出指定项目的备份
-            project_backup_dir = self.backup_dir / project_name
-            if project_backup_dir.exists():
-                backups.extend(self._scan_project_backups(project_name, project_backup_dir))
-        else:
-            # 列出所有项目的备份
-            for project_dir in self.backup_dir.iterdir():
-                if project_dir.is_dir() and project_dir.name != "." and not project_dir.name.startswith('.'):
-                    project_name = project_dir.name
-                    backups.extend(self._scan_project_backups(project_name, project_dir))
-        
-        # 按时间排序
-        backups.sort(key=lambda x: x['created_at'], reverse=True)
+        """列出备份（按时间倒序，来自目录数据库）"""
+        backups = self.catalog.list(project_name)
         
         if backups:
             print("📁 可用的备份:")
@@ -172,70 +273,62 @@ class BackupManager:
                 print(f"   📅 时间: {backup['timestamp']}")
                 print(f"   📊 大小: {self._format_size(backup['size'])}")
                 print(f"   📄 文件: {backup['backup_file']}")
+                if backup.get('verify_status') in (STATUS_CORRUPT, STATUS_MISSING):
+                    print(f"   ⚠️ 校验: {backup['verify_status']} {backup.get('verify_error') or ''}")
                 print("-" * 80)
         else:
             print("📭 没有找到备份文件")
         
         return backups
     
-    def _scan_project_backups(self, project_name, project_dir):
-        """扫描项目备份"""
-        backups = []
-        
-        for info_file in project_dir.glob("*.json"):
-            try:
-                with open(info_file, 'r', encoding='utf-8') as f:
-                    backup_info = json.load(f)
-                
-                # 检查备份文件是否存在
-                backup_file = Path(backup_info['backup_file'])
-                if backup_file.exists():
-                    backup_info['size'] = os.path.getsize(backup_file)
-                    backups.append(backup_info)
-                else:
-                    print(f"⚠️ 备份文件缺失: {backup_file}")
-                    
-            except Exception as e:
-                print(f"⚠️ 读取备份信息失败: {info_file}, {e}")
-        
-        return backups
-    
-    def restore_backup(self, backup_file, ssh_manager, restore_path=None):
-        """恢复备份"""
+    @instrument("backup.restore_backup", host=_ssh_host,
+                nbytes=lambda r, self, backup_file, *a, **k: os.path.getsize(backup_file))
+    def restore_backup(self, backup_file, ssh_manager, restore_path=None, priority=PRIORITY_INTERACTIVE,
+                       streaming=None):
+        """
+        恢复备份，上传默认按交互传输优先处理
+        streaming为True时把归档直接写入远端 tar -x 的stdin，边传边解压，不在/tmp落盘；
+        为None时取配置项 streaming_restore（默认开启）
+        """
         backup_file = Path(backup_file)
         if not backup_file.exists():
             print(f"❌ 备份文件不存在: {backup_file}")
             return False
         
-        # 获取备份信息
-        info_file = backup_file.with_suffix('.json')
-        if info_file.exists():
-            with open(info_file, 'r', encoding='utf-8') as f:
-                backup_info = json.load(f)
-            project_name = backup_info['project_name']
-        else:
-            # 从文件名推断项目名
-            parts = backup_file.stem.split('_')
-            project_name = parts[0] if parts else "unknown"
-        
         if restore_path is None:
-            restore_path = f"/home/shared/projects/{project_name}"
+            restore_path = f"{self.project_root}/{self._backup_project_name(backup_file)}"
+        if streaming is None:
+            streaming = self.config.get("streaming_restore", True)
         
         print(f"🔄 恢复备份: {backup_file.name}")
         print(f"📂 目标路径: {restore_path}")
         
+        # 创建恢复目录
+        restore_parent = str(Path(restore_path).parent)
+        ssh_manager.create_directory(restore_parent)
+        
+        if streaming:
+            print(f"📤 流式上传并解压...")
+            with open(backup_file, 'rb') as f:
+                stdout, stderr, exit_status = ssh_manager.execute_with_stdin(
+                    f"tar -xzf - -C {restore_parent}", f,
+                    priority=priority, size=os.path.getsize(backup_file))
+            
+            if exit_status != 0:
+                print(f"❌ 备份解压失败: {stderr}")
+                return False
+            
+            print(f"✅ 备份恢复完成: {restore_path}")
+            return True
+        
         # 上传备份文件
         remote_backup_path = f"/tmp/restore_{int(time.time())}.tar.gz"
         
         print(f"📤 上传备份文件...")
-        if not ssh_manager.upload_file(str(backup_file), remote_backup_path):
+        if not ssh_manager.upload_file(str(backup_file), remote_backup_path, priority):
             print(f"❌ 备份文件上传失败")
             return False
         
-        # 创建恢复目录
-        restore_parent = str(Path(restore_path).parent)
-        ssh_manager.create_directory(restore_parent)
-        
         # 解压备份
         print(f"📦 解压备份文件...")
         extract_cmd = f"cd {restore_parent} && tar -xzf {remote_backup_path}"
@@ -252,71 +345,150 @@ class BackupManager:
         print(f"✅ 备份恢复完成: {restore_path}")
         return True
     
+    def _backup_project_name(self, backup_file):
+        """从信息文件读取项目名，缺失时从文件名推断"""
+        info_file = _info_file(backup_file)
+        if info_file.exists():
+            with open(info_file, 'r', encoding='utf-8') as f:
+                return json.load(f)['project_name']
+        parts = backup_stem(backup_file).split('_')
+        return parts[0] if parts else "unknown"
+    
+    def browse_backup(self, backup_file, patterns=None):
+        """浏览备份内容（只读索引，不解压归档），可用路径/通配符过滤"""
+        backup_file = Path(backup_file)
+        if not backup_file.exists():
+            print(f"❌ 备份文件不存在: {backup_file}")
+            return []
+        
+        index = load_index(backup_file)
+        members = select_members(index, patterns) if patterns else index["members"]
+        
+        print(f"📦 {backup_file.name}: {len(members)}/{index['member_count']} 个条目")
+        for member in members:
+            marker = "📁" if member["type"] == "dir" else "📄"
+            print(f"   {marker} {member['name']}  {self._format_size(member['size'])}")
+        return members
+    
+    @instrument("backup.restore_members", host=_ssh_host)
+    def restore_members(self, backup_file, ssh_manager, patterns, restore_path=None,
+                        priority=PRIORITY_INTERACTIVE):
+        """
+        选择性恢复：只把匹配patterns的成员重新打包，直接流式写入远端tar
+        patterns可以是项目内路径、目录或通配符，见 backup.archive_index.member_matches
+        """
+        backup_file = Path(backup_file)
+        if not backup_file.exists():
+            print(f"❌ 备份文件不存在: {backup_file}")
+            return False
+        
+        index = load_index(backup_file)
+        members = select_members(index, patterns)
+        if not members:
+            print(f"❌ 备份中没有匹配的文件: {', '.join(patterns)}")
+            return False
+        
+        if restore_path is None:
+            restore_path = f"{self.project_root}/{self._backup_project_name(backup_file)}"
+        restore_parent = str(Path(restore_path).parent)
+        
+        selected_size = sum(m["size"] for m in members)
+        print(f"🔄 选择性恢复: {backup_file.name}")
+        print(f"📄 匹配 {len(members)} 个条目，共 {self._format_size(selected_size)}")
+        print(f"📂 目标路径: {restore_path}")
+        
+        ssh_manager.create_directory(restore_parent)
+        stdout, stderr, exit_status = ssh_manager.execute_with_stdin(
+            f"tar -xzf - -C {restore_parent}",
+            stream_members(backup_file, [m["name"] for m in members], link_targets(members)),
+            priority=priority, size=selected_size)
+        
+        if exit_status != 0:
+            print(f"❌ 选择性恢复失败: {stderr}")
+            return False
+        
+        print(f"✅ 已恢复 {len(members)} 个条目到: {restore_path}")
+        return True
+    
+    def verify_backups(self, project_name=None, test_decompress=False, background=False,
+                       on_result=None, on_done=None):
+        """
+        校验备份完整性，结果写入目录数据库的 verify_status
+        并行数和磁盘读取限速取配置项 verify: {"workers", "rate"}
+        background为True时在后台线程运行并立即返回线程
+        """
+        verify_config = self.config.get("verify", {})
+        scrubber = BackupScrubber(self, workers=verify_config.get("workers", 2),
+                                  rate=verify_config.get("rate", 50 * 1024 * 1024),
+                                  test_decompress=test_decompress)
+        if background:
+            return scrubber.start(project_name, on_result, on_done)
+        results = scrubber.run(project_name, on_result)
+        if on_done:
+            on_done(results)
+        return results
+    
+    def delete_backup(self, backup_file):
+        """删除备份归档及其信息文件、索引文件和目录记录"""
+        backup_file = Path(backup_file)
+        try:
+            for path in (backup_file, _info_file(backup_file), index_path(backup_file)):
+                if path.exists():
+                    path.unlink()
+            self.catalog.remove(backup_file)
+            return True
+        except Exception as e:
+            print(f"⚠️ 删除备份失败: {backup_file}, {e}")
+            return False
+    
+    def apply_retention(self, project_name=None, dry_run=False, policy=None):
+        """
+        按保留策略清理备份（见 backup.retention），dry_run时只输出计划不删除
+        project_name指定时只删除该项目的备份，存储预算仍按全部备份计算，超出部分从该项目中淘汰
+        """
+        policy = policy if policy is not None else self.config.get("retention", {})
+        plan = plan_retention(self.catalog.entries(), policy, project_name)
+        
+        title = "🧪 保留策略预演" if dry_run else "🧹 执行保留策略"
+        print(f"{title}: 保留 {len(plan['keep'])} 个，删除 {len(plan['delete'])} 个，"
+              f"释放 {self._format_size(plan['freed_size'])}")
+        for backup in plan['delete']:
+            reason = "超出存储预算" if backup['reason'] == "budget" else "不在保留时间段内"
+            print(f"   🗑️ {Path(backup['backup_file']).name} ({self._format_size(backup['size'])}, {reason})")
+        
+        if not dry_run:
+            for backup in plan['delete']:
+                self.delete_backup(backup['backup_file'])
+        return plan
+    
     def _cleanup_old_backups(self, project_name):
-        """清理旧备份"""
-        project_backup_dir = self.backup_dir / project_name
-        if not project_backup_dir.exists():
+        """清理旧备份：配置了retention时按保留策略，否则只保留最新的max_backups个"""
+        if self.config.get("retention"):
+            self.apply_retention(project_name)
             return
         
-        # 获取所有备份
-        backups = self._scan_project_backups(project_name, project_backup_dir)
-        
-        # 如果备份数量超过限制，删除最旧的
         max_backups = self.config.get("max_backups", 10)
-        if len(backups) > max_backups:
-            # 按时间排序，保留最新的
-            backups.sort(key=lambda x: x['created_at'], reverse=True)
-            
-            for backup in backups[max_backups:]:
-                try:
-                    backup_file = Path(backup['backup_file'])
-                    info_file = backup_file.with_suffix('.json')
-                    
-                    if backup_file.exists():
-                        backup_file.unlink()
-                    if info_file.exists():
-                        info_file.unlink()
-                    
-                    print(f"🗑️ 清理旧备份: {backup_file.name}")
-                    
-                except Exception as e:
-                    print(f"⚠️ 清理备份失败: {e}")
+        for backup in self.catalog.list(project_name, offset=max_backups):
+            if self.delete_backup(backup['backup_file']):
+                print(f"🗑️ 清理旧备份: {Path(backup['backup_file']).name}")
     
     def get_backup_statistics(self):
         """获取备份统计信息"""
-        stats = {
-            "total_backups": 0,
-            "total_size": 0,
-            "projects": {},
-            "backup_types": {}
-        }
-        
-        for project_dir in self.backup_dir.iterdir():
-            if project_dir.is_dir() and not project_dir.name.startswith('.'):
-                project_name = project_dir.name
-                project_backups = self._scan_project_backups(project_name, project_dir)
-                
-                project_stats = {
-                    "count": len(project_backups),
-                    "total_size": sum(b['size'] for b in project_backups),
-                    "latest": max(project_backups, key=lambda x: x['created_at'])['created_at'] if project_backups else None
-                }
-                
-                stats["projects"][project_name] = project_stats
-                stats["total_backups"] += project_stats["count"]
-                stats["total_size"] += project_stats["total_size"]
-                
-                # 统计备份类型
-                for backup in project_backups:
-                    backup_type = backup['backup_type']
-                    if backup_type not in stats["backup_types"]:
-                        stats["backup_types"][backup_type] = 0
-                    stats["backup_types"][backup_type] += 1
-        
-        return stats
+        return self.catalog.statistics()
     
-    def create_backup_schedule(self, project_name, schedule_type="daily", backup_type="code"):
-        """创建备份计划"""
+    def create_backup_schedule(self, project_name, schedule_type="daily", backup_type="code",
+                               cron=None, host=None):
+        """
+        创建备份计划，由 backup.scheduler.BackupScheduler 执行
+        cron为五段式表达式（如 "30 1 * * *"），不指定时按schedule_type取默认时间
+        """
+        if cron:
+            try:
+                CronExpression(cron)
+            except ValueError as e:
+                print(f"❌ 无效的cron表达式: {e}")
+                return False
+        
         schedule_file = self.backup_dir / "schedules.json"
         
         if schedule_file.exists():
@@ -332,6 +504,10 @@ class BackupManager:
             "last_backup": None,
             "created_at": datetime.now().isoformat()
         }
+        if cron:
+            schedules[project_name]["cron"] = cron
+        if host:
+            schedules[project_name]["host"] = host
         
         with open(schedule_file, 'w', encoding='utf-8') as f:
             json.dump(schedules, f, indent=2, ensure_ascii=False)
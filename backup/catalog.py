@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+备份目录数据库
+用SQLite记录所有备份，按项目、类型、时间建索引，列表/统计/保留策略查询不再逐个
+读取 *.json 信息文件和stat归档。每个备份的 <备份名>.json 信息文件仍然照常写入，
+数据库丢失时可以从这些文件重新导入
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from backup.archive_index import INDEX_SUFFIX
+
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    backup_file  TEXT NOT NULL UNIQUE,
+    project_name TEXT NOT NULL,
+    backup_type  TEXT NOT NULL,
+    timestamp    TEXT NOT NULL,
+    created_at   TEXT NOT NULL,
+    size         INTEGER NOT NULL DEFAULT 0,
+    verify_status TEXT,
+    info         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backups_project ON backups(project_name, created_at);
+CREATE INDEX IF NOT EXISTS idx_backups_type ON backups(backup_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_backups_created ON backups(created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 备份目录下不属于单个备份的JSON文件
+_NON_BACKUP_FILES = {"backup_config.json", "schedules.json"}
+
+
+class BackupCatalog:
+    """备份目录，线程安全"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._migrate()
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES('schema_version', ?)",
+                               (str(SCHEMA_VERSION),))
+
+    def _migrate(self):
+        """旧版数据库补齐新增的列"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(backups)")}
+        if "verify_status" not in columns:
+            self._conn.execute("ALTER TABLE backups ADD COLUMN verify_status TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_backups_verify ON backups(verify_status)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------- 写入 ----------
+
+    def add(self, backup_info):
+        """登记（或更新）一个备份，backup_info即写入 <备份名>.json 的内容"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO backups(backup_file, project_name, backup_type, timestamp,
+                                       created_at, size, verify_status, info)
+                   VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(backup_file) DO UPDATE SET
+                       project_name=excluded.project_name, backup_type=excluded.backup_type,
+                       timestamp=excluded.timestamp, created_at=excluded.created_at,
+                       size=excluded.size, verify_status=excluded.verify_status,
+                       info=excluded.info""",
+                (str(backup_info["backup_file"]), backup_info["project_name"],
+                 backup_info["backup_type"], backup_info["timestamp"],
+                 backup_info["created_at"], backup_info.get("size", 0),
+                 backup_info.get("verify_status"),
+                 json.dumps(backup_info, ensure_ascii=False)))
+
+    def update_info(self, backup_file, **fields):
+        """合并更新某个备份的信息字段，返回更新后的信息，备份不存在时返回None"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT info FROM backups WHERE backup_file = ?",
+                                     (str(backup_file),)).fetchone()
+            if row is None:
+                return None
+            info = json.loads(row["info"])
+            info.update(fields)
+            self._conn.execute("UPDATE backups SET info = ?, size = ?, verify_status = ? "
+                               "WHERE backup_file = ?",
+                               (json.dumps(info, ensure_ascii=False), info.get("size", 0),
+                                info.get("verify_status"), str(backup_file)))
+            return info
+
+    def remove(self, backup_file):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM backups WHERE backup_file = ?", (str(backup_file),))
+
+    # ---------- 查询 ----------
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, backup_file):
+        rows = self._query("SELECT info FROM backups WHERE backup_file = ?", (str(backup_file),))
+        return json.loads(rows[0]["info"]) if rows else None
+
+    def list(self, project_name=None, backup_type=None, limit=None, offset=0, verify_status=None):
+        """按时间倒序列出备份信息"""
+        conditions, params = [], []
+        if verify_status:
+            conditions.append("verify_status = ?")
+            params.append(verify_status)
+        if project_name:
+            conditions.append("project_name = ?")
+            params.append(project_name)
+        if backup_type:
+            conditions.append("backup_type = ?")
+            params.append(backup_type)
+        sql = "SELECT info FROM backups"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset])
+        return [json.loads(row["info"]) for row in self._query(sql, params)]
+
+    def entries(self, project_name=None):
+        """只取保留策略需要的列，不解析完整信息JSON"""
+        sql = "SELECT backup_file, project_name, backup_type, created_at, size FROM backups"
+        params = ()
+        if project_name:
+            sql += " WHERE project_name = ?"
+            params = (project_name,)
+        return [dict(row) for row in self._query(sql + " ORDER BY created_at DESC", params)]
+
+    def projects(self):
+        return [row["project_name"] for row in
+                self._query("SELECT DISTINCT project_name FROM backups ORDER BY project_name")]
+
+    def statistics(self):
+        """总数、总大小、按项目和类型的汇总"""
+        stats = {
+            "total_backups": 0,
+            "total_size": 0,
+            "projects": {},
+            "backup_types": {},
+            "verify_status": {}
+        }
+        for row in self._query("""SELECT project_name, COUNT(*) AS count, SUM(size) AS total_size,
+                                         MAX(created_at) AS latest
+                                  FROM backups GROUP BY project_name"""):
+            stats["projects"][row["project_name"]] = {
+                "count": row["count"],
+                "total_size": row["total_size"] or 0,
+                "latest": row["latest"]
+            }
+            stats["total_backups"] += row["count"]
+            stats["total_size"] += row["total_size"] or 0
+        for row in self._query("SELECT backup_type, COUNT(*) AS count FROM backups GROUP BY backup_type"):
+            stats["backup_types"][row["backup_type"]] = row["count"]
+        for row in self._query("SELECT verify_status, COUNT(*) AS count FROM backups GROUP BY verify_status"):
+            stats["verify_status"][row["verify_status"] or "unverified"] = row["count"]
+        return stats
+
+    # ---------- 导入 ----------
+
+    def get_meta(self, key, default=None):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES(?, ?)", (key, str(value)))
+
+    def import_sidecars(self, backup_dir, force=False):
+        """
+        从备份目录中已有的 <备份名>.json 信息文件导入（只在首次使用时执行一次）
+        返回导入的备份数
+        """
+        if not force and self.get_meta("sidecars_imported"):
+            return 0
+
+        imported = 0
+        for info_file in Path(backup_dir).glob("*/*.json"):
+            if info_file.name.endswith(INDEX_SUFFIX) or info_file.name in _NON_BACKUP_FILES:
+                continue
+            try:
+                with open(info_file, 'r', encoding='utf-8') as f:
+                    backup_info = json.load(f)
+                if Path(backup_info["backup_file"]).exists():
+                    self.add(backup_info)
+                    imported += 1
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ 读取备份信息失败: {info_file}, {e}")
+
+        self.set_meta("sidecars_imported", 1)
+        return imported
+
+    def prune_missing(self):
+        """删除归档文件已不存在的记录，返回删除数"""
+        missing = [row["backup_file"] for row in self._query("SELECT backup_file FROM backups")
+                   if not Path(row["backup_file"]).exists()]
+        for backup_file in missing:
+            self.remove(backup_file)
+        return len(missing)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+服务器间项目迁移
+把项目从服务器A直接迁移到服务器B，数据不落本地磁盘：
+    direct  A上的tar直接通过ssh管道写入B。临时在B上登记一把受限的一次性密钥
+            （只能执行解压命令），迁移结束后立即删除，数据完全不经过本机
+    relay   A无法连到B时，本机把A上tar的输出流式转写到B上tar的输入，
+            只在内存中中转，不在任何一端落临时文件
+    auto    先尝试direct，A连不上B时改用relay
+打包沿用 BackupManager 的排除规则，迁移后比对两端的文件清单（路径+大小）做校验
+"""
+
+import logging
+import re
+import shlex
+import threading
+import time
+import uuid
+
+from connect.transfer_scheduler import PRIORITY_NORMAL
+from monitor.disk_index import DiskUsageIndex
+
+logger = logging.getLogger(__name__)
+
+# 每个检查点对应的tar记录数，记录大小10240字节
+_CHECKPOINT_RECORDS = 100
+_CHECKPOINT_BYTES = _CHECKPOINT_RECORDS * 10240
+_CHECKPOINT_RE = re.compile(r"#ckpt(\d+)")
+
+# ssh无法连接时的退出码
+_SSH_CONNECT_FAILED = 255
+
+
+class ProjectMigration:
+    """
+    参数：
+        backup_manager: BackupManager（提供项目根目录和排除规则）
+        progress_callback: progress(done_bytes, total_bytes)，按未压缩字节估算
+    """
+
+    def __init__(self, backup_manager, progress_callback=None):
+        self.backup_manager = backup_manager
+        self.progress_callback = progress_callback
+
+    # ---------- 命令拼装 ----------
+
+    def _exclude_options(self, backup_type):
+        return " ".join(f"--exclude='{pattern}'" for pattern in self.backup_manager._get_exclude_rules(backup_type))
+
+    def _pack_command(self, project_name, backup_type, source_root):
+        """A上的打包命令，检查点输出到stderr用于进度显示"""
+        return (f"cd {source_root} && tar -czf - --checkpoint={_CHECKPOINT_RECORDS} "
+                f"--checkpoint-action=echo='#ckpt%u' {self._exclude_options(backup_type)} {project_name}")
+
+    @staticmethod
+    def _unpack_command(target_root):
+        return f"mkdir -p {target_root} && tar -xzf - -C {target_root}"
+
+    def _listing_command(self, project_name, backup_type, root):
+        """
+        文件清单指纹：按排除规则列出 大小+路径 并取md5
+        每条记录以NUL结尾，路径中有空格也不会错位；目录的大小与文件系统有关，只记路径。
+        tar的 --exclude 默认不锚定且 * 可以匹配 /，对应find的 -path '*/模式'
+        """
+        excludes = " -o ".join(f"-path {shlex.quote('*/' + pattern)}"
+                               for pattern in self.backup_manager._get_exclude_rules(backup_type))
+        prune = f"\\( {excludes} \\) -prune -o " if excludes else ""
+        script = (f"set -o pipefail; cd {root} && find {project_name} {prune}"
+                  r"-type d -printf 'd %P\0' -o -printf '%s %P\0' | LC_ALL=C sort -z | md5sum")
+        return f"bash -c {shlex.quote(script)}"
+
+    # ---------- 进度 ----------
+
+    def _estimate_size(self, ssh_manager, project_name, source_root):
+        # 优先查服务器上的磁盘索引，没有时才做du
+        size = DiskUsageIndex(ssh_manager).size(f"{source_root}/{project_name}")
+        if size is not None:
+            return size
+        stdout, _, exit_status = ssh_manager.execute_command(f"du -sb {source_root}/{project_name}", timeout=600)
+        if exit_status == 0 and stdout:
+            try:
+                return int(stdout.split()[0])
+            except ValueError:
+                pass
+        return None
+
+    def _watch_stderr(self, channel, total, errors):
+        """读取A上tar的stderr：检查点用于进度，其他内容收集为错误信息"""
+        buffer = ""
+        last_report = 0.0
+        while True:
+            data = channel.recv_stderr(4096)
+            if not data:
+                break
+            buffer += data.decode('utf-8', errors='replace')
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                match = _CHECKPOINT_RE.search(line)
+                if not match:
+                    if line.strip():
+                        errors.append(line.strip())
+                    continue
+                done = int(match.group(1)) * _CHECKPOINT_BYTES
+                now = time.monotonic()
+                if self.progress_callback and now - last_report >= 0.5:
+                    last_report = now
+                    self.progress_callback(min(done, total) if total else done, total)
+
+    # ---------- 两种传输方式 ----------
+
+    def _authorize_temp_key(self, source_ssh, target_ssh, target_root, key_path, marker):
+        """在A上生成一次性密钥，登记到B的authorized_keys（restrict，只允许执行解压命令），返回是否成功"""
+        stdout, stderr, exit_status = source_ssh.execute_command(
+            f"ssh-keygen -q -t ed25519 -N '' -C {marker} -f {key_path} && cat {key_path}.pub")
+        if exit_status != 0 or not stdout.strip():
+            logger.warning("⚠️ 无法在源服务器生成临时密钥: %s", (stderr or "").strip())
+            return False
+
+        command = self._unpack_command(target_root)
+        entry = f'restrict,command="{command}" {stdout.strip()}'
+        _, stderr, exit_status = target_ssh.execute_command(
+            f"mkdir -p ~/.ssh && chmod 700 ~/.ssh && echo '{entry}' >> ~/.ssh/authorized_keys "
+            f"&& chmod 600 ~/.ssh/authorized_keys")
+        if exit_status != 0:
+            logger.warning("⚠️ 无法在目标服务器登记临时密钥: %s", (stderr or "").strip())
+            return False
+        return True
+
+    @staticmethod
+    def _revoke_temp_key(source_ssh, target_ssh, key_path, marker):
+        target_ssh.execute_command(
+            f"sed -i '/ {marker}$/d' ~/.ssh/authorized_keys")
+        source_ssh.execute_command(f"rm -f {key_path} {key_path}.pub")
+
+    def _run_direct(self, pack_cmd, source_ssh, target_ssh, target_root, target_address, total):
+        """A直接ssh到B，返回 (是否成功, 是否连接失败)"""
+        marker = f"migration-{uuid.uuid4().hex[:12]}"
+        key_path = f"/tmp/{marker}"
+        # 任何一步失败（包括登记到一半）都要从两端删掉临时密钥
+        try:
+            if not self._authorize_temp_key(source_ssh, target_ssh, target_root, key_path, marker):
+                return False, True
+
+            # 首次连接时记录B的主机密钥，已记录的密钥不一致时拒绝连接
+            ssh_cmd = (f"ssh -i {key_path} -o BatchMode=yes -o ConnectTimeout=10 "
+                       f"-o StrictHostKeyChecking=accept-new -o LogLevel=ERROR "
+                       f"-p {target_ssh.port} {target_ssh.username}@{target_address}")
+            # pipefail需要bash，登录shell可能是dash
+            pipeline = f"set -o pipefail; {pack_cmd} | {ssh_cmd}"
+            channel = source_ssh.open_channel(f"bash -c {shlex.quote(pipeline)}")
+            if channel is None:
+                return False, True
+
+            errors = []
+            self._watch_stderr(channel, total, errors)
+            exit_status = channel.recv_exit_status()
+            channel.close()
+            if exit_status == 0:
+                return True, False
+            connect_failed = exit_status == _SSH_CONNECT_FAILED
+            logger.warning("⚠️ 直连迁移失败(退出码 %s): %s", exit_status, "; ".join(errors[-3:]))
+            return False, connect_failed
+        finally:
+            self._revoke_temp_key(source_ssh, target_ssh, key_path, marker)
+
+    def _run_relay(self, pack_cmd, source_ssh, target_ssh, target_root, total, priority):
+        """本机中转：A的tar输出流式写入B的tar输入"""
+        channel = source_ssh.open_channel(pack_cmd)
+        if channel is None:
+            return False
+
+        errors = []
+        watcher = threading.Thread(target=self._watch_stderr, args=(channel, total, errors), daemon=True)
+        watcher.start()
+
+        def stream():
+            while True:
+                data = channel.recv(256 * 1024)
+                if not data:
+                    break
+                yield data
+
+        _, stderr, exit_status = target_ssh.execute_with_stdin(
+            self._unpack_command(target_root), stream(), priority=priority)
+        if exit_status != 0:
+            # 目标端已退出，关闭源通道，免得A上的tar因输出无人读取而一直阻塞
+            channel.close()
+            watcher.join()
+            logger.error("❌ 目标服务器解压失败: %s", (stderr or "").strip())
+            return False
+
+        source_status = channel.recv_exit_status()
+        watcher.join()
+        channel.close()
+        if source_status != 0:
+            logger.error("❌ 源服务器打包失败(退出码 %s): %s", source_status, "; ".join(errors[-3:]))
+            return False
+        return True
+
+    # ---------- 入口 ----------
+
+    def verify(self, project_name, source_ssh, target_ssh, backup_type, source_root, target_root):
+        """比对两端按排除规则得到的文件清单（路径+大小）"""
+        source_out, _, source_status = source_ssh.execute_command(
+            self._listing_command(project_name, backup_type, source_root), timeout=600)
+        target_out, _, target_status = target_ssh.execute_command(
+            self._listing_command(project_name, backup_type, target_root), timeout=600)
+        if source_status != 0 or target_status != 0 or not source_out or not target_out:
+            return False
+        return source_out.split()[0] == target_out.split()[0]
+
+    def migrate(self, project_name, source_ssh, target_ssh, backup_type="full", mode="auto",
+                target_root=None, target_address=None, priority=PRIORITY_NORMAL):
+        """
+        迁移项目，返回结果字典 {"success", "mode", "verified", "seconds"}
+        target_address: A访问B使用的地址（如内网IP），默认为本机连接B使用的地址
+        """
+        source_root = self.backup_manager.project_root
+        target_root = target_root or source_root
+        target_address = target_address or target_ssh.ip_address
+        result = {"success": False, "mode": None, "verified": False, "seconds": 0.0}
+
+        if not source_ssh.file_exists(f"{source_root}/{project_name}"):
+            logger.error("❌ 项目不存在: %s/%s", source_root, project_name)
+            return result
+
+        start = time.perf_counter()
+        total = self._estimate_size(source_ssh, project_name, source_root)
+        pack_cmd = self._pack_command(project_name, backup_type, source_root)
+        logger.info("🚚 迁移项目 %s: %s -> %s", project_name, source_ssh.ip_address, target_ssh.ip_address)
+
+        success = False
+        if mode in ("auto", "direct"):
+            result["mode"] = "direct"
+            success, connect_failed = self._run_direct(pack_cmd, source_ssh, target_ssh, target_root,
+                                                       target_address, total)
+            if not success and mode == "auto" and connect_failed:
+                logger.info("🔁 源服务器无法直连目标服务器，改为经本机中转")
+                mode = "relay"
+        if mode == "relay":
+            result["mode"] = "relay"
+            success = self._run_relay(pack_cmd, source_ssh, target_ssh, target_root, total, priority)
+
+        result["seconds"] = time.perf_counter() - start
+        if not success:
+            logger.error("❌ 项目迁移失败: %s", project_name)
+            return result
+
+        if self.progress_callback and total:
+            self.progress_callback(total, total)
+        result["success"] = True
+        result["verified"] = self.verify(project_name, source_ssh, target_ssh, backup_type,
+                                         source_root, target_root)
+        if result["verified"]:
+            logger.info("✅ 项目 %s 迁移完成并校验一致（%s，%.1f秒）", project_name,
+                        result["mode"], result["seconds"])
+        else:
+            logger.warning("⚠️ 项目 %s 已迁移，但两端文件清单不一致，请检查目标目录", project_name)
+        return result
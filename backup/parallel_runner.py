@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+多项目并行备份
+每个项目依次经过 压缩 -> 下载 -> 登记 三个阶段（见 BackupManager.create_remote_archive 等），
+多个项目同时进行，一个项目在服务器上压缩时另一个项目可以在下载。
+每台主机同时压缩的项目数受 compress_per_host 限制，压缩以低nice/ionice优先级运行；
+下载由传输调度器统一排队限速
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backup.verify import STATUS_OK
+from connect.transfer_scheduler import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+
+class ParallelBackupRunner:
+    """
+    参数：
+        backup_manager: BackupManager
+        max_in_flight: 同时进行的项目数
+        compress_per_host: 每台主机同时在压缩的项目数（CPU/IO预算）
+        nice: 服务器端tar的nice值，None表示不调整
+    """
+
+    def __init__(self, backup_manager, max_in_flight=4, compress_per_host=2, nice=10):
+        self.backup_manager = backup_manager
+        self.max_in_flight = max_in_flight
+        self.compress_per_host = compress_per_host
+        self.nice = nice
+        self._host_budgets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, backup_manager):
+        """按 backup_config.json 中的 parallel 配置创建"""
+        config = backup_manager.config.get("parallel", {})
+        return cls(backup_manager,
+                   max_in_flight=config.get("max_in_flight", 4),
+                   compress_per_host=config.get("compress_per_host", 2),
+                   nice=config.get("nice", 10))
+
+    def _compress_budget(self, host):
+        with self._lock:
+            budget = self._host_budgets.get(host)
+            if budget is None:
+                budget = threading.BoundedSemaphore(self.compress_per_host)
+                self._host_budgets[host] = budget
+            return budget
+
+    def _backup_one(self, project_name, ssh_manager, backup_type, priority):
+        with self._compress_budget(ssh_manager.ip_address):
+            logger.info("🔧 压缩项目: %s", project_name)
+            job = self.backup_manager.create_remote_archive(project_name, ssh_manager, backup_type,
+                                                            nice=self.nice)
+        if job is None or not self.backup_manager.fetch_remote_archive(job, ssh_manager, priority):
+            return False
+        return self.backup_manager.register_backup(job)["verify_status"] == STATUS_OK
+
+    def run(self, project_names, ssh_manager, backup_type="code", priority=PRIORITY_BULK, on_result=None):
+        """
+        并行备份多个项目，返回 {项目名: 是否成功}
+        on_result(project_name, success) 在每个项目完成时回调（在工作线程中调用）
+        """
+        results = {}
+        if not project_names:
+            return results
+
+        start = time.perf_counter()
+        logger.info("💾 并行备份 %d 个项目（同时 %d 个，每台主机同时压缩 %d 个）",
+                    len(project_names), self.max_in_flight, self.compress_per_host)
+
+        def task(project_name):
+            try:
+                success = self._backup_one(project_name, ssh_manager, backup_type, priority)
+            except Exception as e:
+                logger.error("❌ 项目 %s 备份出错: %s", project_name, e)
+                success = False
+            results[project_name] = success
+            if on_result:
+                on_result(project_name, success)
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="backup") as pool:
+            list(pool.map(task, project_names))
+
+        succeeded = sum(1 for ok in results.values() if ok)
+        logger.info("✅ 并行备份完成: %d/%d 成功，用时 %.1f秒",
+                    succeeded, len(project_names), time.perf_counter() - start)
+        return results
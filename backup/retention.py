@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+备份保留策略（祖父-父-子）
+每个 项目×备份类型 分组内，按时间粒度各保留最近N个时间段里最新的一个备份：
+    "retention": {
+        "default":  {"keep_last": 3, "hourly": 24, "daily": 7, "weekly": 4, "monthly": 12},
+        "types":    {"full": {"daily": 3, "monthly": 6}},
+        "projects": {"bigproj": {"weekly": 2, "types": {"code": {"daily": 14}}}},
+        "storage_budget": "200GB"
+    }
+规则按 default -> types[类型] -> projects[项目] -> projects[项目].types[类型] 依次覆盖。
+设置了总存储预算时，超出部分从“最不可惜”的备份开始淘汰：删除后留下的时间空档最小的先删，
+每组最新的备份始终保留
+"""
+
+import heapq
+from datetime import datetime
+
+DEFAULT_RULES = {"keep_last": 3, "hourly": 24, "daily": 7, "weekly": 4, "monthly": 12}
+
+# 各时间粒度的分桶方式
+_BUCKETS = {
+    "hourly": lambda t: (t.year, t.month, t.day, t.hour),
+    "daily": lambda t: (t.year, t.month, t.day),
+    "weekly": lambda t: t.isocalendar()[:2],
+    "monthly": lambda t: (t.year, t.month)
+}
+
+_SIZE_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4, "B": 1}
+
+
+def parse_size(value):
+    """解析存储预算：数字（字节）或 500MB / 200GB 这样的字符串"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).strip().upper()
+    for unit, factor in _SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def resolve_rules(policy, project_name, backup_type):
+    """合并出某个项目/类型适用的规则"""
+    rules = dict(DEFAULT_RULES)
+    rules.update(policy.get("default", {}))
+    rules.update(policy.get("types", {}).get(backup_type, {}))
+    project_rules = dict(policy.get("projects", {}).get(project_name, {}))
+    type_overrides = project_rules.pop("types", {})
+    rules.update(project_rules)
+    rules.update(type_overrides.get(backup_type, {}))
+    return rules
+
+
+def _gfs_keep(snapshots, rules):
+    """
+    snapshots按时间倒序，返回 {backup_file: 保留原因}
+    每个粒度取最近N个不同时间段，每段保留其中最新的一个
+    """
+    keep = {}
+    for snapshot in snapshots[:max(1, rules.get("keep_last", 0))]:
+        keep.setdefault(snapshot["backup_file"], "keep_last")
+    for granularity, bucket_of in _BUCKETS.items():
+        limit = rules.get(granularity, 0)
+        seen = set()
+        for snapshot in snapshots:
+            if len(seen) >= limit:
+                break
+            bucket = bucket_of(snapshot["time"])
+            if bucket in seen:
+                continue
+            seen.add(bucket)
+            keep.setdefault(snapshot["backup_file"], granularity)
+    return keep
+
+
+def _evict_for_budget(groups, kept, budget, candidates=None):
+    """
+    总大小超出预算时逐个淘汰：每组最新的不动，其余备份中删掉后前后两个备份
+    之间时间空档最小的先删（损失的时间覆盖最少），返回被淘汰的备份列表
+    candidates: 只从这些分组中淘汰（None为全部），总大小仍按所有分组计算
+    用堆按淘汰优先级取下一个，删掉一个后只重算它前后两个邻居的优先级
+    """
+    total = sum(s["size"] for group in groups.values() for s in group if s["backup_file"] in kept)
+    evicted = []
+    heap = []
+    # 每组仍被保留的备份按时间倒序组成双向链表：{(组序号, 位置): [较新, 较旧]}
+    links = {}
+    version = {}
+    nodes = {}
+
+    def push(node):
+        newer, older = links[node]
+        older_time = nodes[older]["time"] if older is not None else nodes[node]["time"]
+        gap = (nodes[newer]["time"] - older_time).total_seconds()
+        version[node] = version.get(node, 0) + 1
+        # 空档相同时先删大的，尽快回到预算以内
+        heapq.heappush(heap, (gap, -nodes[node]["size"], node, version[node]))
+
+    for g, (key, group) in enumerate(groups.items()):
+        if candidates is not None and key not in candidates:
+            continue
+        members = [s for s in group if s["backup_file"] in kept]
+        for i, snapshot in enumerate(members):
+            nodes[(g, i)] = snapshot
+            links[(g, i)] = [(g, i - 1) if i > 0 else None, (g, i + 1) if i + 1 < len(members) else None]
+        for i in range(1, len(members)):
+            push((g, i))
+
+    while total > budget and heap:
+        _, _, node, node_version = heapq.heappop(heap)
+        if version.get(node) != node_version:
+            continue
+        newer, older = links.pop(node)
+        del version[node]
+        links[newer][1] = older
+        if older is not None:
+            links[older][0] = newer
+            push(older)
+        # 每组最新的（没有更新的邻居）不参与淘汰
+        if links[newer][0] is not None:
+            push(newer)
+        snapshot = nodes[node]
+        total -= snapshot["size"]
+        evicted.append(snapshot)
+    return evicted
+
+
+def plan_retention(entries, policy, project_name=None):
+    """
+    计算保留计划
+    entries: 目录数据库中的备份（含 backup_file/project_name/backup_type/created_at/size）
+    返回 {"keep": [...], "delete": [...], "total_size", "kept_size", "freed_size"}，
+    delete中每项带 reason（"gfs" 或 "budget"）
+    """
+    groups = {}
+    for entry in entries:
+        snapshot = dict(entry)
+        snapshot["time"] = datetime.fromisoformat(entry["created_at"])
+        groups.setdefault((entry["project_name"], entry["backup_type"]), []).append(snapshot)
+
+    kept = {}
+    for (project, backup_type), group in groups.items():
+        group.sort(key=lambda s: s["time"], reverse=True)
+        kept.update(_gfs_keep(group, resolve_rules(policy, project, backup_type)))
+
+    delete = []
+    for group in groups.values():
+        for snapshot in group:
+            if snapshot["backup_file"] not in kept:
+                delete.append(dict(snapshot, reason="gfs"))
+
+    budget = parse_size(policy.get("storage_budget"))
+    if budget is not None:
+        # 只清理一个项目时，超出的预算由该项目的备份承担
+        candidates = {key for key in groups if key[0] == project_name} if project_name else None
+        for snapshot in _evict_for_budget(groups, kept, budget, candidates):
+            kept.pop(snapshot["backup_file"], None)
+            delete.append(dict(snapshot, reason="budget"))
+
+    if project_name:
+        delete = [s for s in delete if s["project_name"] == project_name]
+    deleted_files = {s["backup_file"] for s in delete}
+
+    keep = []
+    for group in groups.values():
+        for snapshot in group:
+            if snapshot["backup_file"] not in deleted_files and \
+                    (not project_name or snapshot["project_name"] == project_name):
+                keep.append(dict(snapshot, reason=kept[snapshot["backup_file"]]))
+
+    total_size = sum(e["size"] for e in entries)
+    freed_size = sum(s["size"] for s in delete)
+    for item in keep + delete:
+        item.pop("time", None)
+    keep.sort(key=lambda s: s["created_at"], reverse=True)
+    delete.sort(key=lambda s: s["created_at"])
+    return {
+        "keep": keep,
+        "delete": delete,
+        "total_size": total_size,
+        "kept_size": total_size - freed_size,
+        "freed_size": freed_size
+    }
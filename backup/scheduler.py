@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+备份计划调度器
+执行 backups/schedules.json 中的计划（由 BackupManager.create_backup_schedule 创建）：
+    - 类cron表达式（分 时 日 月 周），也支持 @hourly/@daily/@weekly/@monthly
+    - 按项目名确定性地错开开始时间，避免所有计划同时在整点打到服务器
+    - 限制每台主机同时进行的备份数
+    - 项目内容自上次备份以来没有变化时跳过本次备份
+
+可以作为后台线程（start/stop）运行，也可以在无界面进程中阻塞运行（run_forever）
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# 旧版计划只有 schedule_type，映射为cron表达式
+SCHEDULE_TYPE_CRON = {
+    "hourly": "0 * * * *",
+    "daily": "0 2 * * *",
+    "weekly": "0 3 * * 0",
+    "monthly": "0 4 1 * *"
+}
+
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *"
+}
+
+
+class CronExpression:
+    """
+    五段式cron表达式：分(0-59) 时(0-23) 日(1-31) 月(1-12) 周(0-6，0和7都是周日)
+    每段支持 *、数字、a-b、a,b、*/n、a-b/n
+    日和周都有限制时按cron惯例取“或”（以*开头的字段如 */2 不算限制，与Vixie cron一致）
+    """
+
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        fields = _ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron表达式需要5段: {expression}")
+        parsed = [self._parse_field(field, low, high) for field, (low, high) in zip(fields, self._RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {d % 7 for d in weekdays}
+        self.day_restricted = not fields[2].startswith("*")
+        self.weekday_restricted = not fields[4].startswith("*")
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f"cron步长必须为正数: {field}")
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(x) for x in part.split("-", 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"cron字段超出范围: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        # Python周一为0，cron周日为0
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, dt):
+        """dt之后（不含）的下一个触发时间，逐级跳过不匹配的月/日/时/分"""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = dt.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"cron表达式没有可触发的时间: {self.expression}")
+
+
+def schedule_jitter(project_name, window_seconds):
+    """按项目名确定的偏移秒数，同一项目每次一致，不同项目均匀分散"""
+    if not window_seconds:
+        return 0
+    digest = hashlib.sha1(project_name.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % int(window_seconds)
+
+
+class BackupScheduler:
+    """
+    备份计划调度器
+    参数：
+        backup_manager: BackupManager
+        ssh_manager_factory: host -> 已连接的SSHManager（连接失败返回None）
+        default_host: 计划未指定host时使用的主机
+        max_per_host: 每台主机同时进行的备份数
+        jitter_seconds: 错开窗口，各项目在触发时间后的 [0, jitter_seconds) 内开始
+        max_workers: 同时进行的备份总数
+        poll_interval: 检查计划的间隔（秒）
+    """
+
+    def __init__(self, backup_manager, ssh_manager_factory, default_host=None, max_per_host=1,
+                 jitter_seconds=1800, max_workers=4, poll_interval=30):
+        self.backup_manager = backup_manager
+        self.ssh_manager_factory = ssh_manager_factory
+        self.default_host = default_host
+        self.max_per_host = max_per_host
+        self.jitter_seconds = jitter_seconds
+        self.poll_interval = poll_interval
+        self.schedule_file = backup_manager.backup_dir / "schedules.json"
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backup-scheduler")
+        self._file_lock = threading.Lock()
+        self._host_running = {}   # {主机: 正在进行的备份数}
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- 计划文件 ----------
+
+    def load_schedules(self):
+        with self._file_lock:
+            if not self.schedule_file.exists():
+                return {}
+            with open(self.schedule_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+    def _update_schedule(self, project_name, **fields):
+        """合并更新某个计划的字段（读-改-写在同一把锁内，避免并发覆盖）"""
+        with self._file_lock:
+            schedules = {}
+            if self.schedule_file.exists():
+                with open(self.schedule_file, 'r', encoding='utf-8') as f:
+                    schedules = json.load(f)
+            if project_name not in schedules:
+                return
+            schedules[project_name].update(fields)
+            with open(self.schedule_file, 'w', encoding='utf-8') as f:
+                json.dump(schedules, f, indent=2, ensure_ascii=False)
+
+    def cron_for(self, schedule):
+        expression = schedule.get("cron") or SCHEDULE_TYPE_CRON.get(schedule.get("schedule_type"), "0 2 * * *")
+        return CronExpression(expression)
+
+    def next_run(self, project_name, schedule, after):
+        """after之后的下一次运行时间（已加上项目的错开偏移）"""
+        jitter = timedelta(seconds=schedule_jitter(project_name, self.jitter_seconds))
+        return self.cron_for(schedule).next_after(after - jitter) + jitter
+
+    # ---------- 调度 ----------
+
+    def tick(self, now=None):
+        """检查一次所有计划，把到期的提交执行，返回本次提交的项目列表"""
+        now = now or datetime.now()
+        submitted = []
+        for project_name, schedule in self.load_schedules().items():
+            if not schedule.get("enabled", True):
+                continue
+            try:
+                due = schedule.get("next_run")
+                if due is None:
+                    # 新计划（或旧格式）先算出下一次时间，不补跑过去错过的
+                    next_time = self.next_run(project_name, schedule, now)
+                    self._update_schedule(project_name, next_run=next_time.isoformat())
+                    logger.info("📅 备份计划 %s 下次运行: %s", project_name, next_time.strftime("%Y-%m-%d %H:%M"))
+                    continue
+                if datetime.fromisoformat(due) > now:
+                    continue
+            except ValueError as e:
+                logger.error("❌ 备份计划 %s 配置无效: %s", project_name, e)
+                continue
+
+            # 主机已满时不提交，留到下一次检查，避免工作线程阻塞等待而饿死其他主机的计划
+            host = schedule.get("host") or self.default_host
+            with self._running_lock:
+                if project_name in self._running or self._host_running.get(host, 0) >= self.max_per_host:
+                    continue
+                self._running.add(project_name)
+                self._host_running[host] = self._host_running.get(host, 0) + 1
+            self._pool.submit(self._run_schedule, project_name, host, schedule)
+            submitted.append(project_name)
+        return submitted
+
+    def _run_schedule(self, project_name, host, schedule):
+        backup_type = schedule.get("backup_type", "code")
+        status = "failed"
+        fields = {}
+        try:
+            ssh_manager = self.ssh_manager_factory(host)
+            if ssh_manager is None:
+                logger.error("❌ 备份计划 %s: 无法连接主机 %s", project_name, host)
+                return
+
+            fingerprint = self.backup_manager.project_fingerprint(project_name, ssh_manager, backup_type)
+            if fingerprint and fingerprint == schedule.get("last_fingerprint"):
+                logger.info("⏭️ 项目 %s 自上次备份以来没有变化，跳过", project_name)
+                status = "unchanged"
+                return
+
+            logger.info("💾 执行计划备份: %s (%s) @ %s", project_name, backup_type, host)
+            if self.backup_manager.backup_project(project_name, ssh_manager, backup_type):
+                status = "success"
+                fields["last_backup"] = datetime.now().isoformat()
+                fields["last_fingerprint"] = fingerprint
+        except Exception as e:
+            logger.error("❌ 计划备份 %s 出错: %s", project_name, e)
+        finally:
+            now = datetime.now()
+            try:
+                next_time = self.next_run(project_name, schedule, now).isoformat()
+            except ValueError:
+                next_time = None
+            self._update_schedule(project_name, last_run=now.isoformat(), last_status=status,
+                                  next_run=next_time, **fields)
+            with self._running_lock:
+                self._running.discard(project_name)
+                self._host_running[host] -= 1
+
+    def run_forever(self):
+        """阻塞运行，直到stop()被调用"""
+        logger.info("⏰ 备份调度器已启动，计划文件: %s", self.schedule_file)
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("❌ 检查备份计划失败: %s", e)
+            self._stop.wait(self.poll_interval)
+        self._pool.shutdown(wait=True)
+        logger.info("⏹️ 备份调度器已停止")
+
+    def start(self):
+        """作为后台线程运行"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, daemon=True, name="backup-scheduler")
+            self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+备份完整性校验
+备份时记录归档的sha256（见 BackupManager.register_backup），校验任务重新计算并比对，
+可选完整解压一遍以发现截断或损坏的gzip/tar数据。结果写回目录数据库：
+    ok        校验通过
+    corrupt   摘要不符或解压出错
+    missing   归档文件不存在
+    unverified 没有记录摘要且未做解压测试
+多个归档并行校验，共享一个令牌桶限制本地磁盘读取速度
+"""
+
+import logging
+import tarfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from backup.archive_index import HashingReader
+from connect.transfer_scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_CORRUPT = "corrupt"
+STATUS_MISSING = "missing"
+STATUS_UNVERIFIED = "unverified"
+
+
+def file_sha256(path, bucket=None, chunk_size=1024 * 1024):
+    with open(path, 'rb') as f:
+        return HashingReader(f, bucket).drain(chunk_size)
+
+
+def verify_archive(backup_file, expected_sha256=None, test_decompress=False, bucket=None):
+    """
+    校验单个归档，返回 {"status", "sha256", "error", "verified_at"}
+    test_decompress为True时在计算摘要的同一遍读取中完整解压所有成员
+    """
+    result = {"status": STATUS_OK, "sha256": None, "error": None,
+              "verified_at": datetime.now().isoformat()}
+    backup_file = Path(backup_file)
+    if not backup_file.exists():
+        result.update(status=STATUS_MISSING, error="归档文件不存在")
+        return result
+
+    try:
+        if test_decompress:
+            with open(backup_file, 'rb') as raw:
+                reader = HashingReader(raw, bucket)
+                with tarfile.open(fileobj=reader, mode="r|*") as tar:
+                    for member in tar:
+                        if member.isreg():
+                            data = tar.extractfile(member)
+                            while data.read(1024 * 1024):
+                                pass
+                result["sha256"] = reader.drain()
+        else:
+            result["sha256"] = file_sha256(backup_file, bucket)
+    except (tarfile.TarError, zlib.error, EOFError, OSError) as e:
+        result.update(status=STATUS_CORRUPT, error=f"解压失败: {e}")
+        return result
+
+    if expected_sha256:
+        if result["sha256"] != expected_sha256:
+            result.update(status=STATUS_CORRUPT, error="sha256与备份时记录的不一致")
+    elif not test_decompress:
+        result["status"] = STATUS_UNVERIFIED
+    return result
+
+
+class BackupScrubber:
+    """
+    后台校验所有备份
+    参数：
+        backup_manager: BackupManager（使用其目录数据库）
+        workers: 并行校验的归档数
+        rate: 本地磁盘读取限速（字节/秒），None不限速
+        test_decompress: 是否完整解压测试
+    """
+
+    def __init__(self, backup_manager, workers=2, rate=50 * 1024 * 1024, test_decompress=False):
+        self.backup_manager = backup_manager
+        self.workers = workers
+        self.bucket = TokenBucket(rate)
+        self.test_decompress = test_decompress
+        self._thread = None
+        self.results = {}
+
+    def verify_one(self, backup_info):
+        backup_file = backup_info["backup_file"]
+        result = verify_archive(backup_file, backup_info.get("sha256"),
+                                self.test_decompress, self.bucket)
+        fields = {"verify_status": result["status"], "verified_at": result["verified_at"],
+                  "verify_error": result["error"]}
+        # 旧备份没有记录摘要时，首次校验（解压通过）后补记
+        if not backup_info.get("sha256") and result["status"] == STATUS_OK:
+            fields["sha256"] = result["sha256"]
+        self.backup_manager.catalog.update_info(backup_file, **fields)
+
+        if result["status"] in (STATUS_CORRUPT, STATUS_MISSING):
+            logger.warning("⚠️ 备份校验失败: %s (%s)", Path(backup_file).name, result["error"])
+        return result
+
+    def run(self, project_name=None, on_result=None):
+        """校验所有（或指定项目的）备份，返回 {备份文件: 结果}"""
+        backups = self.backup_manager.catalog.list(project_name)
+        logger.info("🛡️ 开始校验 %d 个备份%s", len(backups), "（含解压测试）" if self.test_decompress else "")
+        results = {}
+
+        def task(backup_info):
+            try:
+                result = self.verify_one(backup_info)
+            except Exception as e:
+                result = {"status": STATUS_CORRUPT, "error": str(e)}
+            results[backup_info["backup_file"]] = result
+            if on_result:
+                on_result(backup_info, result)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scrub") as pool:
+            list(pool.map(task, backups))
+
+        bad = sum(1 for r in results.values() if r["status"] in (STATUS_CORRUPT, STATUS_MISSING))
+        if bad:
+            logger.warning("⚠️ 校验完成: %d 个备份中有 %d 个异常", len(results), bad)
+        else:
+            logger.info("✅ 校验完成: %d 个备份全部正常", len(results))
+        self.results = results
+        return results
+
+    def start(self, project_name=None, on_result=None, on_done=None):
+        """在后台线程中校验"""
+        def worker():
+            results = self.run(project_name, on_result)
+            if on_done:
+                on_done(results)
+
+        self._thread = threading.Thread(target=worker, daemon=True, name="backup-scrub")
+        self._thread.start()
+        return self._thread
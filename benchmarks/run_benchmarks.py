@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+SSHManager / BackupManager 基准测试
+在进程内启动本地测试SSH服务器（见 ssh_test_server.py），测量：
+    - 连接耗时
+    - 单条命令往返
+    - 批量并发执行 vs 逐条执行
+    - 不同文件大小的SFTP上传/下载吞吐
+    - 备份 + 恢复的端到端耗时
+结果保存为JSON，可用 --compare 与之前版本的结果对比
+
+用法:
+    python benchmarks/run_benchmarks.py --latency 0.005 --bandwidth 50MB
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/旧结果.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ssh_test_server import LocalSSHServer
+from connect.ssh_manager import SSHManager
+from backup.backup_manager import BackupManager
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+
+def parse_size(text):
+    """解析 64KB / 10MB / 1GB 这样的大小"""
+    text = text.strip().upper()
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "B": 1}
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def timings(samples):
+    """把一组耗时样本汇总为统计值（秒）"""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "p95": ordered[max(0, int(round(0.95 * len(ordered))) - 1)],
+        "max": ordered[-1]
+    }
+
+
+def measure(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return timings(samples)
+
+
+def new_manager(server):
+    manager = SSHManager()
+    if not manager.connect("127.0.0.1", "bench", password="bench", port=server.port, timeout=10):
+        raise RuntimeError("无法连接本地测试服务器")
+    return manager
+
+
+def bench_connect(server, runs):
+    def connect_once():
+        new_manager(server).close()
+    return measure(connect_once, runs)
+
+
+def bench_command(manager, runs):
+    return measure(lambda: manager.execute_command("true"), runs)
+
+
+def bench_batch(manager, batch_size, runs):
+    commands = [f"echo {i}" for i in range(batch_size)]
+
+    def sequential():
+        for cmd in commands:
+            manager.execute_command(cmd)
+
+    def batched():
+        manager.execute_commands(commands)
+
+    return {
+        "batch_size": batch_size,
+        "sequential": measure(sequential, runs),
+        "batched": measure(batched, runs)
+    }
+
+
+def bench_sftp(manager, workdir, sizes, runs):
+    results = {}
+    for size in sizes:
+        local = Path(workdir) / f"payload_{size}.bin"
+        remote = Path(workdir) / "remote" / f"payload_{size}.bin"
+        back = Path(workdir) / f"payload_{size}.back"
+        with open(local, 'wb') as f:
+            f.write(os.urandom(size))
+
+        upload = measure(lambda: manager.upload_file(str(local), str(remote)), runs)
+        download = measure(lambda: manager.download_file(str(remote), str(back)), runs)
+        results[str(size)] = {
+            "size": size,
+            "upload": upload,
+            "download": download,
+            "upload_mbps": size / upload["median"] / 1024 ** 2,
+            "download_mbps": size / download["median"] / 1024 ** 2
+        }
+    return results
+
+
+def make_project(project_root, name, files, file_size):
+    """生成一个测试项目：源码文件 + 会被code备份排除的数据文件"""
+    project = Path(project_root) / name
+    (project / "src").mkdir(parents=True, exist_ok=True)
+    (project / "data").mkdir(exist_ok=True)
+    for i in range(files):
+        with open(project / "src" / f"module_{i}.py", 'w', encoding='utf-8') as f:
+            f.write(f"# module {i}\n" + "x = 1\n" * (file_size // 6))
+    with open(project / "data" / "dataset.bin", 'wb') as f:
+        f.write(os.urandom(file_size * 4))
+    return project
+
+
+def bench_backup(manager, workdir, runs, files, file_size):
+    project_root = Path(workdir) / "projects"
+    make_project(project_root, "benchproj", files, file_size)
+    backup_manager = BackupManager(backup_dir=str(Path(workdir) / "backups"))
+    backup_manager.project_root = str(project_root)
+    backup_manager.config["max_backups"] = runs + 1
+
+    backup_samples, restore_samples = [], []
+    for i in range(runs):
+        start = time.perf_counter()
+        if not backup_manager.backup_project("benchproj", manager, "code"):
+            raise RuntimeError("备份失败")
+        backup_samples.append(time.perf_counter() - start)
+        # 备份文件名精确到秒，避免同一秒内重名
+        time.sleep(1.05)
+
+    archive = sorted((Path(workdir) / "backups" / "benchproj").glob("*.tar.gz"))[-1]
+    staged_samples = []
+    for i in range(runs):
+        # 流式恢复（默认）与先上传到/tmp再解压的方式分别计时
+        for streaming, samples in ((True, restore_samples), (False, staged_samples)):
+            target = Path(workdir) / "restored" / f"run{i}_{streaming}" / "benchproj"
+            start = time.perf_counter()
+            if not backup_manager.restore_backup(str(archive), manager, str(target), streaming=streaming):
+                raise RuntimeError("恢复失败")
+            samples.append(time.perf_counter() - start)
+
+    return {
+        "files": files,
+        "archive_size": archive.stat().st_size,
+        "backup": timings(backup_samples),
+        "restore": timings(restore_samples),
+        "restore_staged": timings(staged_samples)
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT),
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, previous_file):
+    """打印与旧结果的中位数对比"""
+    with open(previous_file, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+
+    def walk(cur, old, path):
+        if isinstance(cur, dict) and isinstance(old, dict):
+            if "median" in cur and "median" in old:
+                change = (cur["median"] - old["median"]) / old["median"] * 100 if old["median"] else 0
+                flag = "⚠️" if change > 10 else ("✅" if change < -10 else "  ")
+                print(f"{flag} {path:<45} {old['median'] * 1000:9.2f}ms -> "
+                      f"{cur['median'] * 1000:9.2f}ms ({change:+.1f}%)")
+                return
+            for key in cur:
+                if key in old:
+                    walk(cur[key], old[key], f"{path}.{key}" if path else key)
+
+    print(f"📊 对比 {previous.get('version')} -> {current.get('version')}")
+    walk(current["results"], previous["results"], "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSH/备份基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每项重复次数")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟的单次请求延迟（秒）")
+    parser.add_argument("--bandwidth", default=None, help="模拟带宽，如 10MB（每秒）")
+    parser.add_argument("--sizes", default="64KB,1MB,16MB", help="SFTP测试的文件大小")
+    parser.add_argument("--batch", type=int, default=20, help="批量执行的命令数")
+    parser.add_argument("--files", type=int, default=200, help="备份测试项目的文件数")
+    parser.add_argument("--output", help="结果文件，默认 benchmarks/results/<时间>.json")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    parser.add_argument("--skip", default="", help="跳过的项目，逗号分隔：connect,command,batch,sftp,backup")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    bandwidth = parse_size(args.bandwidth) if args.bandwidth else None
+    skip = set(filter(None, args.skip.split(",")))
+    workdir = tempfile.mkdtemp(prefix="ssh_bench_")
+    (Path(workdir) / "remote").mkdir()
+
+    results = {}
+    try:
+        with LocalSSHServer(latency=args.latency, bandwidth=bandwidth) as server:
+            if "connect" not in skip:
+                print("⏱️ 连接...")
+                results["connect"] = bench_connect(server, args.runs)
+
+            manager = new_manager(server)
+            if "command" not in skip:
+                print("⏱️ 命令往返...")
+                results["command_roundtrip"] = bench_command(manager, args.runs * 10)
+            if "batch" not in skip:
+                print("⏱️ 批量执行...")
+                results["batch_exec"] = bench_batch(manager, args.batch, args.runs)
+            if "sftp" not in skip:
+                print("⏱️ SFTP吞吐...")
+                sizes = [parse_size(s) for s in args.sizes.split(",")]
+                results["sftp"] = bench_sftp(manager, workdir, sizes, args.runs)
+            if "backup" not in skip:
+                print("⏱️ 备份/恢复...")
+                results["backup_restore"] = bench_backup(manager, workdir, min(args.runs, 3),
+                                                         args.files, 4096)
+            manager.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "ssh_backup",
+        "version": git_version(),
+        "created_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "conditions": {"latency": args.latency, "bandwidth": bandwidth},
+        "results": results
+    }
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✅ 结果已保存: {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+本地测试用SSH服务器
+基于paramiko.ServerInterface，在本机随机端口上提供exec和SFTP子系统，
+命令直接在本机bash中执行，可注入往返延迟和带宽限制，用于基准测试
+"""
+
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from paramiko.sftp import SFTP_OK
+
+
+class NetworkShaper:
+    """模拟网络条件：每次请求的延迟和带宽上限（字节/秒）"""
+
+    def __init__(self, latency=0.0, bandwidth=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def transfer(self, nbytes):
+        """按带宽上限为nbytes字节的传输计时，多个连接共享同一条“链路”"""
+        if not self.bandwidth or nbytes <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + nbytes / float(self.bandwidth)
+            wait = self._next_free - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _SFTPHandle(SFTPHandle):
+    def __init__(self, shaper, flags=0):
+        super().__init__(flags)
+        self.shaper = shaper
+
+    def read(self, offset, length):
+        self.shaper.delay()
+        data = super().read(offset, length)
+        if isinstance(data, bytes):
+            self.shaper.transfer(len(data))
+        return data
+
+    def write(self, offset, data):
+        self.shaper.delay()
+        self.shaper.transfer(len(data))
+        return super().write(offset, data)
+
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class _SFTPServer(SFTPServerInterface):
+    """把SFTP请求直接映射到本机文件系统"""
+
+    def __init__(self, server, *args, shaper=None, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.shaper = shaper
+
+    def list_folder(self, path):
+        try:
+            result = []
+            for name in os.listdir(path):
+                attr = SFTPAttributes.from_stat(os.stat(os.path.join(path, name)))
+                attr.filename = name
+                result.append(attr)
+            return result
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        try:
+            binary_flag = getattr(os, 'O_BINARY', 0)
+            fd = os.open(path, flags | binary_flag, 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        try:
+            f = os.fdopen(fd, mode)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        handle = _SFTPHandle(self.shaper, flags)
+        handle.filename = path
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(oldpath, newpath)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(path)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        return SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.normpath(path if os.path.isabs(path) else os.path.join("/", path))
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """接受任意用户/密钥，允许session、exec和SFTP"""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OPEN_REQUEST
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password,publickey"
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.owner._run_exec, args=(channel, command.decode('utf-8')),
+                         daemon=True).start()
+        return True
+
+
+class LocalSSHServer:
+    """
+    进程内SSH服务器
+    用法:
+        with LocalSSHServer(latency=0.01, bandwidth=10 * 1024 * 1024) as server:
+            ssh_manager.connect("127.0.0.1", port=server.port, password="x")
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, bandwidth=None, cwd=None):
+        self.host = host
+        self.shaper = NetworkShaper(latency, bandwidth)
+        self.cwd = cwd
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self.port = self._sock.getsockname()[1]
+        self._transports = []
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._sock.listen(100)
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+        for transport in self._transports:
+            transport.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            # 关闭Nagle，避免小包叠加延迟确认造成约40ms的额外往返
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _SFTPServer, shaper=self.shaper)
+            self._transports.append(transport)
+            try:
+                transport.start_server(server=_ServerInterface(self))
+            except (paramiko.SSHException, EOFError):
+                continue
+
+    def _run_exec(self, channel, command):
+        """在本机执行命令，把stdin/stdout/stderr接到通道上"""
+        self.shaper.delay()
+        proc = subprocess.Popen(["bash", "-c", command], cwd=self.cwd,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+
+        def pump_stdin():
+            try:
+                while True:
+                    data = channel.recv(32768)
+                    if not data:
+                        break
+                    self.shaper.transfer(len(data))
+                    proc.stdin.write(data)
+            except (OSError, EOFError):
+                pass
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        def pump_stderr():
+            for chunk in iter(lambda: proc.stderr.read1(32768), b""):
+                channel.sendall_stderr(chunk)
+
+        threads = [threading.Thread(target=pump_stdin, daemon=True),
+                   threading.Thread(target=pump_stderr, daemon=True)]
+        for t in threads:
+            t.start()
+        try:
+            for chunk in iter(lambda: proc.stdout.read1(32768), b""):
+                self.shaper.transfer(len(chunk))
+                channel.sendall(chunk)
+            threads[1].join()
+            channel.send_exit_status(proc.wait())
+        except (OSError, EOFError):
+            proc.kill()
+        finally:
+            channel.close()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+GUI启动耗时基准
+在独立子进程中测量：导入主程序模块的耗时、模式选择界面绘制完成的耗时
+用法: python benchmarks/startup_benchmark.py [--runs 5] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 子进程中执行的测量代码，结果以JSON打印到最后一行
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import importlib
+gui_module = importlib.import_module("服务器管理器")
+t_import = time.perf_counter()
+result = {{"import_s": t_import - t0, "heavy_modules": sorted(
+    m for m in ("paramiko", "quick_setup", "user_mode", "backup.backup_manager",
+                "projects.github_manager") if m in sys.modules)}}
+try:
+    import tkinter as tk
+    root = tk.Tk()
+    root.withdraw()
+    gui_module.ServerManagerGUI(root)
+    root.update()
+    result["mode_picker_s"] = time.perf_counter() - t0
+    root.destroy()
+except tk.TclError as e:
+    result["mode_picker_s"] = None
+    result["gui_error"] = str(e)
+print(json.dumps(result))
+"""
+
+
+def run_once():
+    """在全新的解释器中测量一次启动"""
+    code = PROBE.format(root=str(ROOT))
+    proc = subprocess.run([sys.executable, "-c", code], cwd=str(ROOT),
+                          capture_output=True, text=True, encoding="utf-8")
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数")
+    parser.add_argument("--output", help="结果保存的JSON文件")
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    report = {
+        "benchmark": "gui_startup",
+        "created_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "runs": args.runs,
+        "import_s": summarize([s["import_s"] for s in samples]),
+        "mode_picker_s": summarize([s.get("mode_picker_s") for s in samples]),
+        "heavy_modules_at_startup": samples[-1]["heavy_modules"],
+        "gui_error": samples[-1].get("gui_error")
+    }
+
+    print(f"📊 导入耗时(中位数): {report['import_s']['median'] * 1000:.1f} ms")
+    if report["mode_picker_s"]:
+        print(f"📊 模式选择界面就绪(中位数): {report['mode_picker_s']['median'] * 1000:.1f} ms")
+    else:
+        print(f"⚠️ 无法创建窗口: {report['gui_error']}")
+    if report["heavy_modules_at_startup"]:
+        print(f"⚠️ 启动时已加载: {', '.join(report['heavy_modules_at_startup'])}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+异步SSH执行核心
+基于asyncio调度远程命令，paramiko的阻塞调用放在线程池中执行
+支持全局并发上限、每台主机的并发上限和有界队列背压
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CommandJob:
+    """一次远程命令执行任务"""
+
+    __slots__ = ("host", "client", "command", "timeout")
+
+    def __init__(self, host, client, command, timeout=60):
+        self.host = host
+        self.client = client
+        self.command = command
+        self.timeout = timeout
+
+
+class AsyncSSHExecutor:
+    """
+    异步执行核心
+    参数：
+        max_concurrency: 全局同时执行的命令数上限
+        per_host_limit: 单台主机同时执行的命令数上限
+        queue_size: 批量执行时的待执行队列长度（背压）
+    """
+
+    def __init__(self, max_concurrency=64, per_host_limit=8, queue_size=1000):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.queue_size = queue_size
+
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="ssh-exec")
+        self._loop = None
+        self._loop_thread = None
+        self._start_lock = threading.Lock()
+
+        # 信号量只能在事件循环线程中创建和使用
+        self._global_sem = None
+        self._host_sems = {}
+
+    # ---------- 事件循环管理 ----------
+
+    def _ensure_loop(self):
+        """按需启动后台事件循环线程"""
+        if self._loop is not None:
+            return self._loop
+
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run_loop():
+                    asyncio.set_event_loop(loop)
+                    self._global_sem = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                self._loop_thread = threading.Thread(target=run_loop, name="ssh-async-loop",
+                                                     daemon=True)
+                self._loop_thread.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """把协程提交到后台事件循环，返回concurrent.futures.Future"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run_sync(self, coro, timeout=None):
+        """同步等待协程结果（供同步API调用）"""
+        if self._loop_thread is not None and threading.current_thread() is self._loop_thread:
+            raise RuntimeError("不能在事件循环线程中同步等待")
+        return self.submit(coro).result(timeout)
+
+    def shutdown(self):
+        """停止事件循环和线程池"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
+            self._loop = None
+            self._loop_thread = None
+        self._pool.shutdown(wait=False)
+
+    # ---------- 并发控制 ----------
+
+    def _host_semaphore(self, host):
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_host_limit)
+            self._host_sems[host] = sem
+        return sem
+
+    async def run_blocking(self, host, func, *args):
+        """在主机并发限制下，把阻塞函数放到线程池中执行"""
+        loop = asyncio.get_running_loop()
+        async with self._host_semaphore(host):
+            async with self._global_sem:
+                return await loop.run_in_executor(self._pool, func, *args)
+
+    # ---------- 命令执行 ----------
+
+    @staticmethod
+    def _exec_blocking(client, command, timeout):
+        """在线程池中执行的paramiko阻塞调用"""
+        stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+        stdin.close()
+        # 先读完stdout/stderr再取退出码：输出超过通道窗口时远端会阻塞在写入上，
+        # 先等退出码就会互相等待。stderr在单独线程中读，两路都不会写满
+        errors = []
+
+        def read_stderr():
+            try:
+                errors.append(stderr.read())
+            except OSError:
+                # 读取超时或通道已关闭，错误由读取stdout的一侧抛出
+                pass
+
+        reader = threading.Thread(target=read_stderr, daemon=True)
+        reader.start()
+        try:
+            stdout_data = stdout.read()
+            reader.join()
+            exit_status = stdout.channel.recv_exit_status()
+        finally:
+            # 读取超时等出错时关闭通道，让stderr读取线程随之结束，不遗留线程和通道
+            stdout.channel.close()
+            reader.join()
+        stdout_text = stdout_data.decode('utf-8', errors='replace')
+        stderr_text = (errors[0] if errors else b"").decode('utf-8', errors='replace')
+        return stdout_text, stderr_text, exit_status
+
+    async def run_command(self, host, client, command, timeout=60):
+        """执行单条命令，返回 (stdout, stderr, exit_status)"""
+        return await self.run_blocking(host, self._exec_blocking, client, command, timeout)
+
+    async def run_many(self, jobs, on_result=None):
+        """
+        批量执行命令
+        jobs: CommandJob的可迭代对象（可以是生成器，按需取用）
+        on_result: 每个任务完成时的回调 on_result(index, job, result)
+        返回结果列表，顺序与jobs一致；失败的任务结果为异常对象
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        results = {}
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    queue.task_done()
+                    return
+                index, job = item
+                try:
+                    result = await self.run_command(job.host, job.client, job.command, job.timeout)
+                except Exception as e:
+                    result = e
+                results[index] = result
+                if on_result:
+                    try:
+                        on_result(index, job, result)
+                    except Exception:
+                        pass
+                queue.task_done()
+
+        # 工作协程按需启动，数量不超过任务数
+        workers = []
+
+        # 队列满时put会等待，生产端自然被限速
+        count = 0
+        for job in jobs:
+            if len(workers) < self.max_concurrency:
+                workers.append(asyncio.ensure_future(worker()))
+            await queue.put((count, job))
+            count += 1
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+        return [results[i] for i in range(count)]
+
+    def run_many_sync(self, jobs, on_result=None, timeout=None):
+        """同步版本的批量执行"""
+        return self.run_sync(self.run_many(jobs, on_result), timeout)
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_default_executor():
+    """获取进程内共享的默认执行核心"""
+    global _default_executor
+    if _default_executor is None:
+        with _default_lock:
+            if _default_executor is None:
+                _default_executor = AsyncSSHExecutor()
+    return _default_executor
+
+
+def execute_on_hosts(ssh_managers, command, timeout=60, executor=None):
+    """
+    在多台已连接的服务器上并发执行同一条命令
+    返回 {ip_address: (stdout, stderr, exit_status) 或异常}
+    """
+    executor = executor or get_default_executor()
+    managers = [m for m in ssh_managers if m.is_connected()]
+    jobs = [CommandJob(m.ip_address, m.client, command, timeout) for m in managers]
+    results = executor.run_many_sync(jobs)
+    return {m.ip_address: r for m, r in zip(managers, results)}
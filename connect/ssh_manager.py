@@ -4,6 +4,7 @@ SSH连接管理器
 支持PEM文件连接和远程命令执行
 """
 
+import logging
 import paramiko
 import socket
 import time
@@ -11,28 +12,54 @@ import threading
 import os
 from pathlib import Path
 
+from connect.async_executor import CommandJob, get_default_executor
+from connect.transfer_scheduler import PRIORITY_NORMAL, get_default_scheduler
+from monitor.metrics import instrument
+
+logger = logging.getLogger(__name__)
+
+
+def _arg(args, kwargs, index, name):
+    """从调用参数中取出位置参数或关键字参数"""
+    if len(args) > index:
+        return args[index]
+    return kwargs.get(name)
+
+
+def _command_host(self, *args, **kwargs):
+    return self.ip_address
+
+
 class SSHManager:
-    def __init__(self):
+    # 下载时同时在途的SFTP读请求数（每个32KB）
+    MAX_PREFETCH_REQUESTS = 64
+
+    def __init__(self, executor=None, transfer_scheduler=None):
         self.client = None
         self.ip_address = None
         self.username = None
+        self.port = 22
         self.is_connected_flag = False
         self.connection_lock = threading.Lock()
+        # 命令执行统一交给异步执行核心，本类只是同步外观
+        self.executor = executor or get_default_executor()
+        # 文件传输统一排队限速，交互传输优先于批量传输
+        self.transfer_scheduler = transfer_scheduler or get_default_scheduler()
     
-    def connect(self, ip_address, username="root", pem_file_path=None, password=None, timeout=30):
+    @instrument("ssh.connect", host=lambda self, *a, **k: _arg(a, k, 0, "ip_address"))
+    def connect(self, ip_address, username="root", pem_file_path=None, password=None, timeout=30, port=22):
         """连接SSH服务器"""
         try:
             with self.connection_lock:
-                print(f"🔄 开始连接到 {username}@{ip_address}")
-                print(f"⏳ 连接超时设置: {timeout}秒")
-                
+                logger.info("🔄 开始连接到 %s@%s", username, ip_address)
+                logger.debug("⏳ 连接超时设置: %s秒", timeout)
                 # 关闭现有连接
                 if self.client:
-                    print("🔄 关闭现有连接...")
+                    logger.debug("🔄 关闭现有连接...")
                     self.client.close()
                 
                 # 创建新连接
-                print("🔄 创建新的SSH客户端...")
+                logger.debug("🔄 创建新的SSH客户端...")
                 self.client = paramiko.SSHClient()
                 self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
                 
@@ -45,12 +72,12 @@ class SSHManager:
                     'allow_agent': False,
                     'banner_timeout': 60,  # 增加banner超时时间
                     'auth_timeout': 60,    # 增加认证超时时间
-                    'port': 22             # 明确指定端口
+                    'port': port           # 明确指定端口
                 }
                 
                 # 使用PEM文件或密码
                 if pem_file_path and os.path.exists(pem_file_path):
-                    print(f"🔑 正在读取PEM文件: {pem_file_path}")
+                    logger.debug("🔑 正在读取PEM文件: %s", pem_file_path)
                     try:
                         # 尝试不同的密钥类型
                         try:
@@ -62,99 +89,87 @@ class SSHManager:
                                 pkey = paramiko.DSSKey.from_private_key_file(pem_file_path)
                         
                         connect_kwargs['pkey'] = pkey
-                        print("✅ PEM文件读取成功")
+                        logger.debug("✅ PEM文件读取成功")
                     except Exception as e:
-                        print(f"❌ PEM文件读取失败: {str(e)}")
+                        logger.error("❌ PEM文件读取失败: %s", e)
                         if "not a valid RSA private key file" in str(e):
-                            print("提示: 请确保PEM文件是有效的私钥格式")
+                            logger.debug("提示: 请确保PEM文件是有效的私钥格式")
                         return False
                 elif password:
-                    print("🔑 使用密码连接")
+                    logger.debug("🔑 使用密码连接")
                     connect_kwargs['password'] = password
                 else:
-                    print("❌ 没有提供有效的认证方式")
+                    logger.error("❌ 没有提供有效的认证方式")
                     return False
                 
-                print(f"🔄 正在连接到 {ip_address}...")
-                print("连接参数:")
-                print(f"  - 用户名: {username}")
-                print(f"  - 超时时间: {timeout}秒")
-                print(f"  - 认证方式: {'PEM密钥' if pem_file_path else '密码'}")
-                
+                logger.debug("🔄 正在连接到 %s...", ip_address)
+                logger.debug("连接参数: 用户名=%s 超时=%s秒 认证方式=%s",
+                             username, timeout, 'PEM密钥' if pem_file_path else '密码')
                 # 建立连接
                 try:
                     self.client.connect(**connect_kwargs)
-                    print("✅ 初始连接成功")
+                    logger.debug("✅ 初始连接成功")
+                    # 命令都是小包请求/应答，关闭Nagle避免每次往返多等一个延迟确认
+                    try:
+                        self.client.get_transport().sock.setsockopt(
+                            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    except (OSError, AttributeError):
+                        pass
                 except paramiko.AuthenticationException as e:
-                    print(f"❌ SSH认证失败: {str(e)}")
-                    print("请检查:")
-                    print("1. PEM文件是否正确")
-                    print("2. 用户名是否正确")
-                    print("3. 服务器是否允许密钥认证")
-                    print("4. PEM文件的格式和权限是否正确")
+                    logger.error("❌ SSH认证失败: %s", e)
+                    logger.debug("请检查: 1. PEM文件是否正确 2. 用户名是否正确 "
+                                 "3. 服务器是否允许密钥认证 4. PEM文件的格式和权限是否正确")
                     return False
                 except paramiko.SSHException as e:
-                    print(f"❌ SSH连接错误: {str(e)}")
-                    print("可能的原因:")
-                    print("1. SSH服务未启动")
-                    print("2. SSH配置问题")
-                    print("3. 网络连接问题")
+                    logger.error("❌ SSH连接错误: %s", e)
+                    logger.debug("可能的原因: 1. SSH服务未启动 2. SSH配置问题 3. 网络连接问题")
                     return False
                 except socket.timeout:
-                    print("❌ 连接超时，请检查:")
-                    print("1. 服务器IP是否正确")
-                    print("2. 服务器是否在线")
-                    print("3. 防火墙是否允许SSH连接")
-                    print("4. 网络连接是否稳定")
+                    logger.error("❌ 连接超时")
+                    logger.debug("请检查: 1. 服务器IP是否正确 2. 服务器是否在线 "
+                                 "3. 防火墙是否允许SSH连接 4. 网络连接是否稳定")
                     return False
                 except socket.error as e:
-                    print(f"❌ 网络错误: {str(e)}")
-                    print("可能的原因:")
-                    print("1. 网络连接不稳定")
-                    print("2. DNS解析问题")
-                    print("3. 防火墙拦截")
+                    logger.error("❌ 网络错误: %s", e)
+                    logger.debug("可能的原因: 1. 网络连接不稳定 2. DNS解析问题 3. 防火墙拦截")
                     return False
                 
-                print("🔄 正在测试连接...")
-                
+                logger.debug("🔄 正在测试连接...")
                 # 测试连接
                 try:
-                    print("发送测试命令: echo 'connection test'")
+                    logger.debug("发送测试命令: echo 'connection test'")
                     stdin, stdout, stderr = self.client.exec_command('echo "connection test"', timeout=10)
                     result = stdout.read().decode().strip()
                     error = stderr.read().decode().strip()
                     
                     if error:
-                        print(f"⚠️ 命令错误输出: {error}")
-                    
+                        logger.warning("⚠️ 命令错误输出: %s", error)
                     if result == "connection test":
                         self.ip_address = ip_address
                         self.username = username
+                        self.port = port
                         self.is_connected_flag = True
-                        print(f"✅ SSH连接测试成功: {username}@{ip_address}")
-                        
-                        # 获取系统信息
-                        try:
-                            print("🔄 获取系统信息...")
-                            stdin, stdout, stderr = self.client.exec_command("uname -a")
-                            system_info = stdout.read().decode().strip()
-                            print(f"📊 系统信息: {system_info}")
-                        except Exception as e:
-                            print(f"⚠️ 无法获取系统信息: {str(e)}")
-                        
+                        logger.info("✅ SSH连接测试成功: %s@%s", username, ip_address)
+                        # 获取系统信息（只用于调试输出，避免多一次往返）
+                        if logger.isEnabledFor(logging.DEBUG):
+                            try:
+                                stdin, stdout, stderr = self.client.exec_command("uname -a")
+                                system_info = stdout.read().decode().strip()
+                                logger.debug("📊 系统信息: %s", system_info)
+                            except Exception as e:
+                                logger.warning("⚠️ 无法获取系统信息: %s", e)
                         return True
                     else:
-                        print("❌ 连接测试失败")
-                        print(f"预期输出: 'connection test'")
-                        print(f"实际输出: '{result}'")
+                        logger.error("❌ 连接测试失败")
+                        logger.debug("预期输出: 'connection test'，实际输出: '%s'", result)
                         return False
                 except Exception as e:
-                    print(f"❌ 连接测试失败: {str(e)}")
+                    logger.error("❌ 连接测试失败: %s", e)
                     return False
                     
         except Exception as e:
-            print(f"❌ 连接过程中发生错误: {str(e)}")
-            print(f"错误类型: {type(e).__name__}")
+            logger.error("❌ 连接过程中发生错误: %s", e)
+            logger.debug("错误类型: %s", type(e).__name__)
             return False
     
     def is_connected(self):
@@ -174,46 +189,161 @@ class SSHManager:
             self.is_connected_flag = False
             return False
     
+    @instrument("ssh.execute_command", host=_command_host,
+                ok=lambda r: r[2] == 0,
+                nbytes=lambda r, *a, **k: len(r[0] or ""))
     def execute_command(self, command, timeout=60):
         """执行单个命令"""
         if not self.is_connected():
-            print("❌ SSH未连接")
+            logger.error("❌ SSH未连接")
             return None, None, None
         
         try:
-            print(f"🔧 执行命令: {command}")
-            stdin, stdout, stderr = self.client.exec_command(command, timeout=timeout)
-            
-            # 等待命令完成
-            exit_status = stdout.channel.recv_exit_status()
-            
-            stdout_text = stdout.read().decode('utf-8')
-            stderr_text = stderr.read().decode('utf-8')
-            
-            if exit_status == 0:
-                print(f"✅ 命令执行成功")
-                if stdout_text.strip():
-                    print(f"输出: {stdout_text.strip()}")
-            else:
-                print(f"⚠️ 命令退出状态: {exit_status}")
-                if stderr_text.strip():
-                    print(f"错误: {stderr_text.strip()}")
+            logger.debug("🔧 执行命令: %s", command)
+            stdout_text, stderr_text, exit_status = self.executor.run_sync(
+                self.executor.run_command(self.ip_address, self.client, command, timeout))
             
+            # 输出可能很大，只有在DEBUG级别才去处理
+            if logger.isEnabledFor(logging.DEBUG):
+                if exit_status == 0:
+                    logger.debug("✅ 命令执行成功，输出 %d 字节", len(stdout_text),
+                                 extra={"host": self.ip_address, "exit_status": exit_status})
+                else:
+                    logger.debug("⚠️ 命令退出状态: %s, 错误: %s", exit_status, stderr_text.strip()[:2000],
+                                 extra={"host": self.ip_address, "exit_status": exit_status})
             return stdout_text, stderr_text, exit_status
             
         except Exception as e:
-            print(f"❌ 命令执行失败: {e}")
+            logger.error("❌ 命令执行失败: %s", e)
             return None, None, -1
     
+    def execute_commands(self, commands, timeout=60):
+        """并发执行多条互不依赖的命令，返回与commands顺序一致的结果列表"""
+        if not self.is_connected():
+            logger.error("❌ SSH未连接")
+            return [(None, None, None) for _ in commands]
+        
+        jobs = (CommandJob(self.ip_address, self.client, cmd, timeout) for cmd in commands)
+        results = self.executor.run_many_sync(jobs)
+        
+        outputs = []
+        for cmd, result in zip(commands, results):
+            if isinstance(result, Exception):
+                logger.error("❌ 命令执行失败: %s: %s", cmd, result)
+                outputs.append((None, None, -1))
+            else:
+                outputs.append(result)
+        return outputs
+    
+    @instrument("ssh.execute_with_stdin", host=_command_host, ok=lambda r: r[2] == 0)
+    def execute_with_stdin(self, command, source, timeout=None, priority=PRIORITY_NORMAL,
+                           size=None, chunk_size=256 * 1024):
+        """
+        执行命令并把source的数据流式写入其stdin，返回 (stdout, stderr, exit_status)
+        source可以是二进制文件对象，也可以是产生bytes块的迭代器；写入按传输调度器限速排队
+        """
+        if not self.is_connected():
+            logger.error("❌ SSH未连接")
+            return None, None, None
+
+        try:
+            logger.debug("🔧 执行命令(stdin流): %s", command)
+            stdin, stdout, stderr = self.client.exec_command(command, timeout=timeout)
+            channel = stdout.channel
+
+            # 同时读取输出，避免远端因输出缓冲写满而停止读取stdin
+            outputs = {}
+            readers = [threading.Thread(target=lambda n=name, s=stream: outputs.__setitem__(n, s.read()),
+                                        daemon=True)
+                       for name, stream in (("stdout", stdout), ("stderr", stderr))]
+            for reader in readers:
+                reader.start()
+
+            chunks = iter(lambda: source.read(chunk_size), b"") if hasattr(source, "read") else iter(source)
+            sent = 0
+            source_error = None
+            finished = False
+            try:
+                with self.transfer_scheduler.transfer(self.ip_address, priority, size,
+                                                      name=command) as ticket:
+                    while True:
+                        # 数据源本身出错（如归档损坏）与远端提前退出分开处理
+                        try:
+                            chunk = next(chunks)
+                        except StopIteration:
+                            break
+                        except Exception as e:
+                            source_error = e
+                            break
+                        if not chunk:
+                            continue
+                        ticket.throttle(len(chunk))
+                        try:
+                            channel.sendall(chunk)
+                        except OSError as e:
+                            # 远端命令提前退出时通道被关闭，退出码和错误输出更能说明问题
+                            logger.warning("⚠️ 写入stdin中断: %s", e)
+                            break
+                        sent += len(chunk)
+                finished = source_error is None
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+                if finished:
+                    channel.shutdown_write()
+                else:
+                    # 数据不完整，不能让远端把截断的输入当作正常结束；关闭通道让远端命令和读取线程尽快结束
+                    channel.close()
+                    for reader in readers:
+                        reader.join()
+
+            if source_error is not None:
+                logger.error("❌ 读取写入stdin的数据失败: %s", source_error)
+                stdout_text = outputs.get("stdout", b"").decode('utf-8', errors='replace')
+                return stdout_text, f"读取写入stdin的数据失败: {source_error}", -1
+
+            exit_status = channel.recv_exit_status()
+            for reader in readers:
+                reader.join()
+            stdout_text = outputs.get("stdout", b"").decode('utf-8', errors='replace')
+            stderr_text = outputs.get("stderr", b"").decode('utf-8', errors='replace')
+            logger.debug("✅ 已写入stdin %d 字节，退出状态: %s", sent, exit_status)
+            return stdout_text, stderr_text, exit_status
+
+        except Exception as e:
+            logger.error("❌ 命令执行失败: %s", e)
+            return None, None, -1
+
+    def open_channel(self, command, timeout=None, forward_agent=False):
+        """
+        启动命令并返回paramiko通道，由调用方自行读写 stdout/stderr 流（用于长时间的流式传输）
+        forward_agent为True时把本机ssh-agent转发给该命令（远端可用本机密钥访问其他主机）
+        未连接或启动失败时返回None
+        """
+        if not self.is_connected():
+            logger.error("❌ SSH未连接")
+            return None
+
+        try:
+            logger.debug("🔧 打开命令通道: %s", command)
+            channel = self.client.get_transport().open_session(timeout=timeout)
+            if forward_agent:
+                paramiko.agent.AgentRequestHandler(channel)
+            channel.exec_command(command)
+            return channel
+        except Exception as e:
+            logger.error("❌ 打开命令通道失败: %s", e)
+            return None
+
     def execute_script(self, script_path, *args):
         """执行本地脚本文件"""
         if not self.is_connected():
-            print("❌ SSH未连接")
+            logger.error("❌ SSH未连接")
             return False
         
         script_file = Path(script_path)
         if not script_file.exists():
-            print(f"❌ 脚本文件不存在: {script_path}")
+            logger.error("❌ 脚本文件不存在: %s", script_path)
             return False
         
         try:
@@ -238,7 +368,7 @@ class SSHManager:
             # 添加执行权限并运行
             stdout, stderr, exit_status = self.execute_command(f"chmod +x {remote_script_path}")
             if exit_status != 0:
-                print(f"❌ 无法设置脚本权限")
+                logger.error("❌ 无法设置脚本权限")
                 return False
             
             stdout, stderr, exit_status = self.execute_command(f"bash {remote_script_path}")
@@ -249,13 +379,15 @@ class SSHManager:
             return exit_status == 0
             
         except Exception as e:
-            print(f"❌ 脚本执行失败: {e}")
+            logger.error("❌ 脚本执行失败: %s", e)
             return False
     
-    def upload_file(self, local_path, remote_path):
-        """上传文件"""
+    @instrument("ssh.upload_file", host=_command_host,
+                nbytes=lambda r, self, *a, **k: os.path.getsize(_arg(a, k, 0, "local_path")))
+    def upload_file(self, local_path, remote_path, priority=PRIORITY_NORMAL):
+        """上传文件，priority见 connect.transfer_scheduler"""
         if not self.is_connected():
-            print("❌ SSH未连接")
+            logger.error("❌ SSH未连接")
             return False
         
         try:
@@ -268,20 +400,25 @@ class SSHManager:
             except:
                 pass  # 目录可能已存在
             
-            sftp.put(local_path, remote_path)
+            with self.transfer_scheduler.transfer(self.ip_address, priority,
+                                                  os.path.getsize(local_path),
+                                                  name=remote_path) as ticket:
+                sftp.put(local_path, remote_path, callback=ticket.callback())
             sftp.close()
             
-            print(f"✅ 文件上传成功: {local_path} -> {remote_path}")
+            logger.info("✅ 文件上传成功: %s -> %s", local_path, remote_path)
             return True
             
         except Exception as e:
-            print(f"❌ 文件上传失败: {e}")
+            logger.error("❌ 文件上传失败: %s", e)
             return False
     
-    def download_file(self, remote_path, local_path):
-        """下载文件"""
+    @instrument("ssh.download_file", host=_command_host,
+                nbytes=lambda r, self, *a, **k: os.path.getsize(_arg(a, k, 1, "local_path")))
+    def download_file(self, remote_path, local_path, priority=PRIORITY_NORMAL):
+        """下载文件，priority见 connect.transfer_scheduler"""
         if not self.is_connected():
-            print("❌ SSH未连接")
+            logger.error("❌ SSH未连接")
             return False
         
         try:
@@ -291,30 +428,61 @@ class SSHManager:
             local_dir = Path(local_path).parent
             local_dir.mkdir(parents=True, exist_ok=True)
             
-            sftp.get(remote_path, local_path)
+            size = sftp.stat(remote_path).st_size
+            with self.transfer_scheduler.transfer(self.ip_address, priority, size,
+                                                  name=remote_path) as ticket:
+                # 限制预读请求数，否则paramiko会一次性请求整个文件，限速和让路都失效
+                sftp.get(remote_path, local_path, callback=ticket.callback(),
+                         max_concurrent_prefetch_requests=self.MAX_PREFETCH_REQUESTS)
             sftp.close()
             
-            print(f"✅ 文件下载成功: {remote_path} -> {local_path}")
+            logger.info("✅ 文件下载成功: %s -> %s", remote_path, local_path)
             return True
             
         except Exception as e:
-            print(f"❌ 文件下载失败: {e}")
+            logger.error("❌ 文件下载失败: %s", e)
             return False
     
+    def read_ranges(self, remote_path, ranges, priority=PRIORITY_NORMAL):
+        """
+        读取远程文件的若干区段 [(offset, length), ...]，按顺序返回bytes列表，失败返回None
+        多个读请求流水线发出（SFTP readv），用于只下载文件中变化的块
+        """
+        if not self.is_connected():
+            logger.error("❌ SSH未连接")
+            return None
+
+        try:
+            sftp = self.client.open_sftp()
+            size = sum(length for _, length in ranges)
+            with self.transfer_scheduler.transfer(self.ip_address, priority, size,
+                                                  name=remote_path) as ticket:
+                with sftp.open(remote_path, 'rb') as remote_file:
+                    chunks = []
+                    for chunk in remote_file.readv(ranges):
+                        ticket.throttle(len(chunk))
+                        chunks.append(chunk)
+            sftp.close()
+            return chunks
+
+        except Exception as e:
+            logger.error("❌ 读取远程文件区段失败: %s, %s", remote_path, e)
+            return None
+
     def create_directory(self, remote_path, mode=0o755):
         """创建远程目录"""
         if not self.is_connected():
-            print("❌ SSH未连接")
+            logger.error("❌ SSH未连接")
             return False
         
         command = f"mkdir -p {remote_path} && chmod {oct(mode)[2:]} {remote_path}"
         stdout, stderr, exit_status = self.execute_command(command)
         
         if exit_status == 0:
-            print(f"✅ 目录创建成功: {remote_path}")
+            logger.info("✅ 目录创建成功: %s", remote_path)
             return True
         else:
-            print(f"❌ 目录创建失败: {stderr}")
+            logger.error("❌ 目录创建失败: %s", stderr)
             return False
     
     def file_exists(self, remote_path):
@@ -332,18 +500,26 @@ class SSHManager:
         
         info = {}
         
+        # 四条命令互不依赖，一次并发发出
+        os_out, cpu_out, mem_out, disk_out = [r[0] for r in self.execute_commands([
+            "cat /etc/os-release | grep PRETTY_NAME",
+            "nproc",
+            "free -h | grep Mem",
+            "df -h / | tail -1"
+        ])]
+        
         # 操作系统
-        stdout, _, _ = self.execute_command("cat /etc/os-release | grep PRETTY_NAME")
+        stdout = os_out
         if stdout:
             info['os'] = stdout.split('=')[1].strip().strip('"')
         
         # CPU信息
-        stdout, _, _ = self.execute_command("nproc")
+        stdout = cpu_out
         if stdout:
             info['cpu_cores'] = int(stdout.strip())
         
         # 内存信息
-        stdout, _, _ = self.execute_command("free -h | grep Mem")
+        stdout = mem_out
         if stdout:
             parts = stdout.split()
             info['memory_total'] = parts[1]
@@ -351,7 +527,7 @@ class SSHManager:
             info['memory_free'] = parts[3]
         
         # 磁盘信息
-        stdout, _, _ = self.execute_command("df -h / | tail -1")
+        stdout = disk_out
         if stdout:
             parts = stdout.split()
             info['disk_total'] = parts[1]
@@ -367,7 +543,7 @@ class SSHManager:
             if self.client:
                 self.client.close()
                 self.is_connected_flag = False
-                print("🔌 SSH连接已关闭")
+                logger.info("🔌 SSH连接已关闭")
         except:
             pass
     
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+文件传输调度器
+所有SFTP传输共用一条上行链路，这里统一协调：
+    - 优先级：交互(INTERACTIVE) > 普通(NORMAL) > 批量(BULK)
+    - 全局和每台主机的令牌桶限速
+    - 同时进行的传输槽位数
+交互传输总能立即开始，进行中的批量传输会在分块边界暂停让路
+"""
+
+import itertools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_BULK: "bulk"
+}
+
+
+class TokenBucket:
+    """令牌桶限速，rate为字节/秒，None表示不限速"""
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.capacity = burst or (rate if rate else 0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate, burst=None):
+        with self._lock:
+            self.rate = rate
+            self.capacity = burst or (rate if rate else 0)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def reserve(self, nbytes):
+        """预留nbytes个令牌，返回需要等待的秒数（允许短暂透支，保证大块也能通过）"""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= nbytes
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def consume(self, nbytes):
+        wait = self.reserve(nbytes)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class TransferTicket:
+    """一次传输的调度凭据，传输过程中每个分块调用throttle()"""
+
+    def __init__(self, scheduler, host, priority, size, name):
+        self.scheduler = scheduler
+        self.host = host
+        self.priority = priority
+        self.size = size
+        self.name = name
+        self.seq = None
+        self.transferred = 0
+
+    def throttle(self, nbytes):
+        """按限速和优先级为nbytes字节的分块放行"""
+        self.scheduler._wait_not_preempted(self)
+        self.scheduler.global_bucket.consume(nbytes)
+        bucket = self.scheduler._host_bucket(self.host)
+        if bucket:
+            bucket.consume(nbytes)
+        self.transferred += nbytes
+
+    def callback(self):
+        """生成paramiko的传输回调 callback(已传输字节, 总字节)"""
+        last = [0]
+
+        def progress(done, total):
+            delta = done - last[0]
+            last[0] = done
+            if delta > 0:
+                self.throttle(delta)
+
+        return progress
+
+
+class TransferScheduler:
+    """
+    传输调度器
+    参数：
+        max_slots: 同时进行的传输数（交互传输不受限制）
+        global_rate: 全局限速，字节/秒
+        per_host_rate: 每台主机的默认限速，字节/秒
+    """
+
+    def __init__(self, max_slots=4, global_rate=None, per_host_rate=None):
+        self.max_slots = max_slots
+        self.per_host_rate = per_host_rate
+        self.global_bucket = TokenBucket(global_rate)
+        self._host_buckets = {}
+        self._cond = threading.Condition()
+        self._active = []
+        self._waiting = []
+        self._seq = itertools.count()
+
+    def set_host_rate(self, host, rate):
+        """单独设置某台主机的限速"""
+        with self._cond:
+            bucket = self._host_buckets.get(host)
+            if bucket is None:
+                self._host_buckets[host] = TokenBucket(rate)
+            else:
+                bucket.set_rate(rate)
+
+    def _host_bucket(self, host):
+        with self._cond:
+            bucket = self._host_buckets.get(host)
+            if bucket is None and self.per_host_rate:
+                bucket = TokenBucket(self.per_host_rate)
+                self._host_buckets[host] = bucket
+            return bucket
+
+    def _can_start(self, ticket):
+        """轮到该凭据且有空闲槽位（交互传输直接放行）"""
+        if ticket.priority == PRIORITY_INTERACTIVE:
+            return True
+        head = min(self._waiting, key=lambda t: (t.priority, t.seq))
+        if head is not ticket:
+            return False
+        running = [t for t in self._active if t.priority != PRIORITY_INTERACTIVE]
+        return len(running) < self.max_slots
+
+    def _preempted(self, ticket):
+        """批量传输在有交互传输进行或等待时暂停"""
+        if ticket.priority != PRIORITY_BULK:
+            return False
+        return any(t.priority == PRIORITY_INTERACTIVE for t in self._active + self._waiting)
+
+    def _wait_not_preempted(self, ticket):
+        with self._cond:
+            if self._preempted(ticket):
+                logger.debug("⏸️ 批量传输让路给交互传输: %s", ticket.name)
+                self._cond.wait_for(lambda: not self._preempted(ticket))
+
+    @contextmanager
+    def transfer(self, host, priority=PRIORITY_NORMAL, size=None, name=""):
+        """
+        申请一次传输：
+            with scheduler.transfer(host, PRIORITY_BULK, size) as ticket:
+                sftp.put(local, remote, callback=ticket.callback())
+        """
+        ticket = TransferTicket(self, host, priority, size, name)
+        with self._cond:
+            ticket.seq = next(self._seq)
+            self._waiting.append(ticket)
+            # 新来的交互传输会让批量传输暂停，需要唤醒检查
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._can_start(ticket))
+            self._waiting.remove(ticket)
+            self._active.append(ticket)
+        logger.debug("▶️ 开始传输[%s]: %s", PRIORITY_NAMES.get(priority, priority), name)
+        try:
+            yield ticket
+        finally:
+            with self._cond:
+                self._active.remove(ticket)
+                self._cond.notify_all()
+
+    def status(self):
+        """当前进行中和排队中的传输"""
+        with self._cond:
+            def describe(t):
+                return {"name": t.name, "host": t.host, "size": t.size,
+                        "priority": PRIORITY_NAMES.get(t.priority, t.priority),
+                        "transferred": t.transferred}
+            return {
+                "active": [describe(t) for t in self._active],
+                "waiting": [describe(t) for t in self._waiting]
+            }
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def load_transfer_settings(settings_file="config/settings.json"):
+    """读取 settings.json 中的 transfer 配置"""
+    try:
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get("transfer", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def get_default_scheduler():
+    """进程内共享的传输调度器，配置取自 settings.json 的 transfer 段"""
+    global _default_scheduler
+    if _default_scheduler is None:
+        with _default_lock:
+            if _default_scheduler is None:
+                settings = load_transfer_settings()
+                _default_scheduler = TransferScheduler(
+                    max_slots=settings.get("max_slots", 4),
+                    global_rate=settings.get("global_rate"),
+                    per_host_rate=settings.get("per_host_rate"))
+                for host, rate in settings.get("host_rates", {}).items():
+                    _default_scheduler.set_host_rate(host, rate)
+    return _default_scheduler
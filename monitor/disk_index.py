@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+服务器磁盘用量索引
+在服务器上安装一个由cron定时执行的脚本，以最低CPU/IO优先级对 /home 等目录做一次du，
+把前几层目录的大小写成TSV文件（每行 "KB<TAB>路径"，即du的原始输出）。
+客户端只读这个文件：用户/项目大小、最大的N个目录都直接查表，不再每次对多TB的数据盘做完整的du遍历。
+文件只有在服务器上重新生成（mtime变化）后才会重新下载
+"""
+
+import logging
+import shlex
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FILE = "/var/cache/server-manager/du-index.tsv"
+DEFAULT_ROOTS = ("/home",)
+# /home/<用户>/projects/<项目> 在第3层
+DEFAULT_DEPTH = 3
+# 每6小时一次，避开整点
+DEFAULT_SCHEDULE = "17 */6 * * *"
+# 索引超过这个时间（秒）未更新就不再使用，调用方回退到du
+DEFAULT_MAX_AGE = 24 * 3600
+
+SCRIPT_PATH = "/usr/local/sbin/server-manager-du-index"
+CRON_FILE = "/etc/cron.d/server-manager-du-index"
+
+_INDEX_SCRIPT = """#!/bin/sh
+# 由服务器管理系统生成：低优先级统计目录大小，写入 {index}
+out={index}
+mkdir -p "$(dirname "$out")" || exit 1
+if command -v flock >/dev/null 2>&1; then
+    exec 9>"$out.lock"
+    flock -n 9 || exit 0
+fi
+tmp="$out.$$"
+trap 'rm -f "$tmp"' EXIT
+io=
+command -v ionice >/dev/null 2>&1 && io="ionice -c3"
+for root in {roots}; do
+    [ -d "$root" ] && nice -n 19 $io du -kx --max-depth={depth} "$root" 2>/dev/null
+done > "$tmp"
+chmod 644 "$tmp"
+mv "$tmp" "$out"
+"""
+
+# 一次调用：输出索引的mtime，与客户端已有的不同时再输出内容
+_LOAD_COMMAND = "m=$(stat -c %Y {index} 2>/dev/null) || exit 1; echo \"$m\"; [ \"$m\" = {known} ] || cat {index}"
+
+
+class DiskUsageIndex:
+    """
+    参数：
+        ssh_manager: 已连接的SSHManager
+        index_file: 服务器上索引文件的路径
+        max_age: 索引的最长有效时间（秒）
+        reload_interval: 两次检查索引是否更新的最小间隔（秒）
+    """
+
+    def __init__(self, ssh_manager, index_file=DEFAULT_INDEX_FILE, max_age=DEFAULT_MAX_AGE,
+                 reload_interval=60):
+        self.ssh_manager = ssh_manager
+        self.index_file = index_file
+        self.max_age = max_age
+        self.reload_interval = reload_interval
+        self._sizes = {}          # {路径: KB}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- 服务器端 ----------
+
+    def install(self, roots=DEFAULT_ROOTS, depth=DEFAULT_DEPTH, schedule=DEFAULT_SCHEDULE, run_now=True):
+        """安装索引脚本和cron任务（需要root），run_now为True时立即在后台生成一次"""
+        script = _INDEX_SCRIPT.format(index=shlex.quote(self.index_file),
+                                      roots=" ".join(shlex.quote(root) for root in roots),
+                                      depth=int(depth))
+        _, stderr, exit_status = self.ssh_manager.execute_with_stdin(
+            f"cat > {SCRIPT_PATH} && chmod 755 {SCRIPT_PATH}", [script.encode('utf-8')])
+        if exit_status != 0:
+            logger.error("❌ 安装磁盘索引脚本失败: %s", (stderr or "").strip())
+            return False
+
+        cron = f"# 服务器管理系统：磁盘用量索引\n{schedule} root {SCRIPT_PATH}\n"
+        _, stderr, exit_status = self.ssh_manager.execute_with_stdin(
+            f"cat > {CRON_FILE} && chmod 644 {CRON_FILE}", [cron.encode('utf-8')])
+        if exit_status != 0:
+            logger.error("❌ 安装磁盘索引定时任务失败: %s", (stderr or "").strip())
+            return False
+
+        logger.info("✅ 已安装磁盘索引: %s (%s)", ", ".join(roots), schedule)
+        if run_now:
+            self.refresh()
+        return True
+
+    def is_installed(self):
+        return self.ssh_manager.file_exists(SCRIPT_PATH)
+
+    def refresh(self):
+        """在服务器后台立即重新生成索引（不等待完成）"""
+        self.ssh_manager.execute_command(f"nohup {SCRIPT_PATH} >/dev/null 2>&1 &")
+        logger.info("🔄 已在后台开始重新生成磁盘索引")
+
+    # ---------- 查询 ----------
+
+    def load(self, force=False):
+        """索引在服务器上更新后重新下载，返回索引是否可用"""
+        with self._lock:
+            if not force and time.time() - self._checked < self.reload_interval:
+                return self._usable()
+            self._checked = time.time()
+
+            known = str(self._mtime) if self._mtime is not None and not force else "-"
+            result = self._download(_LOAD_COMMAND.format(index=shlex.quote(self.index_file),
+                                                         known=shlex.quote(known)))
+            if result is None:
+                self._sizes, self._mtime = {}, None
+                return False
+
+            mtime, sizes = result
+            if mtime != self._mtime:
+                self._sizes, self._mtime = sizes, mtime
+                logger.debug("📇 已加载磁盘索引: %d 个目录", len(sizes))
+            return self._usable()
+
+    def _download(self, command):
+        """边读边解析索引，返回 (mtime, {路径: KB})，失败返回None；索引没有变化时sizes为空"""
+        channel = self.ssh_manager.open_channel(command, timeout=120)
+        if channel is None:
+            return None
+        mtime, sizes = None, {}
+        buffer = b""
+        try:
+            channel.settimeout(120)
+            while True:
+                data = channel.recv(256 * 1024)
+                if not data:
+                    break
+                *lines, buffer = (buffer + data).split(b"\n")
+                for line in lines:
+                    text = line.decode('utf-8', errors='replace')
+                    if mtime is None:
+                        mtime = int(text.strip())
+                        continue
+                    kb, _, path = text.partition("\t")
+                    if kb.isdigit() and path:
+                        sizes[path] = int(kb)
+            exit_status = channel.recv_exit_status()
+        except (OSError, ValueError) as e:
+            logger.debug("读取磁盘索引失败: %s", e)
+            return None
+        finally:
+            channel.close()
+        if exit_status != 0 or mtime is None:
+            return None
+        return mtime, sizes
+
+    def _usable(self):
+        return self._mtime is not None and self.age < self.max_age
+
+    @property
+    def age(self):
+        """索引生成至今的秒数，没有索引时为None"""
+        return None if self._mtime is None else time.time() - self._mtime
+
+    def size(self, path):
+        """目录大小（字节），不在索引中或索引不可用时返回None"""
+        if not self.load():
+            return None
+        kb = self._sizes.get(path.rstrip("/") or "/")
+        return None if kb is None else kb * 1024
+
+    def user_usage(self, username):
+        return self.size(f"/home/{username}")
+
+    def children(self, path):
+        """目录下一层子目录的大小，按大小降序 [(路径, 字节)]"""
+        if not self.load():
+            return []
+        prefix = path.rstrip("/") + "/"
+        entries = [(p, kb * 1024) for p, kb in self._sizes.items()
+                   if p.startswith(prefix) and "/" not in p[len(prefix):]]
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)
+
+    def top(self, n=20, under=None):
+        """
+        最大的n个目录 [(路径, 字节)]，under指定时只在该目录下查找
+        只列出索引中没有子目录的目录，否则结果会被 /home、/home/<用户> 这些上级目录占满
+        """
+        if not self.load():
+            return []
+        prefix = under.rstrip("/") + "/" if under else ""
+        parents = {p.rsplit("/", 1)[0] for p in self._sizes}
+        entries = [(p, kb * 1024) for p, kb in self._sizes.items()
+                   if p.startswith(prefix) and p not in parents]
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)[:n]
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+多服务器健康轮询
+按 config/connection_presets.json 中保存的连接预设，定时并发采集每台服务器的
+CPU/内存/磁盘/Docker/用户数。每台主机保持一条SSH连接复用，每次轮询只发一条命令；
+每台主机有独立的超时，慢的主机只会被标记为超时，不会拖住其他主机的结果
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+from connect.ssh_manager import SSHManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRESETS_FILE = "config/connection_presets.json"
+DEFAULT_SETTINGS_FILE = "config/settings.json"
+
+# 一次调用采集所有指标，每行输出 key=value
+_HEALTH_SCRIPT = r"""s1=$(head -1 /proc/stat); sleep 0.5; s2=$(head -1 /proc/stat)
+echo "cpu=$(printf '%s\n%s\n' "$s1" "$s2" | awk '{idle=$5+$6; total=0; for (i=2; i<=NF; i++) total+=$i}
+    NR==1 {i1=idle; t1=total} NR==2 {d=total-t1; printf "%.1f", (d > 0 ? 100*(1-(idle-i1)/d) : 0)}')"
+echo "load=$(cut -d' ' -f1 /proc/loadavg)"
+echo "cores=$(nproc)"
+echo "mem=$(awk '/^MemTotal:/ {t=$2} /^MemAvailable:/ {a=$2} END {print t, t-a}' /proc/meminfo)"
+echo "disk=$(df -Pk / | awk 'NR==2 {print $2, $3}')"
+if command -v docker >/dev/null 2>&1; then
+    echo "containers=$(timeout 5 docker ps -q 2>/dev/null | wc -l) $(timeout 5 docker ps -aq 2>/dev/null | wc -l)"
+fi
+echo "users=$(getent passwd | awk -F: '$3 >= 1000 && $3 < 65534' | wc -l)"
+echo "sessions=$(who | wc -l)"
+"""
+
+
+def load_presets(presets_file=DEFAULT_PRESETS_FILE):
+    """读取连接预设 {名称: {"ip", "user", "pem_file", ...}}"""
+    try:
+        with open(presets_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_dashboard_settings(settings_file=DEFAULT_SETTINGS_FILE):
+    """读取 settings.json 中的 dashboard 配置"""
+    try:
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get("dashboard", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _percent(part, total):
+    return round(100.0 * part / total, 1) if total else None
+
+
+def parse_health(output):
+    """解析采集脚本的输出"""
+    fields = dict(line.split("=", 1) for line in output.splitlines() if "=" in line)
+    health = {}
+
+    def numbers(key):
+        return [float(v) for v in fields.get(key, "").split() if v.replace(".", "", 1).isdigit()]
+
+    if numbers("cpu"):
+        health["cpu_percent"] = numbers("cpu")[0]
+    if numbers("load"):
+        health["load"] = numbers("load")[0]
+    if numbers("cores"):
+        health["cores"] = int(numbers("cores")[0])
+    mem = numbers("mem")
+    if len(mem) == 2:
+        health["mem_total"] = int(mem[0]) * 1024
+        health["mem_percent"] = _percent(mem[1], mem[0])
+    disk = numbers("disk")
+    if len(disk) == 2:
+        health["disk_total"] = int(disk[0]) * 1024
+        health["disk_percent"] = _percent(disk[1], disk[0])
+    containers = numbers("containers")
+    if len(containers) == 2:
+        health["containers_running"], health["containers_total"] = int(containers[0]), int(containers[1])
+    if numbers("users"):
+        health["users"] = int(numbers("users")[0])
+    if numbers("sessions"):
+        health["sessions"] = int(numbers("sessions")[0])
+    return health
+
+
+class HealthPoller:
+    """
+    参数：
+        presets: {名称: 连接预设}
+        interval: 两轮轮询之间的间隔（秒）
+        timeout: 每台主机一次连接+采集的超时（秒）
+        max_workers: 同时轮询的主机数
+        on_update: on_update(name, health)，每台主机有结果（或超时）时在工作线程中调用
+    每台主机的结果为dict：ok、error、latency、polled_at 以及 parse_health 的各项指标
+    """
+
+    def __init__(self, presets, interval=30, timeout=10, max_workers=16, on_update=None):
+        self.presets = presets
+        self.interval = interval
+        self.timeout = timeout
+        self.on_update = on_update
+        self.results = {}
+        self._managers = {}       # {名称: SSHManager}，跨轮次复用
+        self._in_flight = {}      # {名称: Future}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="health")
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, on_update=None):
+        """按 connection_presets.json 和 settings.json 的 dashboard 配置创建"""
+        settings = load_dashboard_settings()
+        return cls(load_presets(),
+                   interval=settings.get("interval", 30),
+                   timeout=settings.get("timeout", 10),
+                   max_workers=settings.get("max_workers", 16),
+                   on_update=on_update)
+
+    def _manager(self, name):
+        """取该主机的连接，断开时重连"""
+        preset = self.presets[name]
+        with self._lock:
+            manager = self._managers.get(name)
+            if manager is None:
+                manager = SSHManager()
+                self._managers[name] = manager
+        if not manager.is_connected():
+            if not manager.connect(preset["ip"], preset.get("user", "root"), preset.get("pem_file"),
+                                   password=preset.get("password"), timeout=self.timeout,
+                                   port=preset.get("port", 22)):
+                raise ConnectionError("连接失败")
+        return manager
+
+    def _poll_host(self, name):
+        start = time.perf_counter()
+        manager = None
+        try:
+            manager = self._manager(name)
+            stdout, stderr, exit_status = manager.execute_command(_HEALTH_SCRIPT, timeout=self.timeout)
+            if exit_status != 0 or not stdout:
+                raise RuntimeError((stderr or "").strip() or f"退出码 {exit_status}")
+            health = parse_health(stdout)
+            health.update(ok=True, error=None)
+        except Exception as e:
+            health = {"ok": False, "error": str(e)}
+        health.update(latency=time.perf_counter() - start, polled_at=datetime.now())
+        # 已按超时处理（连接被关闭并移出连接池）的轮询，结果不再发布
+        with self._lock:
+            stale = manager is not None and self._managers.get(name) is not manager
+        if not stale:
+            self._publish(name, health)
+        return health
+
+    def _publish(self, name, health):
+        with self._lock:
+            self.results[name] = health
+        if self.on_update:
+            try:
+                self.on_update(name, health)
+            except Exception as e:
+                logger.debug("on_update回调出错: %s", e)
+
+    def poll_once(self):
+        """
+        并发轮询所有主机，最多等待timeout秒，返回 {名称: 结果}
+        超时的主机记为失败并断开其连接，上一轮仍未返回的主机本轮跳过
+        """
+        with self._lock:
+            self._in_flight = {name: future for name, future in self._in_flight.items() if not future.done()}
+            names = [name for name in self.presets if name not in self._in_flight]
+            futures = {name: self._pool.submit(self._poll_host, name) for name in names}
+            self._in_flight.update(futures)
+
+        _, pending = wait(futures.values(), timeout=self.timeout)
+        for name, future in futures.items():
+            if future in pending:
+                logger.warning("⚠️ 主机 %s 轮询超时(%s秒)", name, self.timeout)
+                self._publish(name, {"ok": False, "error": "超时", "latency": None, "polled_at": datetime.now()})
+                # 关闭连接让卡住的读取尽快返回，下一轮重新连接
+                with self._lock:
+                    manager = self._managers.pop(name, None)
+                if manager:
+                    manager.close()
+        with self._lock:
+            return dict(self.results)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """在后台线程中按interval持续轮询"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, daemon=True, name="health-poller")
+        self._thread.start()
+        logger.info("📡 开始轮询 %d 台服务器（每 %s 秒）", len(self.presets), self.interval)
+
+    def stop(self):
+        """停止轮询并关闭所有连接"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        self._pool.shutdown(wait=False)
+        with self._lock:
+            managers, self._managers = list(self._managers.values()), {}
+        for manager in managers:
+            manager.close()
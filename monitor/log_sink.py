@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+GUI日志管道
+任意线程写入的日志先进入队列，按固定帧率批量刷新到Text控件
+控件只保留最近的若干行，完整日志写入滚动日志文件；本次运行的全部日志另存一份临时文件，供"保存日志"导出。
+日志文件在第一次写入时才创建，启动时不写磁盘
+"""
+
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+
+class BatchedLogSink:
+    """
+    批量日志输出
+    参数：
+        root: Tk主窗口，用于在主线程中调度刷新
+        widget_getter: 返回当前日志Text控件的函数（界面切换后控件会变）
+        max_lines: 控件中最多保留的行数
+        flush_interval_ms: 刷新间隔，默认约20帧/秒
+        log_file: 完整日志文件路径，None表示不写文件
+        timestamp: 是否在每行前加时间戳
+    """
+
+    def __init__(self, root, widget_getter, max_lines=2000, flush_interval_ms=50,
+                 log_file="logs/gui.log", max_bytes=5 * 1024 * 1024, backup_count=5,
+                 timestamp=False):
+        self.root = root
+        self.widget_getter = widget_getter
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        self.timestamp = timestamp
+        self.log_file = log_file
+
+        self._queue = queue.SimpleQueue()
+        # 环形缓冲：界面切换到新的日志控件时用来回放最近的日志
+        self._recent = deque(maxlen=max_lines)
+        self._widget = None
+        self._widget_lines = 0
+        self._after_id = None
+
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._file_logger = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_file_logger(self):
+        """第一次写入时创建只写文件、不向上传播的logger"""
+        if not self.log_file:
+            return None
+        if self._file_logger is None:
+            with self._lock:
+                if self._file_logger is None:
+                    self._file_logger = self._create_file_logger(self.log_file, self._max_bytes,
+                                                                 self._backup_count)
+        return self._file_logger
+
+    def _create_file_logger(self, log_file, max_bytes, backup_count):
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_logger = logging.getLogger(f"server_manager.gui_sink.{os.path.abspath(log_file)}")
+        file_logger.propagate = False
+        file_logger.setLevel(logging.INFO)
+        if not file_logger.handlers:
+            handler = RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                          backupCount=backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            file_logger.addHandler(handler)
+        return file_logger
+
+    def start(self):
+        """开始定时刷新（需在主线程调用）"""
+        if self._after_id is None:
+            self._after_id = self.root.after(self.flush_interval_ms, self._tick)
+
+    def stop(self):
+        """停止刷新并把剩余日志写入控件"""
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        self.flush()
+
+    def write(self, message, persist=True):
+        """
+        写入一条日志，可在任意线程调用
+        persist为False时不写日志文件（来自logging的记录已由根logger写入文件，见 display）
+        """
+        message = str(message)
+        if self.timestamp:
+            message = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+        if persist and self._get_file_logger():
+            self._file_logger.info(message)
+        with self._lock:
+            if self._session is None:
+                self._session = tempfile.TemporaryFile("w+", encoding='utf-8')
+            self._session.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {message}\n")
+        self._queue.put(message)
+
+    def display(self, message):
+        """只显示（并记入本次运行的日志），不写日志文件，供 install_gui_handler 使用"""
+        self.write(message, persist=False)
+
+    def export(self, path):
+        """把本次运行的全部日志保存到path"""
+        with self._lock, open(path, 'w', encoding='utf-8') as f:
+            if self._session is not None:
+                self._session.flush()
+                self._session.seek(0)
+                shutil.copyfileobj(self._session, f)
+                self._session.seek(0, os.SEEK_END)
+
+    def clear(self):
+        """清空控件和回放缓冲"""
+        self._recent.clear()
+        widget = self._current_widget()
+        if widget is not None:
+            widget.delete("1.0", "end")
+        self._widget_lines = 0
+
+    def _tick(self):
+        self._after_id = None
+        try:
+            self.flush()
+        finally:
+            try:
+                self._after_id = self.root.after(self.flush_interval_ms, self._tick)
+            except Exception:
+                # 窗口已销毁
+                self._after_id = None
+
+    def _current_widget(self):
+        widget = self.widget_getter()
+        try:
+            if widget is None or not widget.winfo_exists():
+                return None
+        except Exception:
+            return None
+        return widget
+
+    def flush(self):
+        """把队列中的日志一次性写入控件（主线程调用）"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # 超过容量的部分直接丢弃（文件中仍保留）
+        lines = []
+        for message in batch:
+            lines.extend(message.split("\n"))
+        if len(lines) > self.max_lines:
+            lines = lines[-self.max_lines:]
+        self._recent.extend(lines)
+
+        widget = self._current_widget()
+        if widget is None:
+            return
+
+        if widget is not self._widget:
+            # 新的日志控件：回放环形缓冲里的最近日志
+            self._widget = widget
+            widget.delete("1.0", "end")
+            lines = list(self._recent)
+            self._widget_lines = 0
+
+        if not lines:
+            return
+
+        widget.insert("end", "\n".join(lines) + "\n")
+        self._widget_lines += len(lines)
+
+        excess = self._widget_lines - self.max_lines
+        if excess > 0:
+            widget.delete("1.0", f"{excess + 1}.0")
+            self._widget_lines -= excess
+
+        widget.see("end")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+结构化日志配置
+各模块使用 logging.getLogger(__name__)，级别和输出格式取自 config/settings.json：
+    "log_level": "INFO"            DEBUG / INFO / WARNING / ERROR
+    "log_format": "text"           text 或 json
+    "log_file": "logs/server_manager.log"   可选，滚动日志文件
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+DEFAULT_SETTINGS_FILE = "config/settings.json"
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# LogRecord自带的属性，JSON输出时其余属性视为extra字段
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，extra参数中的字段原样带出"""
+
+    def format(self, record):
+        payload = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class GuiLogHandler(logging.Handler):
+    """把日志转发给GUI的日志函数（如 ServerManagerGUI.log）"""
+
+    def __init__(self, write_func, level=logging.INFO):
+        super().__init__(level)
+        self.write_func = write_func
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record):
+        try:
+            self.write_func(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def load_log_settings(settings_file=DEFAULT_SETTINGS_FILE):
+    """从系统配置读取日志相关设置"""
+    settings = {}
+    try:
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    except (OSError, ValueError):
+        pass
+    return {
+        "log_level": str(settings.get("log_level", "INFO")).upper(),
+        "log_format": settings.get("log_format", "text"),
+        "log_file": settings.get("log_file")
+    }
+
+
+def setup_logging(settings_file=DEFAULT_SETTINGS_FILE, level=None, json_output=None, log_file=None):
+    """
+    配置根logger，可重复调用（会替换之前由本函数安装的handler）
+    显式参数优先于配置文件
+    """
+    settings = load_log_settings(settings_file)
+    level_name = (level or settings["log_level"]).upper()
+    if json_output is None:
+        json_output = settings["log_format"] == "json"
+    log_file = log_file or settings["log_file"]
+
+    formatter = JsonFormatter() if json_output else logging.Formatter(TEXT_FORMAT)
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if getattr(handler, "_server_manager", False):
+            root_logger.removeHandler(handler)
+            handler.close()
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        handlers.append(RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024,
+                                            backupCount=5, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler._server_manager = True
+        root_logger.addHandler(handler)
+
+    root_logger.setLevel(getattr(logging, level_name, logging.INFO))
+    # paramiko在DEBUG级别非常啰嗦，除非明确需要否则只看警告
+    logging.getLogger("paramiko").setLevel(logging.WARNING)
+    return root_logger
+
+
+def install_gui_handler(write_func, level=logging.INFO):
+    """把INFO及以上的日志同时显示到GUI日志面板（只保留一个GUI handler）"""
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, GuiLogHandler):
+            root_logger.removeHandler(handler)
+    handler = GuiLogHandler(write_func, level)
+    root_logger.addHandler(handler)
+    return handler
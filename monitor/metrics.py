@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+性能指标采集
+记录每类操作（连接、命令、传输、备份、部署）的耗时分布、失败次数和传输字节数，
+同时按主机分别统计，可导出到本地JSON文件并在GUI中展示
+"""
+
+import functools
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_METRICS_FILE = "logs/metrics.json"
+
+
+def _nearest_rank(ordered, p):
+    """最近秩法计算分位数，ordered为升序样本，p取0-100"""
+    rank = max(1, math.ceil(p / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Histogram:
+    """
+    耗时分布
+    样本超过容量后使用水塘抽样保留均匀样本，计数/总和/最值始终精确
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.samples = []
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < self.capacity:
+            self.samples.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < self.capacity:
+                self.samples[index] = value
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": _nearest_rank(ordered, 50),
+            "p95": _nearest_rank(ordered, 95),
+            "p99": _nearest_rank(ordered, 99)
+        }
+
+
+class OperationStats:
+    """单类操作的统计"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.bytes = 0
+
+    def summary(self):
+        data = self.latency.summary()
+        data["errors"] = self.errors
+        data["bytes"] = self.bytes
+        if self.bytes and self.latency.total > 0:
+            data["throughput_bps"] = self.bytes / self.latency.total
+        return data
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+        self._hosts = {}
+        self._counters = {}
+        self.started_at = datetime.now()
+
+    def _stats(self, table, key):
+        stats = table.get(key)
+        if stats is None:
+            stats = OperationStats()
+            table[key] = stats
+        return stats
+
+    def record(self, operation, seconds, host=None, ok=True, nbytes=0):
+        """记录一次操作"""
+        with self._lock:
+            targets = [self._stats(self._operations, operation)]
+            if host:
+                targets.append(self._stats(self._hosts.setdefault(host, {}), operation))
+            for stats in targets:
+                stats.latency.add(seconds)
+                if not ok:
+                    stats.errors += 1
+                stats.bytes += nbytes or 0
+
+    def increment(self, name, value=1):
+        """普通计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, operation, host=None):
+        """
+        计时上下文，可在块内设置结果：
+            with registry.timer("ssh.upload", host) as t:
+                ...
+                t["bytes"] = size
+                t["ok"] = False
+        块内抛出异常时自动记为失败
+        """
+        result = {"ok": True, "bytes": 0}
+        start = time.perf_counter()
+        try:
+            yield result
+        except BaseException:
+            result["ok"] = False
+            raise
+        finally:
+            self.record(operation, time.perf_counter() - start, host,
+                        result["ok"], result["bytes"])
+
+    def snapshot(self):
+        """返回当前统计的字典副本"""
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "generated_at": datetime.now().isoformat(),
+                "operations": {op: s.summary() for op, s in sorted(self._operations.items())},
+                "hosts": {
+                    host: {op: s.summary() for op, s in sorted(ops.items())}
+                    for host, ops in sorted(self._hosts.items())
+                },
+                "counters": dict(self._counters)
+            }
+
+    def save(self, path=DEFAULT_METRICS_FILE):
+        """导出到JSON文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._hosts.clear()
+            self._counters.clear()
+            self.started_at = datetime.now()
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """进程内共享的指标注册表"""
+    return _registry
+
+
+def instrument(operation, host=None, ok=None, nbytes=None):
+    """
+    给方法加上耗时统计的装饰器
+    host(self, *args, **kwargs)      -> 主机名
+    ok(result)                       -> 是否成功，默认按返回值真假判断
+    nbytes(result, *args, **kwargs)  -> 传输字节数
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            succeeded = False
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                succeeded = ok(result) if ok else bool(result)
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                try:
+                    host_name = host(*args, **kwargs) if host else None
+                    size = nbytes(result, *args, **kwargs) if (nbytes and succeeded) else 0
+                except Exception:
+                    host_name, size = None, 0
+                _registry.record(operation, elapsed, host_name, succeeded, size)
+        return wrapper
+    return decorator
+
+
+def format_duration(seconds):
+    """把秒数格式化为便于阅读的字符串"""
+    if seconds is None:
+        return "-"
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    if seconds < 60:
+        return f"{seconds:.2f}s"
+    return f"{seconds / 60:.1f}min"
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+服务器 -> 本地 增量同步
+比较服务器和本地目录的文件清单（大小+修改时间，修改时间不同而大小相同时再比较sha256），
+只传输有变化的文件：
+    小文件     打成一个tar流直接解压到本地目录，不在任何一端落临时压缩包
+    大文件     本地已有旧版本时按固定大小分块比较摘要，只下载变化的块（SFTP readv）
+服务器上已删除的文件在本地同步删除（.git 等受保护路径除外）。
+本地文件的修改时间设置为服务器上的时间，下次同步时未变化的文件直接跳过
+"""
+
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import shlex
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+from connect.transfer_scheduler import PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# 本地工作副本中不由同步管理的路径
+PROTECTED_NAMES = {".git", ".gitignore"}
+
+# 服务器端计算分块摘要的脚本，通过stdin交给python3执行，参数：块大小 文件...
+_BLOCK_HASH_SCRIPT = """
+import hashlib, json, sys
+block_size = int(sys.argv[1])
+result = {}
+for path in sys.argv[2:]:
+    hashes = []
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hashes.append(hashlib.sha1(block).hexdigest())
+    result[path] = hashes
+print(json.dumps(result))
+"""
+
+
+def _split_patterns(exclude_patterns):
+    """
+    返回 (名称规则, 目录名规则, 路径规则)：
+    不含'/'的规则按名称匹配任意一级路径；"node_modules/" 这样以'/'结尾的名称只匹配任意深度的同名目录；
+    其余含'/'的规则按相对路径（及其后缀）匹配
+    """
+    names, dir_names, paths = [], [], []
+    for pattern in exclude_patterns:
+        if "/" not in pattern:
+            names.append(pattern)
+        elif pattern.endswith("/") and "/" not in pattern.rstrip("/"):
+            dir_names.append(pattern.rstrip("/"))
+        else:
+            paths.append(pattern.strip("/"))
+    return names, dir_names, paths
+
+
+def is_excluded(rel_path, exclude_patterns):
+    """与tar --exclude 的非锚定匹配一致：文件本身或任意一级上级目录被排除时即排除"""
+    names, dir_names, paths = _split_patterns(exclude_patterns)
+    parts = rel_path.split("/")
+    if any(fnmatch.fnmatch(part, pattern) for part in parts for pattern in names):
+        return True
+    if any(fnmatch.fnmatch(part, pattern) for part in parts[:-1] for pattern in dir_names):
+        return True
+    # 每一级路径（上级目录及文件本身）的所有后缀
+    suffixes = ["/".join(parts[i:end]) for end in range(1, len(parts) + 1) for i in range(end)]
+    return any(fnmatch.fnmatch(suffix, pattern) for suffix in suffixes for pattern in paths)
+
+
+def _sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _block_hashes(path, block_size):
+    with open(path, 'rb') as f:
+        return [hashlib.sha1(block).hexdigest() for block in iter(lambda: f.read(block_size), b"")]
+
+
+class _TicketReader:
+    """按传输调度凭据限速的读取包装"""
+
+    def __init__(self, fileobj, ticket):
+        self.fileobj = fileobj
+        self.ticket = ticket
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        if data:
+            self.ticket.throttle(len(data))
+            self.bytes_read += len(data)
+        return data
+
+
+class DeltaSync:
+    """
+    参数：
+        ssh_manager: 已连接的SSHManager
+        exclude_patterns: 与tar --exclude相同写法的排除规则
+        delta_threshold: 不小于此大小的文件尝试分块增量下载
+        block_size: 分块大小
+        priority: 传输优先级（见 connect.transfer_scheduler）
+    """
+
+    def __init__(self, ssh_manager, exclude_patterns=None, delta_threshold=8 * 1024 * 1024,
+                 block_size=256 * 1024, priority=PRIORITY_INTERACTIVE):
+        self.ssh_manager = ssh_manager
+        self.exclude_patterns = list(exclude_patterns or [])
+        self.delta_threshold = delta_threshold
+        self.block_size = block_size
+        self.priority = priority
+
+    # ---------- 文件清单 ----------
+
+    def remote_manifest(self, remote_root):
+        """{相对路径: (大小, 修改时间)}，失败返回None；清单边读边解析，大目录也不会整个缓存在内存里"""
+        names, dir_names, _ = _split_patterns(self.exclude_patterns)
+        tests = [f"-name {shlex.quote(p)}" for p in names] + \
+                [f"-type d -name {shlex.quote(p)}" for p in dir_names]
+        prune = "\\( " + " -o ".join(tests) + " \\) -prune -o " if tests else ""
+        channel = self.ssh_manager.open_channel(
+            f"cd {shlex.quote(remote_root)} && find . {prune}-type f -printf '%P\\t%s\\t%T@\\0'")
+        if channel is None:
+            return None
+
+        errors = []
+        reader = threading.Thread(target=lambda: errors.append(channel.makefile_stderr('rb').read()),
+                                  daemon=True)
+        reader.start()
+        manifest = {}
+        buffer = b""
+        try:
+            while True:
+                data = channel.recv(256 * 1024)
+                if not data:
+                    break
+                *records, buffer = (buffer + data).split(b"\0")
+                for record in records:
+                    rel_path, size, mtime = record.decode('utf-8', errors='replace').rsplit("\t", 2)
+                    if not is_excluded(rel_path, self.exclude_patterns):
+                        manifest[rel_path] = (int(size), int(float(mtime)))
+            reader.join()
+            exit_status = channel.recv_exit_status()
+        finally:
+            channel.close()
+        if exit_status != 0:
+            stderr = b"".join(errors).decode('utf-8', errors='replace')
+            logger.error("❌ 获取服务器文件清单失败: %s", stderr.strip())
+            return None
+        return manifest
+
+    def local_manifest(self, local_root):
+        names, dir_names, _ = _split_patterns(self.exclude_patterns)
+        manifest = {}
+        local_root = Path(local_root)
+        for dirpath, dirnames, filenames in os.walk(local_root):
+            dirnames[:] = [d for d in dirnames if d not in PROTECTED_NAMES
+                           and not any(fnmatch.fnmatch(d, p) for p in names + dir_names)]
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                rel_path = path.relative_to(local_root).as_posix()
+                if (filename in PROTECTED_NAMES or path.is_symlink()
+                        or is_excluded(rel_path, self.exclude_patterns)):
+                    continue
+                st = path.stat()
+                manifest[rel_path] = (st.st_size, int(st.st_mtime))
+        return manifest
+
+    def _remote_hashes(self, remote_root, rel_paths):
+        """服务器上一批文件的sha256，{相对路径: 摘要}"""
+        if not rel_paths:
+            return {}
+        payload = "\0".join(rel_paths).encode('utf-8')
+        stdout, _, exit_status = self.ssh_manager.execute_with_stdin(
+            f"cd {shlex.quote(remote_root)} && xargs -0 sha256sum", [payload], priority=self.priority)
+        hashes = {}
+        if exit_status == 0 and stdout:
+            for line in stdout.splitlines():
+                digest, _, rel_path = line.partition("  ")
+                hashes[rel_path] = digest
+        return hashes
+
+    def diff(self, remote_root, local_root, remote=None, local=None):
+        """返回 (需要下载的相对路径列表, 需要删除的相对路径列表)"""
+        remote = self.remote_manifest(remote_root) if remote is None else remote
+        local = self.local_manifest(local_root) if local is None else local
+
+        changed, suspect = [], []
+        for rel_path, (size, mtime) in remote.items():
+            if rel_path not in local:
+                changed.append(rel_path)
+            elif local[rel_path][0] != size:
+                changed.append(rel_path)
+            elif local[rel_path][1] != mtime:
+                # 只有修改时间不同（如被touch过），比较内容再决定
+                suspect.append(rel_path)
+
+        remote_hashes = self._remote_hashes(remote_root, suspect)
+        for rel_path in suspect:
+            local_path = Path(local_root) / rel_path
+            if remote_hashes.get(rel_path) == _sha256(local_path):
+                os.utime(local_path, (remote[rel_path][1], remote[rel_path][1]))
+            else:
+                changed.append(rel_path)
+
+        deleted = [rel_path for rel_path in local if rel_path not in remote]
+        return sorted(changed), sorted(deleted)
+
+    # ---------- 传输 ----------
+
+    def _fetch_tar(self, remote_root, local_root, rel_paths, size):
+        """把一批文件打成tar流下载并解压到本地，返回实际传输的字节数，失败返回None"""
+        channel = self.ssh_manager.open_channel(
+            f"cd {shlex.quote(remote_root)} && tar -czf - --null -T -")
+        if channel is None:
+            return None
+
+        # tar边读文件列表边输出，列表很长时写stdin和读stdout必须同时进行，
+        # stderr也要同时读取，否则任一方向的通道窗口写满都会互相等待
+        errors = []
+        stderr_reader = threading.Thread(
+            target=lambda: errors.append(channel.makefile_stderr('rb').read()), daemon=True)
+        stderr_reader.start()
+
+        def send_list():
+            try:
+                channel.sendall("\0".join(rel_paths).encode('utf-8'))
+                channel.shutdown_write()
+            except OSError as e:
+                logger.debug("写入文件列表中断: %s", e)
+
+        writer = threading.Thread(target=send_list, daemon=True)
+        writer.start()
+
+        extract_kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+        try:
+            with self.ssh_manager.transfer_scheduler.transfer(
+                    self.ssh_manager.ip_address, self.priority, size, name=remote_root) as ticket:
+                reader = _TicketReader(channel.makefile('rb'), ticket)
+                with tarfile.open(fileobj=reader, mode="r|gz") as tar:
+                    for member in tar:
+                        if member.name.startswith("/") or ".." in Path(member.name).parts:
+                            logger.warning("⚠️ 跳过不安全的路径: %s", member.name)
+                            continue
+                        tar.extract(member, local_root, **extract_kwargs)
+            writer.join()
+            stderr_reader.join()
+            exit_status = channel.recv_exit_status()
+            if exit_status not in (0, 1):
+                # tar退出码1只表示打包期间有文件被修改
+                stderr = b"".join(errors).decode('utf-8', errors='replace')
+                logger.error("❌ 服务器打包失败(退出码 %s): %s", exit_status, stderr.strip())
+                return None
+            return reader.bytes_read
+        except (tarfile.TarError, OSError, EOFError) as e:
+            logger.error("❌ 下载解压失败: %s", e)
+            return None
+        finally:
+            channel.close()
+
+    def _remote_block_hashes(self, remote_root, rel_paths):
+        command = (f"cd {shlex.quote(remote_root)} && python3 - {self.block_size} "
+                   + " ".join(shlex.quote(p) for p in rel_paths))
+        stdout, stderr, exit_status = self.ssh_manager.execute_with_stdin(
+            command, [_BLOCK_HASH_SCRIPT.encode('utf-8')], priority=self.priority)
+        if exit_status != 0 or not stdout:
+            logger.warning("⚠️ 服务器分块摘要计算失败，改为整文件下载: %s", (stderr or "").strip())
+            return {}
+        try:
+            return json.loads(stdout)
+        except ValueError:
+            return {}
+
+    def _patch_file(self, remote_path, local_path, remote_size, remote_mtime, remote_hashes):
+        """按分块摘要只下载变化的块，返回下载字节数；变化比例过高或失败返回None"""
+        local_hashes = _block_hashes(local_path, self.block_size)
+        changed = [i for i, digest in enumerate(remote_hashes)
+                   if i >= len(local_hashes) or local_hashes[i] != digest]
+        ranges = [(i * self.block_size, min(self.block_size, remote_size - i * self.block_size))
+                  for i in changed]
+        transfer_size = sum(length for _, length in ranges)
+        if transfer_size > remote_size // 2:
+            return None
+
+        chunks = self.ssh_manager.read_ranges(remote_path, ranges, self.priority) if ranges else []
+        if chunks is None:
+            return None
+
+        temp_path = local_path.with_name(local_path.name + ".delta-tmp")
+        blocks = dict(zip(changed, chunks))
+        with open(local_path, 'rb') as old, open(temp_path, 'wb') as new:
+            for i in range(len(remote_hashes)):
+                if i in blocks:
+                    new.write(blocks[i])
+                else:
+                    old.seek(i * self.block_size)
+                    new.write(old.read(self.block_size))
+        if os.path.getsize(temp_path) != remote_size:
+            os.remove(temp_path)
+            return None
+        os.replace(temp_path, local_path)
+        os.utime(local_path, (remote_mtime, remote_mtime))
+        return transfer_size
+
+    # ---------- 入口 ----------
+
+    def sync(self, remote_root, local_root):
+        """
+        把服务器目录同步到本地目录，返回统计：
+            {"success", "changed", "deleted", "delta_files", "bytes_total", "bytes_transferred", "seconds"}
+        """
+        start = time.perf_counter()
+        local_root = Path(local_root)
+        local_root.mkdir(parents=True, exist_ok=True)
+        stats = {"success": False, "changed": 0, "deleted": 0, "delta_files": 0,
+                 "bytes_total": 0, "bytes_transferred": 0, "seconds": 0.0}
+
+        remote = self.remote_manifest(remote_root)
+        if remote is None:
+            return stats
+        changed, deleted = self.diff(remote_root, local_root, remote=remote)
+        stats["changed"] = len(changed)
+        stats["bytes_total"] = sum(remote[p][0] for p in changed)
+        logger.info("🔍 对比完成: %d 个文件有变化，%d 个文件已在服务器删除", len(changed), len(deleted))
+
+        # 本地已有旧版本的大文件尝试分块增量
+        candidates = [p for p in changed if remote[p][0] >= self.delta_threshold
+                      and (local_root / p).is_file()]
+        whole = [p for p in changed if p not in candidates]
+        if candidates:
+            remote_hashes = self._remote_block_hashes(remote_root, candidates)
+            for rel_path in candidates:
+                size, mtime = remote[rel_path]
+                transferred = None
+                if rel_path in remote_hashes:
+                    transferred = self._patch_file(f"{remote_root.rstrip('/')}/{rel_path}",
+                                                   local_root / rel_path, size, mtime,
+                                                   remote_hashes[rel_path])
+                if transferred is None:
+                    whole.append(rel_path)
+                else:
+                    stats["delta_files"] += 1
+                    stats["bytes_transferred"] += transferred
+                    logger.info("🧩 分块增量: %s（下载 %.1fMB / %.1fMB）", rel_path,
+                                transferred / 1024 / 1024, size / 1024 / 1024)
+
+        if whole:
+            transferred = self._fetch_tar(remote_root, local_root, whole,
+                                          sum(remote[p][0] for p in whole))
+            if transferred is None:
+                stats["seconds"] = time.perf_counter() - start
+                return stats
+            stats["bytes_transferred"] += transferred
+
+        for rel_path in deleted:
+            path = local_root / rel_path
+            path.unlink(missing_ok=True)
+            parent = path.parent
+            while parent != local_root and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        stats["deleted"] = len(deleted)
+
+        stats["success"] = True
+        stats["seconds"] = time.perf_counter() - start
+        logger.info("✅ 同步完成: 更新 %d 个文件（分块增量 %d 个），删除 %d 个，传输 %.1fMB，用时 %.1f秒",
+                    stats["changed"], stats["delta_files"], stats["deleted"],
+                    stats["bytes_transferred"] / 1024 / 1024, stats["seconds"])
+        return stats
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Git上传流水线
+每条git命令都通过 cwd= 指定工作目录、使用独立的环境变量运行，不再调用 os.chdir，
+多个项目可以在不同线程中同时上传，互不影响进程的当前目录（以及依赖相对路径的配置读取）。
+提交前先做推送前分析（见 projects.push_analysis），超过GitHub上限的大文件按配置
+改用LFS跟踪或排除，预计推送过大时直接中止；推送使用 --progress，解析进度后按项目回调
+"""
+
+import logging
+import os
+import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from projects.push_analysis import GITHUB_FILE_LIMIT, analyze_staged
+
+logger = logging.getLogger(__name__)
+
+# 超过单文件上限的文件的处理方式
+LARGE_FILE_LFS = "lfs"
+LARGE_FILE_EXCLUDE = "exclude"
+LARGE_FILE_ABORT = "abort"
+
+# git push --progress 的进度行，如 "Writing objects:  45% (9/20)"
+_PROGRESS_RE = re.compile(r"([A-Za-z ]+):\s+(\d+)%")
+
+
+class GitCommandError(Exception):
+    """git命令执行失败"""
+
+    def __init__(self, args, returncode, stderr):
+        super().__init__(f"git {' '.join(args)} 失败(退出码 {returncode}): {stderr.strip()}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class PrePushError(Exception):
+    """推送前分析发现GitHub必然拒绝的内容"""
+
+
+def git_env(extra=None):
+    """git子进程使用的环境：不弹出交互式认证提示（否则工作线程会一直阻塞），输出不做本地化"""
+    env = dict(os.environ)
+    env.update({"GIT_TERMINAL_PROMPT": "0", "LC_ALL": "C"})
+    if extra:
+        env.update(extra)
+    return env
+
+
+def run_git(args, cwd, env=None, check=True, timeout=300):
+    """在cwd中运行一条git命令，返回CompletedProcess"""
+    result = subprocess.run(["git", *args], cwd=str(cwd), env=env or git_env(),
+                            capture_output=True, text=True, timeout=timeout)
+    if check and result.returncode != 0:
+        raise GitCommandError(args, result.returncode, result.stderr)
+    return result
+
+
+class PushProgressParser:
+    """解析 git push --progress 的输出：进度行回调 progress(job, stage, percent)，其余行收集到output"""
+
+    def __init__(self, job, progress):
+        self.job = job
+        self.progress = progress
+        self.output = []
+        self._buffer = b""
+        self._last = None
+
+    def feed(self, data):
+        self._buffer += data
+        # 进度行以 \r 刷新，普通输出以 \n 结束
+        *lines, self._buffer = re.split(rb"[\r\n]", self._buffer)
+        for line in lines:
+            text = line.decode('utf-8', errors='replace').strip()
+            if not text:
+                continue
+            match = _PROGRESS_RE.search(text)
+            if match:
+                stage, percent = match.group(1).strip(), int(match.group(2))
+                if (stage, percent) != self._last:
+                    self._last = (stage, percent)
+                    self.progress(self.job, stage, percent)
+            else:
+                self.output.append(text)
+
+
+class UploadJob:
+    """一个项目的上传任务"""
+
+    def __init__(self, project_name, project_path, repo_url, git_user, git_email, message=None):
+        self.project_name = project_name
+        self.project_path = Path(project_path)
+        self.repo_url = repo_url
+        self.git_user = git_user
+        self.git_email = git_email
+        self.message = message or (f"Upload {project_name} from server - "
+                                   f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+
+class GitUploadPipeline:
+    """
+    参数：
+        max_workers: 同时推送的项目数
+        prepare: prepare(project_path)，提交前对工作目录的处理（如写入.gitignore）
+        env: 额外的环境变量（如 GIT_SSH_COMMAND）
+        large_file_action: 超过GitHub单文件上限的文件 lfs 改用Git LFS / exclude 不上传 / abort 中止
+    """
+
+    def __init__(self, max_workers=3, prepare=None, env=None, large_file_action=LARGE_FILE_EXCLUDE):
+        self.max_workers = max_workers
+        self.prepare = prepare
+        self.env = git_env(env)
+        self.large_file_action = large_file_action
+
+    def _git(self, job, *args, check=True):
+        return run_git(args, job.project_path, env=self.env, check=check)
+
+    def _project_exists(self, job):
+        return job.project_path.exists()
+
+    def _is_repo(self, job):
+        return (job.project_path / ".git").exists()
+
+    def _remote_branch(self, job):
+        """当前分支对应的远端跟踪分支（origin/<分支>），远端还没有该分支时返回None"""
+        branch = self._git(job, "symbolic-ref", "--short", "HEAD").stdout.strip()
+        ref = f"refs/remotes/origin/{branch}"
+        return ref if self._git(job, "rev-parse", "--verify", "-q", ref, check=False).returncode == 0 else None
+
+    def _analyze(self, job):
+        # 与远端分支比较，尚未推送的提交中的文件也计入本次推送
+        return analyze_staged(job.project_path, self.env, base=self._remote_branch(job))
+
+    def _ensure_repo(self, job):
+        if not self._is_repo(job):
+            self._git(job, "init")
+            self._git(job, "remote", "add", "origin", job.repo_url)
+            return
+        result = self._git(job, "remote", "get-url", "origin", check=False)
+        if result.returncode != 0:
+            self._git(job, "remote", "add", "origin", job.repo_url)
+        elif result.stdout.strip() != job.repo_url:
+            self._git(job, "remote", "set-url", "origin", job.repo_url)
+
+    def _lfs_available(self, job):
+        return self._git(job, "lfs", "version", check=False).returncode == 0
+
+    def _exclude_files(self, job, rel_paths):
+        """从暂存区移除，并写入 .git/info/exclude（不会被 create_gitignore 覆盖）"""
+        exclude_file = job.project_path / ".git" / "info" / "exclude"
+        exclude_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(exclude_file, 'a', encoding='utf-8') as f:
+            for rel_path in rel_paths:
+                f.write(f"/{rel_path}\n")
+        self._git(job, "rm", "--cached", "-q", "--", *rel_paths)
+
+    def _track_with_lfs(self, job, rel_paths):
+        self._git(job, "lfs", "install", "--local")
+        self._git(job, "lfs", "track", "--filename", "--", *rel_paths)
+        # 重新暂存，让文件以LFS指针的形式进入提交
+        self._git(job, "rm", "--cached", "-q", "--", *rel_paths)
+        self._git(job, "add", ".gitattributes", "--", *rel_paths)
+
+    def _unpushed_oversize(self, job):
+        """
+        尚未推送的本地提交中超过单文件上限的blob [(提交, 路径, 大小)]
+        这些文件已在历史里，从暂存区移除或改用LFS都不能让推送通过
+        """
+        base = self._remote_branch(job)
+        if base:
+            revs = [f"{base}..HEAD"]
+        elif self._git(job, "rev-parse", "--verify", "-q", "HEAD", check=False).returncode == 0:
+            revs = ["HEAD"]
+        else:
+            return []
+        # blob:limit 过滤掉的（大小不小于limit）对象以 ~ 开头列出
+        limit = f"--filter=blob:limit={GITHUB_FILE_LIMIT + 1}"
+        omitted = [line[1:].strip() for line in
+                   self._git(job, "rev-list", "--objects", limit, "--filter-print-omitted", *revs).stdout.splitlines()
+                   if line.startswith("~")]
+        if not omitted:
+            return []
+        paths = {}
+        for line in self._git(job, "rev-list", "--objects", *revs).stdout.splitlines():
+            sha, _, path = line.partition(" ")
+            paths.setdefault(sha, path)
+        found = []
+        for sha in omitted:
+            size = int(self._git(job, "cat-file", "-s", sha).stdout.strip())
+            commit = self._git(job, "log", "-1", "--format=%h", f"--find-object={sha}", *revs).stdout.strip()
+            found.append((commit, paths.get(sha, sha), size))
+        return found
+
+    def check_push(self, job, report):
+        """推送前分析，处理超限大文件，必然被拒绝时抛出 PrePushError"""
+        report(job, "推送前分析")
+        history = self._unpushed_oversize(job)
+        if history:
+            listing = ", ".join(f"{path} ({size / 1024 / 1024:.0f}MB, 提交 {commit})"
+                                for commit, path, size in history)
+            raise PrePushError(f"尚未推送的提交中已包含超过GitHub单文件上限100MB的文件，"
+                               f"需要先改写这些提交: {listing}")
+        analysis = self._analyze(job)
+        for rel_path, size in analysis.large:
+            logger.warning("⚠️ %s: 大文件 %s (%.1fMB)，GitHub会给出警告", job.project_name,
+                           rel_path, size / 1024 / 1024)
+
+        if analysis.oversize:
+            rel_paths = [rel_path for rel_path, _ in analysis.oversize]
+            listing = ", ".join(f"{rel_path} ({size / 1024 / 1024:.0f}MB)" for rel_path, size in analysis.oversize)
+            action = self.large_file_action
+            if action == LARGE_FILE_LFS and not self._lfs_available(job):
+                logger.warning("⚠️ 未安装git-lfs，超限文件改为排除")
+                action = LARGE_FILE_EXCLUDE
+            if action == LARGE_FILE_LFS:
+                report(job, f"使用Git LFS跟踪超限文件: {listing}")
+                self._track_with_lfs(job, rel_paths)
+            elif action == LARGE_FILE_EXCLUDE:
+                report(job, f"排除超过100MB的文件: {listing}")
+                self._exclude_files(job, rel_paths)
+            else:
+                raise PrePushError(f"以下文件超过GitHub单文件上限100MB: {listing}")
+            analysis = self._analyze(job)
+
+        report(job, f"分析完成: {analysis.summary()}")
+        if analysis.over_budget and analysis.upper_bound:
+            # 只是上限估算，实际压缩后可能在上限以内，交给GitHub判断
+            logger.warning("⚠️ %s: 按未压缩大小估算推送 %.1fGB，可能超过GitHub单次推送上限2GB",
+                           job.project_name, analysis.estimated_pack_size / 1024 / 1024 / 1024)
+        elif analysis.over_budget:
+            raise PrePushError(f"预计推送 {analysis.estimated_pack_size / 1024 / 1024 / 1024:.1f}GB，"
+                               f"超过GitHub单次推送上限2GB")
+        return analysis
+
+    def _push(self, job, progress):
+        """推送当前分支，逐行解析stderr中的进度"""
+        branch = self._git(job, "symbolic-ref", "--short", "HEAD").stdout.strip()
+        process = subprocess.Popen(["git", "push", "--progress", "-u", "origin", branch],
+                                   cwd=str(job.project_path), env=self.env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        parser = PushProgressParser(job, progress)
+        for data in iter(lambda: process.stderr.read1(4096), b""):
+            parser.feed(data)
+        returncode = process.wait()
+        if returncode != 0:
+            raise GitCommandError(["push", "origin", branch], returncode, "\n".join(parser.output[-5:]))
+        return branch
+
+    def upload(self, job, progress=None):
+        """
+        执行一个项目的完整上传：配置 -> 暂存 -> 推送前分析 -> 提交 -> 推送
+        失败抛出 GitCommandError，推送前分析不通过抛出 PrePushError
+        """
+        def report(job, stage, percent=None):
+            if progress:
+                progress(job, stage, percent)
+
+        if not self._project_exists(job):
+            raise FileNotFoundError(f"项目目录不存在: {job.project_path}")
+
+        report(job, "配置仓库")
+        self._ensure_repo(job)
+        self._git(job, "config", "user.name", job.git_user)
+        self._git(job, "config", "user.email", job.git_email)
+        if self.prepare:
+            self.prepare(job.project_path)
+
+        report(job, "添加文件")
+        self._git(job, "add", ".")
+        self.check_push(job, report)
+        if self._git(job, "diff", "--cached", "--quiet", check=False).returncode == 0:
+            report(job, "没有需要提交的更改")
+        else:
+            report(job, "提交更改")
+            self._git(job, "commit", "-m", job.message)
+
+        report(job, "推送", 0)
+        return self._push(job, report)
+
+    def upload_many(self, jobs, progress=None, on_result=None):
+        """
+        并行上传多个项目，返回 {项目名: 错误信息或None}
+        progress(job, stage, percent) 与 on_result(job, error) 在工作线程中调用
+        """
+        results = {}
+        lock = threading.Lock()
+
+        def task(job):
+            error = None
+            try:
+                self.upload(job, progress)
+            except (GitCommandError, PrePushError, OSError, subprocess.SubprocessError) as e:
+                error = str(e)
+                logger.error("❌ 项目 %s 上传失败: %s", job.project_name, e)
+            with lock:
+                results[job.project_name] = error
+            if on_result:
+                on_result(job, error)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="git-push") as pool:
+            list(pool.map(task, jobs))
+        return results
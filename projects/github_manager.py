@@ -10,6 +10,8 @@ import subprocess
 from pathlib import Path
 from datetime import datetime
 
+from monitor.metrics import instrument
+
 class GitHubManager:
     def __init__(self, config_file="config/projects.json"):
         self.config_file = config_file
@@ -100,6 +102,8 @@ class GitHubManager:
         
         return list(self.projects.keys())
     
+    @instrument("github.deploy_project",
+                host=lambda self, name, ssh_manager, *a, **k: getattr(ssh_manager, "ip_address", None))
     def deploy_project(self, project_name, ssh_manager):
         """部署指定项目到服务器"""
         if project_name not in self.projects:
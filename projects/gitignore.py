@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+.gitignore 规则匹配
+支持常用写法：# 注释、! 取反、结尾 / 只匹配目录、以 / 开头或中间含 / 的规则相对根目录匹配、
+* ? [...] 通配符以及 ** 跨目录匹配。规则按顺序匹配，最后一条命中的规则决定结果
+"""
+
+import re
+from pathlib import Path
+
+
+def _translate(pattern):
+    """把gitignore通配符转换为正则表达式（匹配相对路径）"""
+    i, n, out = 0, len(pattern), []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    """一组gitignore规则"""
+
+    def __init__(self, lines=()):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            if "/" in line:
+                regex = "^" + _translate(line.lstrip("/")) + "$"
+            else:
+                # 不含 / 的规则匹配任意一级的名称
+                regex = "(?:^|/)" + _translate(line) + "$"
+            self.rules.append((re.compile(regex), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path):
+        """读取.gitignore文件，文件不存在时返回空规则"""
+        path = Path(path)
+        if not path.is_file():
+            return cls()
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return cls(f)
+
+    def match(self, rel_path, is_dir=False):
+        """
+        rel_path相对于.gitignore所在目录，使用 / 分隔
+        与git一样，被忽略目录下的内容由调用方在遍历时整体跳过
+        """
+        ignored = False
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.search(rel_path):
+                ignored = not negate
+        return ignored
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+推送前分析
+在提交和推送之前检查暂存区中相对远端分支新增/修改的文件（包括尚未推送的提交中的）：
+    超过GitHub单文件上限(100MB)的文件会被拒绝，超过50MB的文件GitHub会给出警告
+    单次推送超过2GB会被拒绝
+大小取暂存区中blob的大小（git cat-file --batch-check），已改用LFS跟踪的文件按指针计算；
+压缩率并行采样（zlib压缩文件开头一段），据此估算推送的pack大小，
+在上传开始之前几秒内发现问题，而不是传了一个小时后才被拒绝
+"""
+
+import subprocess
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+GITHUB_FILE_LIMIT = 100 * 1024 * 1024
+GITHUB_FILE_WARNING = 50 * 1024 * 1024
+GITHUB_PUSH_LIMIT = 2 * 1024 * 1024 * 1024
+
+# 估算压缩率时每个文件采样的字节数
+_SAMPLE_SIZE = 256 * 1024
+
+
+def staged_files(project_path, env=None, base=None):
+    """
+    需要推送的暂存文件（相对路径）：base为远端分支（如 origin/main）时取暂存区相对它新增/修改的文件，
+    远端还没有该分支时暂存区中的所有文件都需要推送
+    """
+    if base:
+        args = ["git", "diff", "--cached", "--name-only", "-z", "--diff-filter=ACMR", base]
+    else:
+        args = ["git", "ls-files", "-z"]
+    result = subprocess.run(args, cwd=str(project_path), env=env, capture_output=True, check=True)
+    return [name for name in result.stdout.decode('utf-8', errors='replace').split("\0") if name]
+
+
+def staged_blob_sizes(project_path, rel_paths, env=None):
+    """暂存区中这些文件的blob大小 {相对路径: 字节}（LFS跟踪的文件为指针大小，子模块不计）"""
+    if not rel_paths:
+        return {}
+    result = subprocess.run(["git", "ls-files", "-s", "-z", "--", *rel_paths],
+                            cwd=str(project_path), env=env, capture_output=True, check=True)
+    blobs = {}
+    for record in result.stdout.decode('utf-8', errors='replace').split("\0"):
+        if not record:
+            continue
+        info, _, rel_path = record.partition("\t")
+        mode, sha, _ = info.split(" ", 2)
+        if mode != "160000":
+            blobs[rel_path] = sha
+
+    result = subprocess.run(["git", "cat-file", "--batch-check=%(objectname) %(objectsize)"],
+                            cwd=str(project_path), env=env, capture_output=True, check=True,
+                            input="".join(f"{sha}\n" for sha in blobs.values()).encode('utf-8'))
+    sizes = {}
+    for line in result.stdout.decode('utf-8').splitlines():
+        sha, _, size = line.partition(" ")
+        if size.isdigit():
+            sizes[sha] = int(size)
+    return {rel_path: sizes[sha] for rel_path, sha in blobs.items() if sha in sizes}
+
+
+def estimate_compressed_size(path, size):
+    """按文件开头一段的zlib压缩率估算整个文件压缩后的大小"""
+    if size == 0:
+        return 0
+    with open(path, 'rb') as f:
+        sample = f.read(_SAMPLE_SIZE)
+    if not sample:
+        return 0
+    ratio = len(zlib.compress(sample, 1)) / len(sample)
+    return int(size * min(ratio, 1.0))
+
+
+class PushAnalysis:
+    """分析结果"""
+
+    def __init__(self):
+        self.files = 0
+        self.total_size = 0
+        self.estimated_pack_size = 0
+        self.oversize = []   # [(相对路径, 大小)] 超过单文件上限
+        self.large = []      # [(相对路径, 大小)] 超过警告线
+        # 没有采样压缩率、按未压缩大小估算时为True，此时预计推送大小只是上限
+        self.upper_bound = False
+
+    def add(self, rel_path, size, compressed_size):
+        self.files += 1
+        self.total_size += size
+        self.estimated_pack_size += compressed_size
+        if size > GITHUB_FILE_LIMIT:
+            self.oversize.append((rel_path, size))
+        elif size > GITHUB_FILE_WARNING:
+            self.large.append((rel_path, size))
+
+    @property
+    def over_budget(self):
+        return self.estimated_pack_size > GITHUB_PUSH_LIMIT
+
+    def summary(self):
+        return (f"{self.files} 个文件，{self.total_size / 1024 / 1024:.1f}MB，"
+                f"预计推送 {self.estimated_pack_size / 1024 / 1024:.1f}MB")
+
+
+def analyze_staged(project_path, env=None, workers=8, base=None):
+    """并行扫描需要推送的暂存文件，返回PushAnalysis，base见 staged_files"""
+    project_path = Path(project_path)
+    analysis = PushAnalysis()
+    sizes = staged_blob_sizes(project_path, staged_files(project_path, env, base), env)
+
+    def scan(item):
+        rel_path, size = item
+        path = project_path / rel_path
+        try:
+            # 工作区文件与blob大小不同时（LFS指针、clean过滤器）无法采样，按未压缩计算
+            if path.is_symlink() or not path.is_file() or path.stat().st_size != size:
+                return rel_path, size, size
+            return rel_path, size, estimate_compressed_size(path, size)
+        except OSError:
+            return rel_path, size, size
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="push-scan") as pool:
+        for rel_path, size, compressed in pool.map(scan, sizes.items()):
+            analysis.add(rel_path, size, compressed)
+    return analysis
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+在服务器上直接提交并推送到GitHub
+项目文件不再先下载到本机再推送，数据只从服务器到GitHub走一次。
+流程与本地上传相同（见 GitUploadPipeline），只是每条git命令都通过SSH在服务器的项目目录中执行。
+推送凭据两种方式，都不在服务器上留下密钥：
+    token   短期令牌经SSH通道的stdin传入，只存在于git进程的环境变量中，
+            由临时的GIT_ASKPASS脚本（不含令牌本身）交给git，推送结束即删除
+    agent   把本机ssh-agent转发给推送命令，服务器用本机的GitHub密钥推送（仓库地址改用SSH形式）
+"""
+
+import re
+import shlex
+import subprocess
+
+from projects.git_pipeline import GitCommandError, GitUploadPipeline, PushProgressParser
+from projects.push_analysis import PushAnalysis
+
+AUTH_TOKEN = "token"
+AUTH_AGENT = "agent"
+
+_GITHUB_HTTPS_RE = re.compile(r"^https://github\.com/(.+?)(?:\.git)?/?$")
+_GITHUB_SSH_RE = re.compile(r"^git@github\.com:(.+?)(?:\.git)?$")
+
+# 服务器上的git命令统一使用的环境
+_GIT_ENV = "GIT_TERMINAL_PROMPT=0 LC_ALL=C"
+
+# 令牌推送脚本：令牌从stdin读入，GIT_ASKPASS脚本只引用环境变量
+_TOKEN_PUSH_SCRIPT = """set -e
+exec 1>&2
+cd {path}
+askpass=$(mktemp)
+trap 'rm -f "$askpass"' EXIT
+cat > "$askpass" <<'EOF'
+#!/bin/sh
+case "$1" in Username*) echo x-access-token ;; *) echo "$GIT_TOKEN" ;; esac
+EOF
+chmod 700 "$askpass"
+IFS= read -r GIT_TOKEN
+export GIT_TOKEN GIT_ASKPASS="$askpass" {env}
+git -c credential.helper= push --progress -u origin {branch}
+"""
+
+_AGENT_PUSH_SCRIPT = """set -e
+exec 1>&2
+cd {path}
+export GIT_SSH_COMMAND="ssh -o BatchMode=yes -o StrictHostKeyChecking=accept-new" {env}
+git push --progress -u origin {branch}
+"""
+
+
+def to_ssh_url(url):
+    """https://github.com/owner/repo.git -> git@github.com:owner/repo.git"""
+    match = _GITHUB_HTTPS_RE.match(url)
+    return f"git@github.com:{match.group(1)}.git" if match else url
+
+
+def to_https_url(url):
+    """git@github.com:owner/repo.git -> https://github.com/owner/repo.git"""
+    match = _GITHUB_SSH_RE.match(url)
+    return f"https://github.com/{match.group(1)}.git" if match else url
+
+
+class RemoteGitPipeline(GitUploadPipeline):
+    """
+    参数：
+        ssh_manager: 已连接的SSHManager
+        auth: token 或 agent
+        token: auth为token时使用的GitHub令牌
+        gitignore: 服务器项目目录中没有.gitignore时写入的内容
+        其余参数同 GitUploadPipeline
+    """
+
+    def __init__(self, ssh_manager, auth=AUTH_TOKEN, token=None, gitignore=None, **kwargs):
+        super().__init__(**kwargs)
+        self.ssh_manager = ssh_manager
+        self.auth = auth
+        self.token = token
+        self.gitignore = gitignore
+        if gitignore:
+            self.prepare = self._write_gitignore
+
+    @staticmethod
+    def _path(job):
+        return shlex.quote(job.project_path.as_posix())
+
+    def _run(self, job, command, timeout=300):
+        stdout, stderr, exit_status = self.ssh_manager.execute_command(
+            f"cd {self._path(job)} && {command}", timeout=timeout)
+        if exit_status is None:
+            exit_status = -1
+        return subprocess.CompletedProcess(command, exit_status, stdout or "", stderr or "")
+
+    def _git(self, job, *args, check=True):
+        result = self._run(job, f"{_GIT_ENV} git " + " ".join(shlex.quote(a) for a in args))
+        if check and result.returncode != 0:
+            raise GitCommandError(list(args), result.returncode, result.stderr)
+        return result
+
+    # ---------- 覆盖本地实现的部分 ----------
+
+    def _project_exists(self, job):
+        return self.ssh_manager.file_exists(job.project_path.as_posix())
+
+    def _is_repo(self, job):
+        return self._run(job, "test -d .git").returncode == 0
+
+    def _write_gitignore(self, project_path):
+        path = shlex.quote(f"{project_path.as_posix()}/.gitignore")
+        self.ssh_manager.execute_with_stdin(f"test -e {path} || cat > {path}",
+                                            [self.gitignore.encode('utf-8')])
+
+    def _analyze(self, job):
+        """
+        服务器上取暂存区中blob的大小（LFS跟踪的文件为指针大小），与远端分支比较；
+        不采样压缩率，推送大小按未压缩大小估算（上限）
+        """
+        base = self._remote_branch(job)
+        if base:
+            list_files = f"git diff --cached --name-only -z --diff-filter=ACMR {shlex.quote(base)}"
+        else:
+            list_files = "git ls-files -z"
+        # ls-files -s 的 "模式 对象 阶段<TAB>路径" 改写为 "对象 路径"（跳过子模块），cat-file 原样带回 %(rest)；
+        # pipefail让前面任何一步失败都反映在退出码上，不会得到一个空的分析结果
+        pipeline = (f"set -o pipefail; {_GIT_ENV} {list_files} | {_GIT_ENV} xargs -0 -r git ls-files -s -z -- "
+                    f"| tr '\\0' '\\n' | sed -n '/^160000 /!s/^[0-7]* \\([0-9a-f]*\\) [0-9]*\t/\\1 /p' "
+                    f"| {_GIT_ENV} git cat-file --batch-check='%(objectsize) %(rest)'")
+        result = self._run(job, "bash -c " + shlex.quote(pipeline), timeout=600)
+        if result.returncode != 0:
+            raise GitCommandError(list_files.split()[1:], result.returncode, result.stderr)
+        analysis = PushAnalysis()
+        analysis.upper_bound = True
+        for line in result.stdout.splitlines():
+            size, _, rel_path = line.partition(" ")
+            if size.isdigit():
+                analysis.add(rel_path, int(size), int(size))
+        return analysis
+
+    def _exclude_files(self, job, rel_paths):
+        lines = "".join(f"/{rel_path}\n" for rel_path in rel_paths)
+        result = self._run(job, f"mkdir -p .git/info && printf %s {shlex.quote(lines)} >> .git/info/exclude")
+        if result.returncode != 0:
+            raise GitCommandError(["info/exclude"], result.returncode, result.stderr)
+        self._git(job, "rm", "--cached", "-q", "--", *rel_paths)
+
+    def _push(self, job, progress):
+        branch = self._git(job, "symbolic-ref", "--short", "HEAD").stdout.strip()
+        script = _TOKEN_PUSH_SCRIPT if self.auth == AUTH_TOKEN else _AGENT_PUSH_SCRIPT
+        command = "bash -c " + shlex.quote(script.format(path=self._path(job), env=_GIT_ENV,
+                                                          branch=shlex.quote(branch)))
+        channel = self.ssh_manager.open_channel(command, forward_agent=self.auth == AUTH_AGENT)
+        if channel is None:
+            raise GitCommandError(["push", "origin", branch], -1, "无法在服务器上启动推送")
+
+        parser = PushProgressParser(job, progress)
+        try:
+            if self.auth == AUTH_TOKEN:
+                channel.sendall((self.token or "").encode('utf-8') + b"\n")
+            channel.shutdown_write()
+            for data in iter(lambda: channel.recv_stderr(4096), b""):
+                parser.feed(data)
+            exit_status = channel.recv_exit_status()
+        finally:
+            channel.close()
+        if exit_status != 0:
+            raise GitCommandError(["push", "origin", branch], exit_status, "\n".join(parser.output[-5:]))
+        return branch
+
+    def upload(self, job, progress=None):
+        # 令牌走HTTPS，ssh-agent走SSH
+        job.repo_url = to_https_url(job.repo_url) if self.auth == AUTH_TOKEN else to_ssh_url(job.repo_url)
+        return super().upload(job, progress)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+用户项目工作区
+每个用户在 /home/<用户>/projects/<项目> 下有自己的检出，项目定义来自 GitHubManager。
+服务器上为每个项目维护一份共享镜像 /home/shared/mirrors/<项目>.git（git clone --mirror），
+用户克隆时通过 --reference 借用镜像中的对象，多个用户的检出不重复下载、不重复占用磁盘，
+拉取时也只需从GitHub获取镜像中还没有的对象。
+所有项目的状态（分支、未提交更改、领先/落后）在一次SSH调用中批量获取，拉取并发执行
+"""
+
+import logging
+import shlex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIRROR_ROOT = "/home/shared/mirrors"
+
+# 批量状态脚本：每个仓库输出一个 @@repo 标记行，后跟 git status --porcelain=v2 --branch 的结果
+_STATUS_SCRIPT = """cd {root} 2>/dev/null || exit 0
+{fetch}
+for d in */; do
+    [ -d "$d.git" ] || continue
+    echo "@@repo ${{d%/}}"
+    git -C "$d" status --porcelain=v2 --branch 2>/dev/null
+done
+"""
+
+_FETCH_ALL = """for d in */; do [ -d "$d.git" ] && git -C "$d" fetch -q --prune 2>/dev/null & done; wait"""
+
+
+def parse_status(output):
+    """解析批量状态脚本的输出，返回 {项目名: 状态}"""
+    statuses = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith("@@repo "):
+            current = {"branch": None, "upstream": None, "ahead": 0, "behind": 0,
+                       "changed": 0, "untracked": 0}
+            statuses[line[len("@@repo "):]] = current
+        elif current is None or not line:
+            continue
+        elif line.startswith("# branch.head "):
+            current["branch"] = line.split(" ", 2)[2]
+        elif line.startswith("# branch.upstream "):
+            current["upstream"] = line.split(" ", 2)[2]
+        elif line.startswith("# branch.ab "):
+            ahead, behind = line.split()[2:4]
+            current["ahead"], current["behind"] = int(ahead), -int(behind)
+        elif line.startswith("?"):
+            current["untracked"] += 1
+        elif not line.startswith("#"):
+            current["changed"] += 1
+    for status in statuses.values():
+        status["dirty"] = bool(status["changed"] or status["untracked"])
+    return statuses
+
+
+class WorkspaceManager:
+    """
+    参数：
+        ssh_manager: 以该用户身份登录的SSHManager
+        github_manager: GitHubManager（项目定义：url、branch）
+        username: 用户名
+        mirror_root: 共享镜像目录
+        workspace_root: 用户检出目录，默认 /home/<用户>/projects
+    """
+
+    def __init__(self, ssh_manager, github_manager, username, mirror_root=DEFAULT_MIRROR_ROOT,
+                 workspace_root=None):
+        self.ssh_manager = ssh_manager
+        self.github_manager = github_manager
+        self.username = username
+        self.mirror_root = mirror_root
+        self.workspace_root = workspace_root or f"/home/{username}/projects"
+
+    def projects(self):
+        return self.github_manager.projects
+
+    def workspace_path(self, project_name):
+        return f"{self.workspace_root}/{project_name}"
+
+    def mirror_path(self, project_name):
+        return f"{self.mirror_root}/{project_name}.git"
+
+    # ---------- 镜像 ----------
+
+    def _mirror_command(self, project_name):
+        """
+        创建或更新共享镜像的命令，镜像目录不可写时什么也不做（克隆时不使用镜像）
+        用户检出通过alternates直接引用镜像中的对象，镜像里的对象一旦被删除这些检出就会损坏：
+        镜像关闭自动gc、不清理过期对象，fetch也不带 --prune（被删除的分支保留在镜像中）。
+        core.sharedRepository=group 让任何组内用户fetch写入的新对象其他人也能读写
+        """
+        project = self.projects()[project_name]
+        mirror = shlex.quote(self.mirror_path(project_name))
+        root = shlex.quote(self.mirror_root)
+        settings = [("gc.auto", "0"), ("gc.pruneExpire", "never"), ("core.sharedRepository", "group")]
+        config = " && ".join(f"git -C {mirror} config {key} {value}" for key, value in settings)
+        clone_config = " ".join(f"-c {key}={value}" for key, value in settings)
+        return (f"if [ -d {mirror} ]; then "
+                f"  if [ -w {mirror} ]; then {config} && git -C {mirror} fetch -q; fi; "
+                f"elif mkdir -p {root} 2>/dev/null && [ -w {root} ]; then "
+                f"  git clone -q --mirror {clone_config} {shlex.quote(project['url'])} {mirror} "
+                f"  && chmod -R g+rwX {mirror}; "
+                f"fi")
+
+    def update_mirrors(self, project_names):
+        """并发创建或更新多个项目的共享镜像，失败不影响后续操作"""
+        project_names = [name for name in project_names if name in self.projects()]
+        commands = [self._mirror_command(name) for name in project_names]
+        for name, (_, stderr, exit_status) in zip(project_names,
+                                                  self.ssh_manager.execute_commands(commands, timeout=1800)):
+            if exit_status != 0:
+                logger.warning("⚠️ 更新共享镜像失败: %s, %s", name, (stderr or "").strip())
+
+    # ---------- 工作区操作 ----------
+
+    def clone(self, project_name):
+        """在用户工作区中检出项目，有共享镜像时借用其对象"""
+        if project_name not in self.projects():
+            logger.error("❌ 项目不存在: %s", project_name)
+            return False
+
+        project = self.projects()[project_name]
+        target = self.workspace_path(project_name)
+        if self.ssh_manager.file_exists(f"{target}/.git"):
+            logger.info("📁 项目已在工作区中: %s", target)
+            return True
+
+        self.update_mirrors([project_name])
+        logger.info("📥 检出项目 %s -> %s", project_name, target)
+        command = (f"mkdir -p {shlex.quote(self.workspace_root)} && "
+                   f"git clone -q --reference-if-able {shlex.quote(self.mirror_path(project_name))} "
+                   f"-b {shlex.quote(project.get('branch', 'main'))} "
+                   f"{shlex.quote(project['url'])} {shlex.quote(target)}")
+        _, stderr, exit_status = self.ssh_manager.execute_command(command, timeout=1800)
+        if exit_status != 0:
+            logger.error("❌ 检出失败: %s, %s", project_name, (stderr or "").strip())
+            return False
+        logger.info("✅ 检出完成: %s", target)
+        return True
+
+    def status(self, fetch=False):
+        """
+        一次SSH调用获取工作区中所有项目的状态
+        fetch为True时先并行fetch所有项目，领先/落后按最新的远端计算
+        返回 {项目名: {"branch", "upstream", "ahead", "behind", "changed", "untracked", "dirty"}}
+        """
+        script = _STATUS_SCRIPT.format(root=shlex.quote(self.workspace_root),
+                                       fetch=_FETCH_ALL if fetch else "")
+        stdout, stderr, exit_status = self.ssh_manager.execute_command(
+            "bash -c " + shlex.quote(script), timeout=600 if fetch else 60)
+        if exit_status != 0 or stdout is None:
+            logger.error("❌ 获取工作区状态失败: %s", (stderr or "").strip())
+            return {}
+        return parse_status(stdout)
+
+    def pull(self, project_names=None):
+        """
+        并发拉取（只快进），返回 {项目名: (是否成功, 输出)}
+        拉取前先更新共享镜像，各检出只需从GitHub获取镜像中没有的对象
+        """
+        if project_names is None:
+            project_names = list(self.status())
+        if not project_names:
+            return {}
+
+        self.update_mirrors(project_names)
+
+        logger.info("🔄 并发拉取 %d 个项目", len(project_names))
+        commands = [f"cd {shlex.quote(self.workspace_path(name))} && git pull -q --ff-only 2>&1"
+                    for name in project_names]
+        results = {}
+        for name, (stdout, stderr, exit_status) in zip(project_names,
+                                                       self.ssh_manager.execute_commands(commands, timeout=600)):
+            output = ((stdout or "") + (stderr or "")).strip()
+            results[name] = (exit_status == 0, output)
+            if exit_status == 0:
+                logger.info("✅ 已拉取: %s", name)
+            else:
+                logger.warning("⚠️ 拉取失败: %s, %s", name, output)
+        return results
@@ -0,0 +1 @@
+# 用户批量开通模块
\ No newline at end of file
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+用户批量开通
+把一份用户名单（CSV或JSON，含公钥、sudo、配额、附加组）编译成一个bash脚本，
+每台服务器只执行一次（脚本经stdin传入，密码不出现在命令行中），多台服务器并行执行。
+脚本中的每一步都先检查现状，只在需要时修改，重复执行没有副作用；
+每次修改输出一行 "@@change 用户 说明"，汇总成每台服务器的变更报告。
+dry_run时只检查不修改，报告即为将要进行的变更
+"""
+
+import csv
+import json
+import logging
+import re
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_USERNAME_RE = re.compile(r"^[a-z_][a-z0-9_-]{0,31}$")
+_PUBKEY_RE = re.compile(r"^(ssh-(rsa|dss|ed25519)|ecdsa-sha2-nistp\d+|sk-\S+@openssh\.com) [A-Za-z0-9+/=]+( [^\r\n]*)?$")
+
+# 脚本开头：公共函数。act 在dry_run时不执行修改
+_PRELUDE = r"""set -u
+DRY_RUN={dry_run}
+act() {{ [ "$DRY_RUN" = 1 ] || "$@"; }}
+changed() {{ echo "@@change $1 $2"; }}
+failed() {{ echo "@@error $1 $2"; }}
+sudo_group=sudo
+getent group sudo >/dev/null 2>&1 || sudo_group=wheel
+
+ensure_user() {{  # 用户 shell 密码
+    id -u "$1" >/dev/null 2>&1 && return 0
+    act useradd -m -s "$2" "$1" || {{ failed "$1" "创建用户失败"; return 1; }}
+    changed "$1" "创建用户"
+    if [ -n "$3" ]; then
+        if printf '%s:%s\n' "$1" "$3" | act chpasswd; then
+            changed "$1" "设置初始密码"
+        else
+            failed "$1" "设置初始密码失败"
+        fi
+    fi
+}}
+
+home_of() {{
+    h=$(getent passwd "$1" | cut -d: -f6)
+    echo "${{h:-/home/$1}}"
+}}
+
+ensure_group() {{  # 用户 组
+    getent group "$2" >/dev/null 2>&1 || {{ failed "$1" "组不存在: $2"; return 0; }}
+    id -nG "$1" 2>/dev/null | tr ' ' '\n' | grep -qx "$2" && return 0
+    act usermod -aG "$2" "$1" && changed "$1" "加入组 $2"
+}}
+
+as_user() {{  # 用户 命令...：以该用户身份执行，用户可控的路径不会被root跟随符号链接写到别处
+    u=$1; shift
+    runuser -u "$u" -- "$@"
+}}
+
+ensure_mode() {{  # 用户 路径 权限 说明，失败时返回1（调用方跳过后续步骤）
+    if [ -L "$2" ]; then failed "$1" "$4 是符号链接，已跳过"; return 1; fi
+    if [ ! -e "$2" ]; then
+        if [ "$3" = 700 ]; then act as_user "$1" mkdir -p "$2"; else act as_user "$1" touch "$2"; fi \
+            && act as_user "$1" chmod "$3" "$2" || {{ failed "$1" "创建 $4 失败"; return 1; }}
+        changed "$1" "创建 $4"
+        return 0
+    fi
+    if [ "$(stat -c %U "$2")" != "$1" ]; then
+        act chown -h "$1:" "$2" || {{ failed "$1" "修正 $4 属主失败"; return 1; }}
+        changed "$1" "修正 $4 属主"
+    fi
+    if [ "$(stat -c %a "$2")" != "$3" ]; then
+        act as_user "$1" chmod "$3" "$2" || {{ failed "$1" "修正 $4 权限失败"; return 1; }}
+        changed "$1" "修正 $4 权限为 $3"
+    fi
+}}
+
+ensure_key() {{  # 用户 公钥 说明
+    f="$(home_of "$1")/.ssh/authorized_keys"
+    [ -f "$f" ] && grep -qxF -- "$2" "$f" && return 0
+    if [ "$DRY_RUN" != 1 ]; then
+        printf '%s\n' "$2" | as_user "$1" tee -a "$f" >/dev/null || {{ failed "$1" "写入公钥失败"; return 0; }}
+    fi
+    changed "$1" "添加公钥 $3"
+}}
+
+ensure_quota() {{  # 用户 KB：配额设在用户主目录所在的文件系统上
+    command -v setquota >/dev/null 2>&1 || {{ failed "$1" "未安装setquota，配额未生效"; return 0; }}
+    fs=$(df -P "$(home_of "$1")" 2>/dev/null | awk 'NR == 2 {{ print $6 }}')
+    [ -n "$fs" ] || {{ failed "$1" "找不到主目录所在的文件系统，配额未生效"; return 0; }}
+    cur=$(quota -w -u -f "$fs" "$1" 2>/dev/null | awk 'NR > 2 {{ print $3; exit }}')
+    [ "$cur" = "$2" ] && return 0
+    act setquota -u "$1" "$2" "$2" 0 0 "$fs" && changed "$1" "设置配额 $(($2 / 1024 / 1024))GB（$fs）"
+}}
+"""
+
+
+class UserSpec:
+    """名单中的一个用户"""
+
+    def __init__(self, username, pubkeys=None, password=None, sudo=False, docker=True,
+                 quota_gb=None, groups=None, shell="/bin/bash"):
+        self.username = username
+        self.pubkeys = list(pubkeys or [])
+        self.password = password
+        self.sudo = sudo
+        self.docker = docker
+        self.quota_gb = quota_gb
+        self.groups = list(groups or [])
+        self.shell = shell
+
+    def validate(self):
+        """检查用户名和公钥格式，有问题时抛出 ValueError"""
+        if not _USERNAME_RE.match(self.username or ""):
+            raise ValueError(f"无效的用户名: {self.username!r}")
+        for key in self.pubkeys:
+            if not _PUBKEY_RE.match(key):
+                raise ValueError(f"用户 {self.username} 的公钥格式无效: {key[:40]}...")
+        for group in self.groups:
+            if not _USERNAME_RE.match(group):
+                raise ValueError(f"用户 {self.username} 的组名无效: {group!r}")
+        if self.quota_gb is not None and self.quota_gb <= 0:
+            raise ValueError(f"用户 {self.username} 的配额必须大于0")
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "是")
+    return bool(value)
+
+
+def _as_list(value, sep):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(sep) if item.strip()]
+    return [item.strip() for item in value if item.strip()]
+
+
+def _spec_from_record(record):
+    quota = record.get("quota_gb")
+    spec = UserSpec(
+        username=(record.get("username") or "").strip(),
+        pubkeys=_as_list(record.get("pubkeys") or record.get("pubkey"), "\n"),
+        password=record.get("password") or None,
+        sudo=_as_bool(record.get("sudo", False)),
+        docker=_as_bool(record.get("docker", True)),
+        quota_gb=int(quota) if quota not in (None, "") else None,
+        groups=_as_list(record.get("groups"), ","),
+        shell=record.get("shell") or "/bin/bash")
+    spec.validate()
+    return spec
+
+
+def load_roster(path):
+    """
+    读取用户名单，返回 [UserSpec]，格式错误抛出 ValueError
+    JSON：[{...}] 或 {"users": [{...}]}
+    CSV：表头 username,pubkey,sudo,quota_gb,groups,password（多个组用逗号分隔，需加引号）
+    字段：username 必填；pubkey/pubkeys、password、sudo、docker（默认true）、quota_gb、groups、shell 可选
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records = data.get("users", []) if isinstance(data, dict) else data
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            records = list(csv.DictReader(f))
+
+    specs, seen = [], set()
+    for index, record in enumerate(records, 1):
+        try:
+            spec = _spec_from_record(record)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"{path.name} 第{index}条: {e}") from e
+        if spec.username in seen:
+            raise ValueError(f"{path.name} 第{index}条: 用户 {spec.username} 重复")
+        seen.add(spec.username)
+        specs.append(spec)
+    return specs
+
+
+def _key_label(key):
+    """公钥在报告中的显示：类型 + 注释"""
+    parts = key.split(None, 2)
+    return f"{parts[0]} {parts[2]}" if len(parts) == 3 else f"{parts[0]} {parts[1][-12:]}"
+
+
+def compile_script(specs, dry_run=False):
+    """把名单编译成一个幂等的bash脚本"""
+    lines = [_PRELUDE.format(dry_run=1 if dry_run else 0)]
+    for spec in specs:
+        spec.validate()
+        q = shlex.quote
+        user = q(spec.username)
+        lines.append(f"# ---- {spec.username} ----")
+        lines.append(f"if ensure_user {user} {q(spec.shell)} {q(spec.password or '')}; then")
+        lines.append(f"    h=$(home_of {user})")
+        # .ssh 或 authorized_keys 是符号链接时不写入公钥
+        lines.append(f"    if ensure_mode {user} \"$h/.ssh\" 700 .ssh && "
+                     f"ensure_mode {user} \"$h/.ssh/authorized_keys\" 600 authorized_keys; then")
+        for key in spec.pubkeys:
+            lines.append(f"        ensure_key {user} {q(key)} {q(_key_label(key))}")
+        if not spec.pubkeys:
+            lines.append("        :")
+        lines.append("    fi")
+        # 没有安装Docker的服务器上docker组不存在，默认的docker组直接跳过，不算错误
+        if spec.docker:
+            lines.append(f"    getent group docker >/dev/null 2>&1 && ensure_group {user} docker")
+        for group in spec.groups:
+            lines.append(f"    ensure_group {user} {q(group)}")
+        if spec.sudo:
+            lines.append(f"    ensure_group {user} \"$sudo_group\"")
+        if spec.quota_gb:
+            lines.append(f"    ensure_quota {user} {spec.quota_gb * 1024 * 1024}")
+        lines.append("fi")
+    lines.append("exit 0")
+    return "\n".join(lines) + "\n"
+
+
+def parse_report(output):
+    """解析脚本输出，返回 {"changes": {用户: [说明]}, "errors": {用户: [说明]}}"""
+    report = {"changes": {}, "errors": {}}
+    for line in output.splitlines():
+        for marker, key in (("@@change ", "changes"), ("@@error ", "errors")):
+            if line.startswith(marker):
+                user, _, message = line[len(marker):].partition(" ")
+                report[key].setdefault(user, []).append(message)
+    return report
+
+
+class UserProvisioner:
+    """
+    参数：
+        max_workers: 同时开通的服务器数
+        timeout: 单台服务器执行脚本的超时（秒）
+    """
+
+    def __init__(self, max_workers=8, timeout=600):
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def provision_host(self, ssh_manager, specs, dry_run=False):
+        """在一台服务器上执行开通脚本，返回 {"ok", "error", "changes", "errors"}"""
+        script = compile_script(specs, dry_run)
+        # 非root登录时用sudo执行（不能交互输入密码）
+        command = "bash -s" if ssh_manager.username == "root" else "sudo -n bash -s"
+        stdout, stderr, exit_status = ssh_manager.execute_with_stdin(
+            command, [script.encode('utf-8')], timeout=self.timeout)
+        report = parse_report(stdout or "")
+        report["ok"] = exit_status == 0 and not report["errors"]
+        report["error"] = None if exit_status == 0 else ((stderr or "").strip() or f"退出码 {exit_status}")
+        return report
+
+    def provision(self, specs, ssh_managers, dry_run=False):
+        """并行在多台服务器上开通同一份名单，返回 {服务器IP: 报告}"""
+        logger.info("👥 %s %d 个用户到 %d 台服务器", "预演开通" if dry_run else "开通",
+                    len(specs), len(ssh_managers))
+
+        def task(ssh_manager):
+            try:
+                return ssh_manager.ip_address, self.provision_host(ssh_manager, specs, dry_run)
+            except Exception as e:
+                logger.error("❌ %s 开通失败: %s", ssh_manager.ip_address, e)
+                return ssh_manager.ip_address, {"ok": False, "error": str(e), "changes": {}, "errors": {}}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="provision") as pool:
+            return dict(pool.map(task, ssh_managers))
+
+
+def format_report(results, dry_run=False):
+    """把 provision 的结果整理成便于阅读的文本"""
+    verb = "将要" if dry_run else "已"
+    lines = []
+    for host, report in results.items():
+        changes = sum(len(items) for items in report["changes"].values())
+        status = "✅" if report["ok"] else "❌"
+        lines.append(f"{status} {host}: {verb}进行 {changes} 项变更")
+        if report["error"]:
+            lines.append(f"   ❌ {report['error']}")
+        for user in sorted(set(report["changes"]) | set(report["errors"])):
+            for message in report["changes"].get(user, []):
+                lines.append(f"   {user}: {message}")
+            for message in report["errors"].get(user, []):
+                lines.append(f"   ⚠️ {user}: {message}")
+        if not changes and not report["errors"] and not report["error"]:
+            lines.append("   所有用户已是最新状态")
+    return "\n".join(lines)
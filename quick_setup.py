@@ -8,6 +8,8 @@ import argparse
 import os
 import sys
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 添加模块路径
@@ -17,14 +19,25 @@ from connect.ssh_manager import SSHManager
 from connect.pem_handler import PEMHandler
 from projects.github_manager import GitHubManager
 from backup.backup_manager import BackupManager
+from backup.migration import ProjectMigration
+from backup.parallel_runner import ParallelBackupRunner
+from backup.scheduler import BackupScheduler
+from monitor.logging_setup import setup_logging
+from monitor.metrics import get_registry
+from provision.user_provisioner import UserProvisioner, UserSpec, format_report, load_roster
 
 class QuickSetup:
-    def __init__(self):
+    def __init__(self, ssh_manager=None, github_manager=None, backup_manager=None):
         self.pem_path = r"E:\server_connect\luojie.pem"
-        self.ssh_manager = SSHManager()
+        # 允许调用方（如GUI）传入已有的管理器，避免重复创建
+        self.ssh_manager = ssh_manager or SSHManager()
         self.pem_handler = PEMHandler()
-        self.github_manager = GitHubManager()
-        self.backup_manager = BackupManager()
+        self.github_manager = github_manager or GitHubManager()
+        self.backup_manager = backup_manager or BackupManager()
+        
+        # 备份调度器连接其他主机时使用的连接缓存
+        self._scheduler_lock = threading.Lock()
+        self._scheduler_managers = {}
         
         # 加载配置
         self.load_config()
@@ -40,7 +53,9 @@ class QuickSetup:
                 "pem_file": self.pem_path,
                 "default_users": ["luojie", "heyi"],
                 "project_dir": "/home/shared/projects",
-                "backup_dir": "./backups"
+                "backup_dir": "./backups",
+                "log_level": "INFO",
+                "log_format": "text"
             }
             self.save_config()
     
@@ -80,43 +95,60 @@ class QuickSetup:
             print("❌ 服务器连接失败！")
             return False
     
-    def setup_users(self):
-        """设置用户"""
+    def setup_users(self, roster_file=None):
+        """设置用户：按名单文件开通，未指定时开通配置中的默认用户（sudo + docker）"""
         print("👥 创建和配置用户...")
         
         if not self.ssh_manager.is_connected():
             print("❌ SSH未连接")
             return False
-            
-        # 上传user_setup.sh脚本
-        script_path = Path("scripts/user_setup.sh")
-        if not script_path.exists():
-            print("❌ 找不到user_setup.sh脚本")
+        
+        try:
+            specs = (load_roster(roster_file) if roster_file else
+                     [UserSpec(name, sudo=True) for name in self.config.get("default_users", [])])
+        except (OSError, ValueError) as e:
+            print(f"❌ 读取用户名单失败: {e}")
             return False
-            
-        remote_script = "/tmp/user_setup.sh"
-        if not self.ssh_manager.upload_file(str(script_path), remote_script):
-            print("❌ 上传脚本失败")
+        
+        results = UserProvisioner().provision(specs, [self.ssh_manager])
+        print(format_report(results))
+        if not all(report["ok"] for report in results.values()):
             return False
             
-        # 设置脚本权限并执行
-        commands = [
-            f"chmod +x {remote_script}",
-            f"sudo bash {remote_script}"
-        ]
-        
-        for cmd in commands:
-            stdout, stderr, exit_code = self.ssh_manager.execute_command(cmd)
-            if exit_code != 0:
-                print(f"❌ 命令执行失败: {cmd}")
-                print(f"错误信息: {stderr}")
-                return False
-            if stdout:
-                print(stdout)
-            
         print("✅ 用户创建完成")
         return True
     
+    def provision_users(self, roster_file, hosts, dry_run=False):
+        """按名单在多台服务器上并行开通用户，dry_run时只报告将要进行的变更"""
+        try:
+            specs = load_roster(roster_file)
+        except (OSError, ValueError) as e:
+            print(f"❌ 读取用户名单失败: {e}")
+            return False
+        if not self.check_pem_file():
+            return False
+        # 同一台服务器只执行一次
+        hosts = list(dict.fromkeys(hosts))
+        
+        def connect(ip_address):
+            manager = SSHManager()
+            return manager if manager.connect(ip_address, "root", self.pem_path) else None
+        
+        with ThreadPoolExecutor(max_workers=len(hosts) or 1) as pool:
+            managers = list(pool.map(connect, hosts))
+        for ip_address, manager in zip(hosts, managers):
+            if manager is None:
+                print(f"❌ 无法连接服务器: {ip_address}")
+        connected = [manager for manager in managers if manager]
+        
+        try:
+            results = UserProvisioner().provision(specs, connected, dry_run=dry_run)
+            print(format_report(results, dry_run=dry_run))
+        finally:
+            for manager in connected:
+                manager.close()
+        return len(connected) == len(hosts) and all(report["ok"] for report in results.values())
+    
     def setup_docker(self):
         """设置Docker环境"""
         print("🐳 配置Docker环境...")
@@ -183,13 +215,84 @@ class QuickSetup:
         if project_names is None:
             project_names = self.github_manager.list_deployed_projects(self.ssh_manager)
         
-        for project_name in project_names:
-            print(f"📦 备份项目: {project_name}")
-            success = self.backup_manager.backup_project(project_name, self.ssh_manager)
+        def report(project_name, success):
             if success:
                 print(f"✅ 项目 {project_name} 备份成功")
             else:
                 print(f"❌ 项目 {project_name} 备份失败")
+        
+        # 多个项目并行：一个项目在服务器上压缩时，另一个项目可以同时下载
+        runner = ParallelBackupRunner.from_config(self.backup_manager)
+        results = runner.run(project_names, self.ssh_manager, on_result=report)
+        return all(results.values())
+    
+    def _scheduler_connection(self, host):
+        """调度器使用的连接：默认主机复用当前连接（断开时重连），其他主机单独建立连接"""
+        if host in (None, self.ssh_manager.ip_address):
+            if self.ssh_manager.is_connected() or self.connect_server(self.ssh_manager.ip_address):
+                return self.ssh_manager
+            return None
+        
+        with self._scheduler_lock:
+            manager = self._scheduler_managers.get(host)
+            if manager is None or not manager.is_connected():
+                manager = SSHManager()
+                if not manager.connect(host, "root", self.pem_path):
+                    return None
+                self._scheduler_managers[host] = manager
+            return manager
+    
+    def run_scheduler(self):
+        """前台运行备份调度器，执行 backups/schedules.json 中的计划，Ctrl+C 退出"""
+        scheduler_config = self.config.get("scheduler", {})
+        scheduler = BackupScheduler(
+            self.backup_manager, self._scheduler_connection,
+            default_host=self.ssh_manager.ip_address,
+            max_per_host=scheduler_config.get("max_per_host", 1),
+            jitter_seconds=scheduler_config.get("jitter_seconds", 1800),
+            max_workers=scheduler_config.get("max_workers", 4),
+            poll_interval=scheduler_config.get("poll_interval", 30))
+        
+        print("⏰ 备份调度器运行中，按 Ctrl+C 退出")
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop(wait=False)
+            print("\n⏹️ 备份调度器已停止")
+    
+    def migrate_projects(self, project_names, target_ip, mode="auto", target_address=None):
+        """把项目从当前服务器迁移到目标服务器，数据不经过本地磁盘"""
+        if not self.ssh_manager.is_connected():
+            print("❌ 请先连接服务器")
+            return False
+        
+        target_ssh = SSHManager()
+        if not target_ssh.connect(target_ip, "root", self.pem_path):
+            print(f"❌ 无法连接目标服务器: {target_ip}")
+            return False
+        
+        def progress(done, total):
+            if total:
+                print(f"\r🚚 已传输 {done * 100 // total}%", end="", flush=True)
+        
+        migration = ProjectMigration(self.backup_manager, progress_callback=progress)
+        success = True
+        try:
+            for project_name in project_names:
+                result = migration.migrate(project_name, self.ssh_manager, target_ssh,
+                                           mode=mode, target_address=target_address)
+                print()
+                if result["success"] and result["verified"]:
+                    print(f"✅ 项目 {project_name} 已迁移到 {target_ip}（{result['mode']}）")
+                elif result["success"]:
+                    print(f"⚠️ 项目 {project_name} 已迁移，但校验不一致")
+                    success = False
+                else:
+                    print(f"❌ 项目 {project_name} 迁移失败")
+                    success = False
+        finally:
+            target_ssh.close()
+        return success
     
     def interactive_mode(self):
         """交互模式"""
@@ -246,12 +349,51 @@ def main():
     parser.add_argument("--projects", nargs="*", help="部署指定项目")
     parser.add_argument("--backup", nargs="*", help="备份指定项目")
     parser.add_argument("--interactive", action="store_true", help="交互模式")
+    parser.add_argument("--browse", metavar="BACKUP_FILE", help="浏览本地备份内容（不解压）")
+    parser.add_argument("--restore", metavar="BACKUP_FILE", help="恢复备份，配合 --paths 只恢复部分文件")
+    parser.add_argument("--paths", nargs="+", help="要浏览/恢复的路径或通配符")
+    parser.add_argument("--scheduler", action="store_true", help="运行备份调度器，执行已创建的备份计划")
+    parser.add_argument("--prune", nargs="*", metavar="PROJECT", help="按保留策略清理本地备份（可指定项目）")
+    parser.add_argument("--dry-run", action="store_true", help="配合 --prune / --provision 只显示将进行的变更")
+    parser.add_argument("--verify", nargs="*", metavar="PROJECT", help="校验本地备份完整性（可指定项目）")
+    parser.add_argument("--decompress", action="store_true", help="配合 --verify 完整解压测试")
+    parser.add_argument("--migrate", nargs="+", metavar="PROJECT", help="把项目从 --ip 服务器迁移到 --target-ip 服务器")
+    parser.add_argument("--target-ip", help="配合 --migrate 的目标服务器IP")
+    parser.add_argument("--target-address", help="源服务器访问目标服务器使用的地址（如内网IP），默认同 --target-ip")
+    parser.add_argument("--provision", metavar="ROSTER", help="按用户名单(CSV/JSON)在 --ip 和 --hosts 指定的服务器上并行开通用户")
+    parser.add_argument("--hosts", nargs="+", metavar="IP", help="配合 --provision 的其他服务器IP")
+    parser.add_argument("--mode", choices=["auto", "direct", "relay"],
+                        help="迁移方式：direct 服务器直连，relay 经本机中转，auto（默认）先直连失败再中转")
     
     args = parser.parse_args()
     
+    setup_logging()
     setup = QuickSetup()
     
-    if args.interactive or not any(vars(args).values()):
+    if args.browse:
+        # 浏览备份只读本地索引，不需要连接服务器
+        setup.backup_manager.browse_backup(args.browse, args.paths)
+        return
+    
+    if args.verify is not None:
+        for project_name in args.verify or [None]:
+            setup.backup_manager.verify_backups(project_name, test_decompress=args.decompress)
+        return
+    
+    if args.prune is not None:
+        # 保留策略只处理本地备份，不需要连接服务器
+        for project_name in args.prune or [None]:
+            setup.backup_manager.apply_retention(project_name, dry_run=args.dry_run)
+        return
+    
+    if args.provision:
+        # 自行连接每台服务器
+        hosts = ([args.ip] if args.ip else []) + (args.hosts or [])
+        if not hosts:
+            print("❌ 请用 --ip / --hosts 指定服务器")
+            return
+        setup.provision_users(args.provision, hosts, dry_run=args.dry_run)
+    elif args.interactive or not any(vars(args).values()):
         # 交互模式
         setup.interactive_mode()
     elif args.ip:
@@ -269,9 +411,25 @@ def main():
             setup.deploy_projects(args.projects if args.projects else None)
         elif args.backup is not None:
             setup.backup_projects(args.backup if args.backup else None)
+        elif args.scheduler:
+            setup.run_scheduler()
+        elif args.migrate:
+            if not args.target_ip:
+                print("❌ 请用 --target-ip 指定目标服务器")
+            else:
+                setup.migrate_projects(args.migrate, args.target_ip, args.mode or "auto", args.target_address)
+        elif args.restore:
+            if args.paths:
+                setup.backup_manager.restore_members(args.restore, setup.ssh_manager, args.paths)
+            else:
+                setup.backup_manager.restore_backup(args.restore, setup.ssh_manager)
     else:
         print("❌ 请提供服务器IP地址或使用 --interactive 模式")
         parser.print_help()
+        return
+    
+    metrics_file = get_registry().save()
+    print(f"📈 性能统计已保存: {metrics_file}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,7 +1,130 @@
 # user_logic.py
 
+import shlex
+import threading
+import time
+
 import paramiko
 
+from monitor.disk_index import DiskUsageIndex
+
+# 一次远程调用收集用户信息，每行输出 key=value
+# 有磁盘配额时直接读配额记录的用量（瞬间返回），否则由UserInfoService在后台用du统计并缓存
+_USER_INFO_SCRIPT = """u={user}
+home=$(getent passwd "$u" | cut -d: -f6)
+echo "home_dir=${{home:-/home/$u}}"
+echo "groups=$(id -nG "$u" 2>/dev/null)"
+echo "last_login=$(lastlog -u "$u" 2>/dev/null | tail -n +2)"
+if command -v quota >/dev/null 2>&1; then
+    echo "quota_kb=$(quota -w -f "${{home:-/home/$u}}" -u "$u" 2>/dev/null | awk 'NR > 2 && $2 ~ /^[0-9]/ {{ sub(/\\*$/, "", $2); print $2; exit }}')"
+fi
+"""
+
+# 低IO优先级统计目录大小（KB），不跨文件系统
+_DU_COMMAND = ("io=; command -v ionice >/dev/null 2>&1 && io='ionice -c3'; "
+               "nice -n 19 $io du -skx {path} 2>/dev/null | cut -f1")
+
+
+def format_kb(kb):
+    """KB数转为易读的大小"""
+    size = float(kb)
+    for unit in ['K', 'M', 'G', 'T']:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}P"
+
+
+class UserInfoService:
+    """
+    按用户收集信息（家目录、所属组、最近登录、磁盘用量）
+    除磁盘用量外的字段在一次SSH调用中取得；磁盘用量依次取 配额 > 缓存的du结果 > 服务器磁盘索引，
+    都没有时在后台低优先级重新统计，不阻塞调用方
+    参数：
+        ssh_manager: 已连接的SSHManager
+        max_age: du结果的缓存时间（秒）
+        on_update: on_update(username, info)，后台统计完成时在工作线程中调用
+        disk_index: DiskUsageIndex（可选）
+    """
+
+    def __init__(self, ssh_manager, max_age=600, on_update=None, disk_index=None):
+        self.ssh = ssh_manager
+        self.max_age = max_age
+        self.on_update = on_update
+        self.disk_index = disk_index
+        self._usage = {}          # {用户名: (统计时间, KB)}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _collect(self, username):
+        stdout, _, exit_status = self.ssh.execute_command(
+            "bash -c " + shlex.quote(_USER_INFO_SCRIPT.format(user=shlex.quote(username))))
+        if exit_status != 0 or stdout is None:
+            return None
+        fields = dict(line.split("=", 1) for line in stdout.splitlines() if "=" in line)
+        return {
+            'username': username,
+            'home_dir': fields.get('home_dir') or f'/home/{username}',
+            'groups': fields.get('groups', ''),
+            'last_login': fields.get('last_login') or "从未登录",
+            'quota_kb': int(fields['quota_kb']) if fields.get('quota_kb', '').isdigit() else None,
+        }
+
+    def _refresh_usage(self, username, home_dir, info):
+        try:
+            stdout, _, _ = self.ssh.execute_command(_DU_COMMAND.format(path=shlex.quote(home_dir)),
+                                                    timeout=3600)
+            if stdout and stdout.strip().isdigit():
+                with self._lock:
+                    self._usage[username] = (time.time(), int(stdout.strip()))
+                if self.on_update:
+                    self.on_update(username, self._apply_usage(dict(info)))
+        finally:
+            with self._lock:
+                self._refreshing.discard(username)
+
+    def _apply_usage(self, info):
+        """按 配额 > 缓存的du结果 > 磁盘索引 的顺序填入磁盘用量"""
+        if info['quota_kb'] is not None:
+            info['disk_usage'] = format_kb(info['quota_kb'])
+            info['disk_usage_source'] = 'quota'
+            return info
+        with self._lock:
+            cached = self._usage.get(info['username'])
+        indexed = self.disk_index.size(info['home_dir']) if self.disk_index and not cached else None
+        if cached:
+            info['disk_usage'] = format_kb(cached[1])
+            info['disk_usage_source'] = 'du'
+            info['disk_usage_age'] = time.time() - cached[0]
+        elif indexed is not None:
+            info['disk_usage'] = format_kb(indexed // 1024)
+            info['disk_usage_source'] = 'index'
+        else:
+            info['disk_usage'] = "统计中..."
+            info['disk_usage_source'] = None
+        return info
+
+    def invalidate(self, username):
+        """丢弃某个用户的du缓存（如删除了大量文件后）"""
+        with self._lock:
+            self._usage.pop(username, None)
+
+    def get(self, username):
+        """返回用户信息，失败返回None；磁盘用量可能来自缓存（见 disk_usage_source / disk_usage_age）"""
+        info = self._collect(username)
+        if info is None:
+            return None
+        info = self._apply_usage(info)
+
+        if info['disk_usage_source'] in ('du', None) and info.get('disk_usage_age', self.max_age) >= self.max_age:
+            with self._lock:
+                start = username not in self._refreshing
+                self._refreshing.add(username)
+            if start:
+                threading.Thread(target=self._refresh_usage, args=(username, info['home_dir'], info),
+                                 daemon=True).start()
+        return info
+
 class UserLogic:
     """
     用户模式的业务逻辑层
@@ -12,6 +135,7 @@ class UserLogic:
         # 保存当前登录用户的信息
         self.current_user = None
         self.current_ip = None
+        self.user_info = UserInfoService(ssh_manager, disk_index=DiskUsageIndex(ssh_manager))
 
     def check_user_and_key(self, ip, username, private_key_path=None):
         """
@@ -97,34 +221,15 @@ class UserLogic:
             return False, f"公钥上传出错: {str(e)}"
 
     def get_user_info(self):
-        """获取当前登录用户的信息"""
+        """获取当前登录用户的信息（见 UserInfoService）"""
         if not self.current_user or not self.current_ip:
             return None
             
         try:
-            # 获取用户详细信息
-            info = {
-                'username': self.current_user,
-                'ip': self.current_ip,
-                'home_dir': f'/home/{self.current_user}'
-            }
-            
-            # 获取磁盘使用情况
-            stdout, _, _ = self.ssh.execute_command(f"du -sh /home/{self.current_user}")
-            if stdout:
-                info['disk_usage'] = stdout.split()[0]
-                
-            # 获取所属组
-            stdout, _, _ = self.ssh.execute_command(f"groups {self.current_user}")
-            if stdout:
-                info['groups'] = stdout.strip()
-                
-            # 获取最后登录时间
-            stdout, _, _ = self.ssh.execute_command(f"lastlog -u {self.current_user}")
-            if stdout:
-                info['last_login'] = stdout.splitlines()[-1] if len(stdout.splitlines()) > 1 else "从未登录"
-                
+            info = self.user_info.get(self.current_user)
+            if info:
+                info['ip'] = self.current_ip
             return info
             
         except Exception:
-            return None
\ No newline at end of file
+            return None
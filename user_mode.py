@@ -1,7 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from user_logic import UserLogic
+from projects.workspace_manager import WorkspaceManager
 import os
+import threading
 import glob
 import json
 
@@ -303,10 +305,25 @@ class UserModePanel:
         ttk.Label(info_frame,
                  text=f"🌐 服务器: {self.logic.current_ip}",
                  font=("Arial", 12)).pack(side=tk.LEFT, padx=20)
+        self.disk_usage_var = tk.StringVar(value="💾 磁盘: 统计中...")
+        ttk.Label(info_frame, textvariable=self.disk_usage_var,
+                 font=("Arial", 12)).pack(side=tk.LEFT)
+        
+        # 磁盘用量可能在后台统计，完成后再刷新一次
+        self.logic.user_info.on_update = lambda _, info: self.root.after(0, self.show_user_info, info)
+        threading.Thread(target=lambda: self.root.after(0, self.show_user_info, self.logic.get_user_info()),
+                         daemon=True).start()
+        
+        # 终端和项目工作区分两个标签页
+        notebook = ttk.Notebook(main_frame)
+        notebook.pack(fill=tk.BOTH, expand=True, pady=10)
         
         # 创建终端区域
-        terminal_frame = ttk.LabelFrame(main_frame, text="🖥️ 终端", padding="10")
-        terminal_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        terminal_frame = ttk.Frame(notebook, padding="10")
+        notebook.add(terminal_frame, text="🖥️ 终端")
+        
+        # 项目工作区
+        self.setup_workspace_tab(notebook)
         
         # 终端输出
         self.terminal_output = tk.Text(terminal_frame, 
@@ -371,6 +388,89 @@ whoami
         """
         self.terminal_output.insert(tk.END, welcome_msg)
 
+    def show_user_info(self, info):
+        """在顶部信息栏显示磁盘用量"""
+        if info:
+            self.disk_usage_var.set(f"💾 磁盘: {info['disk_usage']}")
+    
+    def setup_workspace_tab(self, notebook):
+        """项目工作区标签页：/home/<用户>/projects 下的检出及其状态"""
+        self.workspace = WorkspaceManager(self.ssh_manager, self.github_manager, self.logic.current_user)
+        
+        workspace_frame = ttk.Frame(notebook, padding="10")
+        notebook.add(workspace_frame, text="📁 我的项目")
+        
+        columns = ("branch", "changes", "ahead", "behind")
+        self.workspace_tree = ttk.Treeview(workspace_frame, columns=columns, height=12)
+        self.workspace_tree.heading("#0", text="项目")
+        self.workspace_tree.heading("branch", text="分支")
+        self.workspace_tree.heading("changes", text="未提交更改")
+        self.workspace_tree.heading("ahead", text="领先")
+        self.workspace_tree.heading("behind", text="落后")
+        for column in columns:
+            self.workspace_tree.column(column, width=90, anchor=tk.CENTER)
+        self.workspace_tree.pack(fill=tk.BOTH, expand=True)
+        
+        btn_frame = ttk.Frame(workspace_frame)
+        btn_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(btn_frame, text="🔄 刷新状态",
+                   command=lambda: self.refresh_workspace(fetch=False)).pack(side=tk.LEFT)
+        ttk.Button(btn_frame, text="🌐 获取远端",
+                   command=lambda: self.refresh_workspace(fetch=True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="⬇️ 全部拉取", command=self.pull_workspace).pack(side=tk.LEFT)
+        
+        self.clone_var = tk.StringVar()
+        clone_combo = ttk.Combobox(btn_frame, textvariable=self.clone_var, state="readonly", width=25)
+        clone_combo['values'] = list(self.workspace.projects())
+        clone_combo.pack(side=tk.RIGHT)
+        ttk.Button(btn_frame, text="📥 检出项目", command=self.clone_workspace_project).pack(side=tk.RIGHT, padx=5)
+        
+        self.workspace_status_var = tk.StringVar(value="")
+        ttk.Label(workspace_frame, textvariable=self.workspace_status_var).pack(anchor=tk.W, pady=(5, 0))
+        
+        self.refresh_workspace(fetch=False)
+    
+    def _run_workspace_task(self, message, task, done=None):
+        """在后台线程执行工作区操作，完成后刷新状态"""
+        self.workspace_status_var.set(message)
+        
+        def worker():
+            result = task()
+            self.root.after(0, lambda: done(result) if done else self.refresh_workspace(fetch=False))
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def refresh_workspace(self, fetch=False):
+        self._run_workspace_task("⏳ 正在获取远端..." if fetch else "⏳ 正在读取状态...",
+                                 lambda: self.workspace.status(fetch=fetch), self._show_workspace_status)
+    
+    def _show_workspace_status(self, statuses):
+        self.workspace_tree.delete(*self.workspace_tree.get_children())
+        for name, status in sorted(statuses.items()):
+            changes = status["changed"] + status["untracked"]
+            self.workspace_tree.insert("", "end", text=name, values=(
+                status["branch"] or "-",
+                f"✏️ {changes}" if changes else "✅",
+                status["ahead"] if status["upstream"] else "-",
+                status["behind"] if status["upstream"] else "-"))
+        self.workspace_status_var.set(f"共 {len(statuses)} 个项目（{self.workspace.workspace_root}）")
+    
+    def pull_workspace(self):
+        def done(results):
+            failed = [name for name, (ok, _) in results.items() if not ok]
+            if failed:
+                messagebox.showwarning("拉取失败", "以下项目无法快进拉取，请在终端中处理:\n" + "\n".join(failed))
+            self.refresh_workspace(fetch=False)
+        
+        self._run_workspace_task("⏳ 正在拉取所有项目...", self.workspace.pull, done)
+    
+    def clone_workspace_project(self):
+        project_name = self.clone_var.get()
+        if not project_name:
+            messagebox.showwarning("提示", "请先选择要检出的项目")
+            return
+        self._run_workspace_task(f"⏳ 正在检出 {project_name}...", lambda: self.workspace.clone(project_name))
+
     def setup_user_main_ui(self):
         """设置用户主界面"""
         # 清除现有界面
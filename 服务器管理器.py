@@ -18,12 +18,12 @@ import configparser
 # 添加模块路径
 sys.path.append(str(Path(__file__).parent))
 
-from quick_setup import QuickSetup
-from connect.ssh_manager import SSHManager
-from connect.pem_handler import PEMHandler
-from projects.github_manager import GitHubManager
-from backup.backup_manager import BackupManager
-from user_mode import UserModePanel
+from monitor.log_sink import BatchedLogSink
+from monitor.logging_setup import setup_logging, install_gui_handler
+from monitor.metrics import get_registry, format_duration
+
+# 业务模块（paramiko、各管理器、用户模式面板）都在首次使用时再导入，
+# 保证模式选择界面尽快出现
 
 class ServerManagerGUI:
     def __init__(self, root):
@@ -35,12 +35,14 @@ class ServerManagerGUI:
         self.config = configparser.ConfigParser()
         self.load_config()
         
-        # 初始化管理器
-        self.quick_setup = QuickSetup()
-        self.ssh_manager = SSHManager()
-        self.pem_handler = PEMHandler()
-        self.github_manager = GitHubManager()
-        self.backup_manager = BackupManager()
+        # 管理器按需创建，见下方的属性
+        self._managers = {}
+        
+        # 日志批量刷新到当前界面的日志控件
+        self.log_sink = BatchedLogSink(self.root, lambda: getattr(self, "log_text", None))
+        self.log_sink.start()
+        # 各模块INFO及以上的日志同时显示在日志面板（只显示，日志文件由根logger写入，避免重复）
+        install_gui_handler(self.log_sink.display)
         
         # 状态变量
         self.connected = False
@@ -50,6 +52,70 @@ class ServerManagerGUI:
         # 设置初始模式选择UI
         self.setup_mode_selection()
         
+    def _get_manager(self, name, factory):
+        """首次访问时创建管理器并缓存"""
+        manager = self._managers.get(name)
+        if manager is None:
+            manager = factory()
+            self._managers[name] = manager
+        return manager
+    
+    @property
+    def ssh_manager(self):
+        def create():
+            from connect.ssh_manager import SSHManager
+            return SSHManager()
+        return self._get_manager("ssh", create)
+    
+    @property
+    def pem_handler(self):
+        def create():
+            from connect.pem_handler import PEMHandler
+            return PEMHandler()
+        return self._get_manager("pem", create)
+    
+    @property
+    def github_manager(self):
+        def create():
+            from projects.github_manager import GitHubManager
+            return GitHubManager()
+        return self._get_manager("github", create)
+    
+    @property
+    def backup_manager(self):
+        def create():
+            from backup.backup_manager import BackupManager
+            return BackupManager()
+        return self._get_manager("backup", create)
+    
+    @property
+    def disk_index(self):
+        def create():
+            from monitor.disk_index import DiskUsageIndex
+            return DiskUsageIndex(self.ssh_manager)
+        return self._get_manager("disk_index", create)
+    
+    @property
+    def quick_setup(self):
+        def create():
+            from quick_setup import QuickSetup
+            # 与GUI共用同一套管理器和SSH连接
+            return QuickSetup(ssh_manager=self.ssh_manager,
+                              github_manager=self.github_manager,
+                              backup_manager=self.backup_manager)
+        return self._get_manager("quick_setup", create)
+    
+    def _create_user_panel(self):
+        """创建用户模式面板"""
+        from user_mode import UserModePanel
+        self.user_panel = UserModePanel(
+            self.root,
+            self.ssh_manager,
+            self.github_manager,
+            self.backup_manager,
+            self.log
+        )
+    
     def load_config(self):
         """加载配置文件"""
         config_file = Path("config/server_config.ini")
@@ -124,13 +190,7 @@ class ServerManagerGUI:
             # 用户模式：直接进入UserModePanel，不显示PEM和连接界面
             for widget in self.root.winfo_children():
                 widget.destroy()
-            self.user_panel = UserModePanel(
-                self.root,
-                self.ssh_manager,
-                self.github_manager,
-                self.backup_manager,
-                self.log
-            )
+            self._create_user_panel()
     
     def setup_connection_ui(self):
         """设置连接服务器界面"""
@@ -204,13 +264,7 @@ class ServerManagerGUI:
                 for widget in self.root.winfo_children():
                     widget.destroy()
                 # 创建用户模式面板
-                self.user_panel = UserModePanel(
-                    self.root,
-                    self.ssh_manager,
-                    self.github_manager,
-                    self.backup_manager,
-                    self.log
-                )
+                self._create_user_panel()
     
     def connect_server(self):
         """连接到服务器"""
@@ -224,6 +278,8 @@ class ServerManagerGUI:
             return False
             
         self.current_ip = ip
+        # 磁盘索引缓存的是上一台服务器的数据，换服务器后重新加载
+        self._managers.pop("disk_index", None)
         self.log(f"🔄 正在连接到服务器 {ip}...")
         
         try:
@@ -276,6 +332,8 @@ class ServerManagerGUI:
         user_btn_frame.pack(fill=tk.X, pady=(10, 0))
         ttk.Button(user_btn_frame, text="➕ 创建用户",
                   command=self.create_new_user).pack(side=tk.LEFT, padx=5)
+        ttk.Button(user_btn_frame, text="📋 批量开通",
+                  command=self.bulk_provision_users).pack(side=tk.LEFT, padx=5)
         ttk.Button(user_btn_frame, text="❌ 删除用户",
                   command=self.delete_user).pack(side=tk.LEFT, padx=5)
         ttk.Button(user_btn_frame, text="🔄 刷新列表",
@@ -315,6 +373,9 @@ class ServerManagerGUI:
         self.refresh_system_info()
         # 新增：命令行弹窗按钮
         ttk.Button(right_frame, text="打开命令行窗口", command=self.open_cli_window).pack(pady=10)
+        ttk.Button(right_frame, text="📈 性能统计", command=self.open_stats_window).pack()
+        ttk.Button(right_frame, text="📡 多服务器监控", command=self.open_dashboard_window).pack(pady=(5, 0))
+        ttk.Button(right_frame, text="🛡️ 备份校验", command=self.open_verify_window).pack(pady=(5, 0))
     
     def open_cli_window(self):
         """弹出命令行窗口，支持回车执行"""
@@ -342,6 +403,226 @@ class ServerManagerGUI:
         ttk.Button(cli_win, text="执行", command=run_cmd).pack(pady=5)
         input_entry.focus_set()
     
+    def open_stats_window(self):
+        """弹出性能统计窗口，显示各操作的耗时分位数和传输量"""
+        stats_win = tk.Toplevel(self.root)
+        stats_win.title("📈 性能统计")
+        stats_win.geometry("900x450")
+        
+        columns = ("count", "errors", "p50", "p95", "p99", "max", "bytes", "throughput")
+        headings = ("次数", "失败", "P50", "P95", "P99", "最大", "传输量", "吞吐")
+        tree = ttk.Treeview(stats_win, columns=columns, show="tree headings")
+        tree.heading("#0", text="操作 / 主机")
+        tree.column("#0", width=220)
+        for col, text in zip(columns, headings):
+            tree.heading(col, text=text)
+            tree.column(col, width=75, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def row_values(summary):
+            if not summary.get("count"):
+                return ("0", "0", "-", "-", "-", "-", "-", "-")
+            throughput = summary.get("throughput_bps")
+            return (summary["count"], summary["errors"],
+                    format_duration(summary["p50"]), format_duration(summary["p95"]),
+                    format_duration(summary["p99"]), format_duration(summary["max"]),
+                    self._format_size(summary["bytes"]) if summary["bytes"] else "-",
+                    f"{self._format_size(throughput)}/s" if throughput else "-")
+        
+        def refresh():
+            for item in tree.get_children():
+                tree.delete(item)
+            snapshot = get_registry().snapshot()
+            for op, summary in snapshot["operations"].items():
+                parent = tree.insert("", "end", text=op, values=row_values(summary), open=False)
+                for host, host_ops in snapshot["hosts"].items():
+                    if op in host_ops:
+                        tree.insert(parent, "end", text=f"  {host}", values=row_values(host_ops[op]))
+        
+        def export():
+            path = get_registry().save()
+            self.log(f"✅ 性能统计已导出: {path}")
+        
+        def reset():
+            get_registry().reset()
+            refresh()
+        
+        btn_frame = ttk.Frame(stats_win)
+        btn_frame.pack(pady=(0, 10))
+        ttk.Button(btn_frame, text="🔄 刷新", command=refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="💾 导出", command=export).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="🧹 清零", command=reset).pack(side=tk.LEFT, padx=5)
+        refresh()
+    
+    def open_dashboard_window(self):
+        """弹出多服务器监控窗口，按连接预设并发轮询所有服务器"""
+        from monitor.health_poller import HealthPoller
+        
+        dash_win = tk.Toplevel(self.root)
+        dash_win.title("📡 多服务器监控")
+        dash_win.geometry("1100x450")
+        
+        columns = ("status", "cpu", "load", "mem", "disk", "containers", "users", "sessions", "latency", "updated")
+        headings = ("状态", "CPU", "负载", "内存", "磁盘", "容器(运行/全部)", "用户", "在线", "延迟", "更新时间")
+        # 排序时各列取用的值
+        sort_keys = {
+            "status": lambda h: h.get("ok", False),
+            "cpu": lambda h: h.get("cpu_percent", -1),
+            "load": lambda h: h.get("load", -1),
+            "mem": lambda h: h.get("mem_percent", -1),
+            "disk": lambda h: h.get("disk_percent", -1),
+            "containers": lambda h: h.get("containers_running", -1),
+            "users": lambda h: h.get("users", -1),
+            "sessions": lambda h: h.get("sessions", -1),
+            "latency": lambda h: h.get("latency") or float("inf"),
+            "updated": lambda h: h.get("polled_at").timestamp() if h.get("polled_at") else 0,
+        }
+        tree = ttk.Treeview(dash_win, columns=columns, show="tree headings")
+        tree.heading("#0", text="服务器", command=lambda: sort_by("#0"))
+        tree.column("#0", width=200)
+        for col, text in zip(columns, headings):
+            tree.heading(col, text=text, command=lambda c=col: sort_by(c))
+            tree.column(col, width=85, anchor=tk.E)
+        tree.tag_configure("down", foreground="red")
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        health_by_host = {}
+        sort_state = {"column": None, "reverse": False}
+        
+        def percent(value):
+            return "-" if value is None else f"{value:.0f}%"
+        
+        def row_values(health):
+            if not health.get("ok"):
+                return (f"❌ {health.get('error') or ''}",) + ("-",) * 8 + (
+                    health["polled_at"].strftime("%H:%M:%S") if health.get("polled_at") else "-",)
+            containers = (f"{health['containers_running']}/{health['containers_total']}"
+                          if "containers_total" in health else "-")
+            load = f"{health['load']:.2f}/{health.get('cores', '?')}" if "load" in health else "-"
+            return ("✅ 在线", percent(health.get("cpu_percent")), load,
+                    percent(health.get("mem_percent")), percent(health.get("disk_percent")),
+                    containers, health.get("users", "-"), health.get("sessions", "-"),
+                    format_duration(health.get("latency")), health["polled_at"].strftime("%H:%M:%S"))
+        
+        def apply_sort():
+            column = sort_state["column"]
+            if column is None:
+                return
+            if column == "#0":
+                ordered = sorted(health_by_host, reverse=sort_state["reverse"])
+            else:
+                ordered = sorted(health_by_host, key=lambda name: sort_keys[column](health_by_host[name]),
+                                 reverse=sort_state["reverse"])
+            for index, name in enumerate(ordered):
+                tree.move(name, "", index)
+        
+        def sort_by(column):
+            if sort_state["column"] == column:
+                sort_state["reverse"] = not sort_state["reverse"]
+            else:
+                sort_state["column"], sort_state["reverse"] = column, column not in ("#0", "latency")
+            apply_sort()
+        
+        def update_row(name, health):
+            if not dash_win.winfo_exists():
+                return
+            health_by_host[name] = health
+            tree.item(name, values=row_values(health), tags=() if health.get("ok") else ("down",))
+            apply_sort()
+        
+        poller = HealthPoller.from_config(
+            on_update=lambda name, health: self.root.after(0, update_row, name, health))
+        if not poller.presets:
+            dash_win.destroy()
+            messagebox.showinfo("提示", "没有保存的连接预设")
+            return
+        for name, preset in poller.presets.items():
+            tree.insert("", "end", iid=name, text=f"{name} ({preset.get('user', 'root')}@{preset['ip']})",
+                        values=("⏳ 连接中",) + ("-",) * 9)
+            health_by_host[name] = {}
+        
+        btn_frame = ttk.Frame(dash_win)
+        btn_frame.pack(pady=(0, 10))
+        ttk.Label(btn_frame, text="轮询间隔(秒):").pack(side=tk.LEFT)
+        interval_var = tk.IntVar(value=poller.interval)
+        
+        def set_interval(*_):
+            try:
+                poller.interval = max(5, int(interval_var.get()))
+            except (tk.TclError, ValueError):
+                pass
+        
+        interval_var.trace_add("write", set_interval)
+        ttk.Spinbox(btn_frame, from_=5, to=3600, increment=5, textvariable=interval_var,
+                    width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="🔄 立即刷新",
+                   command=lambda: threading.Thread(target=poller.poll_once, daemon=True).start()
+                   ).pack(side=tk.LEFT, padx=5)
+        
+        def on_close():
+            # 停止轮询要等待在途的采集，放到后台线程，避免界面卡住
+            threading.Thread(target=poller.stop, daemon=True).start()
+            dash_win.destroy()
+        
+        dash_win.protocol("WM_DELETE_WINDOW", on_close)
+        poller.start()
+    
+    def open_verify_window(self):
+        """弹出备份校验窗口，显示每个备份的完整性状态并可在后台重新校验"""
+        verify_win = tk.Toplevel(self.root)
+        verify_win.title("🛡️ 备份校验")
+        verify_win.geometry("900x450")
+        
+        status_text = {"ok": "✅ 正常", "corrupt": "❌ 损坏", "missing": "❌ 缺失",
+                       "unverified": "❔ 未校验", None: "❔ 未校验"}
+        columns = ("type", "date", "size", "status", "verified_at", "error")
+        headings = ("类型", "时间", "大小", "状态", "校验时间", "说明")
+        tree = ttk.Treeview(verify_win, columns=columns, show="tree headings")
+        tree.heading("#0", text="项目")
+        tree.column("#0", width=140)
+        for col, text in zip(columns, headings):
+            tree.heading(col, text=text)
+            tree.column(col, width=110)
+        tree.column("error", width=220)
+        tree.tag_configure("bad", foreground="red")
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def refresh():
+            for item in tree.get_children():
+                tree.delete(item)
+            for backup in self.backup_manager.catalog.list():
+                status = backup.get("verify_status")
+                tree.insert("", "end", text=backup["project_name"],
+                            tags=("bad",) if status in ("corrupt", "missing") else (),
+                            values=(backup["backup_type"], backup["timestamp"],
+                                    self._format_size(backup["size"]),
+                                    status_text.get(status, status),
+                                    (backup.get("verified_at") or "-")[:19],
+                                    backup.get("verify_error") or ""))
+        
+        decompress_var = tk.BooleanVar(value=False)
+        
+        def start():
+            scrub_btn.config(state=tk.DISABLED)
+            self.log("🛡️ 开始后台校验备份...")
+            
+            def done(results):
+                bad = sum(1 for r in results.values() if r["status"] in ("corrupt", "missing"))
+                self.log(f"{'⚠️' if bad else '✅'} 备份校验完成: {len(results)} 个，异常 {bad} 个")
+                self.root.after(0, lambda: (refresh(), scrub_btn.config(state=tk.NORMAL))
+                                if verify_win.winfo_exists() else None)
+            
+            self.backup_manager.verify_backups(test_decompress=decompress_var.get(),
+                                               background=True, on_done=done)
+        
+        btn_frame = ttk.Frame(verify_win)
+        btn_frame.pack(pady=(0, 10))
+        ttk.Button(btn_frame, text="🔄 刷新", command=refresh).pack(side=tk.LEFT, padx=5)
+        scrub_btn = ttk.Button(btn_frame, text="🛡️ 开始校验", command=start)
+        scrub_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(btn_frame, text="解压测试", variable=decompress_var).pack(side=tk.LEFT, padx=5)
+        refresh()
+    
     def on_user_select(self, event):
         """选中用户时，显示详细信息（项目列表、空间使用）"""
         selection = self.user_tree.selection()
@@ -349,7 +630,12 @@ class ServerManagerGUI:
             return
         username = self.user_tree.item(selection[0])["text"]
         projects, _, _ = self.ssh_manager.execute_command(f"ls /home/{username}/projects")
-        disk, _, _ = self.ssh_manager.execute_command(f"du -sh /home/{username}")
+        # 空间使用优先查磁盘索引，没有索引时才做du
+        indexed = self.disk_index.user_usage(username)
+        if indexed is not None:
+            disk = f"{self._format_size(indexed)}（索引，{self.disk_index.age / 3600:.1f}小时前）"
+        else:
+            disk, _, _ = self.ssh_manager.execute_command(f"du -sh /home/{username}")
         # 获取SSH公钥内容
         pubkey, _, _ = self.ssh_manager.execute_command(f"cat /home/{username}/.ssh/authorized_keys")
         pubkey_status = "未上传"
@@ -560,50 +846,29 @@ class ServerManagerGUI:
             preview = f"确认创建以下用户：\n\n用户名: {username}\n磁盘配额: {disk_quota_var.get()} GB\nsudo权限: {'是' if sudo_var.get() else '否'}\nDocker权限: 是\nSSH公钥: {'已上传' if sshkey_file else '未上传'}\n\n是否确认创建？"
             if not messagebox.askyesno("确认创建", preview):
                 return
-            commands = [
-                f"useradd -m -s /bin/bash {username}",
-                f"echo '{username}:{password}' | chpasswd",
-                f"mkdir -p /home/{username}/.ssh",
-                f"touch /home/{username}/.ssh/authorized_keys",
-                f"chmod 700 /home/{username}/.ssh",
-                f"chmod 600 /home/{username}/.ssh/authorized_keys",
-                f"chown -R {username}:{username} /home/{username}/.ssh",
-                f"chown {username}:{username} /home/{username}",
-                f"chmod 755 /home/{username}",
-                f"usermod -aG docker {username}"
-            ]
-            if sudo_var.get():
-                commands.append(f"usermod -aG sudo {username}")
-            quota_kb = int(disk_quota_var.get()) * 1024 * 1024
-            commands.append(f"setquota -u {username} {quota_kb} {quota_kb} 0 0 /")
-            success = True
-            for cmd in commands:
-                _, stderr, exit_code = self.ssh_manager.execute_command(f"sudo {cmd}")
-                if exit_code != 0:
-                    if "useradd" in cmd and "already exists" in stderr:
-                        messagebox.showwarning("用户已存在", f"用户 {username} 已存在！")
-                        self.log(f"⚠️ 用户 {username} 已存在")
-                        dialog.destroy()
-                        return
-                    if "setquota" in cmd and ("not found" in stderr or "未找到" in stderr):
-                        messagebox.showwarning("未安装setquota", "服务器未安装setquota，磁盘配额未生效。可用 sudo apt install quota 安装。")
-                        self.log("⚠️ 服务器未安装setquota，磁盘配额未生效")
-                        continue
-                    self.log(f"❌ 命令执行失败: {cmd}")
-                    self.log(f"错误信息: {stderr}")
-                    success = False
-                    break
-            # 如果上传了ssh key文件，自动写入authorized_keys
-            if sshkey_file and success:
+            from provision.user_provisioner import UserProvisioner, UserSpec, format_report
+            pubkeys = []
+            if sshkey_file:
                 with open(sshkey_file, 'r') as f:
-                    pubkey = f.read().strip()
-                cmd = f"echo '{pubkey}' > /home/{username}/.ssh/authorized_keys && chown {username}:{username} /home/{username}/.ssh/authorized_keys && chmod 600 /home/{username}/.ssh/authorized_keys"
-                _, stderr, exit_code = self.ssh_manager.execute_command(f"sudo {cmd}")
-                if exit_code == 0:
-                    self.log(f"✅ SSH公钥已写入 {username} 用户")
-                else:
-                    self.log(f"❌ SSH公钥写入失败: {stderr}")
-            if success:
+                    pubkeys = [line.strip() for line in f if line.strip()]
+            spec = UserSpec(username, pubkeys=pubkeys, password=password, sudo=sudo_var.get(),
+                            quota_gb=int(disk_quota_var.get()))
+            try:
+                spec.validate()
+            except ValueError as e:
+                messagebox.showerror("错误", str(e))
+                return
+            # 所有步骤编译成一个脚本一次执行，已存在的用户只补齐缺少的配置
+            report = UserProvisioner().provision_host(self.ssh_manager, [spec])
+            for line in format_report({self.ssh_manager.ip_address: report}).splitlines():
+                self.log(line)
+            errors = report["errors"].get(username, [])
+            if any("未安装setquota" in message for message in errors):
+                messagebox.showwarning("未安装setquota", "服务器未安装setquota，磁盘配额未生效。可用 sudo apt install quota 安装。")
+            elif not errors and report["error"] is None and "创建用户" not in report["changes"].get(username, []):
+                messagebox.showwarning("用户已存在", f"用户 {username} 已存在，已按当前设置补齐配置（不修改密码）")
+            # 脚本总是以0退出，单个步骤的失败记录在errors中，ok已包含这两者
+            if report["ok"]:
                 self.log(f"✅ 用户 {username} 创建成功")
                 self.refresh_user_list()
                 dialog.destroy()
@@ -613,6 +878,44 @@ class ServerManagerGUI:
         dialog.grab_set()
         dialog.wait_window()
     
+    def bulk_provision_users(self):
+        """按用户名单(CSV/JSON)批量开通：先预演显示变更，确认后一次执行"""
+        from provision.user_provisioner import UserProvisioner, format_report, load_roster
+        roster_file = filedialog.askopenfilename(title="选择用户名单",
+                                                 filetypes=[("用户名单", "*.csv *.json"), ("所有文件", "*.*")])
+        if not roster_file:
+            return
+        try:
+            specs = load_roster(roster_file)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"读取用户名单失败: {e}")
+            return
+        
+        provisioner = UserProvisioner()
+        host = self.ssh_manager.ip_address
+        
+        def apply():
+            report = provisioner.provision_host(self.ssh_manager, specs)
+            self.log(format_report({host: report}))
+            self.root.after(0, self.refresh_user_list)
+        
+        def preview():
+            plan = provisioner.provision_host(self.ssh_manager, specs, dry_run=True)
+            text = format_report({host: plan}, dry_run=True)
+            
+            def confirm():
+                if plan["error"] is not None:
+                    messagebox.showerror("错误", text)
+                elif not plan["changes"]:
+                    messagebox.showinfo("批量开通", text)
+                elif messagebox.askyesno("确认批量开通", text + "\n\n是否执行？"):
+                    threading.Thread(target=apply, daemon=True).start()
+            
+            self.root.after(0, confirm)
+        
+        self.log(f"👥 预演开通 {len(specs)} 个用户...")
+        threading.Thread(target=preview, daemon=True).start()
+    
     def delete_user(self):
         """删除选中的用户"""
         selection = self.user_tree.selection()
@@ -907,11 +1210,12 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
         left_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 10))
         
         # 备份树形视图
-        self.backup_tree = ttk.Treeview(left_frame, columns=("type", "size", "date"), show="tree headings", height=15)
+        self.backup_tree = ttk.Treeview(left_frame, columns=("type", "size", "date", "verify"), show="tree headings", height=15)
         self.backup_tree.heading("#0", text="项目")
         self.backup_tree.heading("type", text="类型")
         self.backup_tree.heading("size", text="大小")
         self.backup_tree.heading("date", text="日期")
+        self.backup_tree.heading("verify", text="校验")
         
         self.backup_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
@@ -1000,15 +1304,8 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
         status_frame.columnconfigure(1, weight=1)
     
     def log(self, message):
-        """添加日志消息"""
-        self.root.after(0, self._log_message, message)
-    
-    def _log_message(self, message):
-        """在主线程中添加日志消息"""
-        if self.log_text:
-            self.log_text.insert(tk.END, f"{message}\n")
-            self.log_text.see(tk.END)
-            self.root.update()
+        """添加日志消息（可在任意线程调用，由log_sink批量刷新到界面）"""
+        self.log_sink.write(message)
     
     def auto_find_pem(self):
         """自动查找PEM文件"""
@@ -1200,6 +1497,8 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
             return False
             
         self.current_ip = ip
+        # 磁盘索引缓存的是上一台服务器的数据，换服务器后重新加载
+        self._managers.pop("disk_index", None)
         self.log(f"🔄 正在连接到服务器 {ip}...")
         
         try:
@@ -1401,7 +1700,8 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
             date_str = backup['timestamp']
             
             self.backup_tree.insert("", "end", text=backup['project_name'],
-                                  values=(backup['backup_type'], size_str, date_str))
+                                  values=(backup['backup_type'], size_str, date_str,
+                                          backup.get('verify_status') or "unverified"))
         
         # 更新备份统计
         self.update_backup_stats()
@@ -1473,6 +1773,10 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
         for backup_type, count in stats['backup_types'].items():
             stats_text += f"  {backup_type}: {count}个\n"
         
+        stats_text += "\n🛡️ 校验状态:\n"
+        for status, count in stats.get('verify_status', {}).items():
+            stats_text += f"  {status}: {count}个\n"
+        
         self.stats_text.insert(1.0, stats_text)
     
     # 系统状态检查方法
@@ -1515,6 +1819,20 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
             self.log(stdout)
         else:
             self.log("❌ 获取磁盘信息失败")
+        
+        # 最大的目录来自服务器上的磁盘索引
+        top = self.disk_index.top(15)
+        if top:
+            self.log(f"📇 最大的目录（索引生成于 {self.disk_index.age / 3600:.1f}小时前）:")
+            for path, size in top:
+                self.log(f"   {self._format_size(size):>10}  {path}")
+        elif not self.disk_index.is_installed():
+            if messagebox.askyesno("磁盘索引", "服务器上还没有磁盘用量索引，是否安装？\n"
+                                   "（每6小时以最低IO优先级统计一次 /home，需要root权限）"):
+                self.disk_index.install()
+        else:
+            self.log("⏳ 磁盘索引尚未生成或已过期，已在后台重新生成")
+            self.disk_index.refresh()
     
     def get_system_info(self):
         """获取系统信息"""
@@ -1532,7 +1850,7 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
     # 日志管理方法
     def clear_log(self):
         """清空日志"""
-        self.log_text.delete(1.0, tk.END)
+        self.log_sink.clear()
     
     def save_log(self):
         """保存日志"""
@@ -1541,8 +1859,8 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
             filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")])
         if filename:
             try:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(self.log_text.get(1.0, tk.END))
+                # 界面只保留最近的日志，导出本次运行的完整记录
+                self.log_sink.export(filename)
                 messagebox.showinfo("成功", f"日志已保存到: {filename}")
             except Exception as e:
                 messagebox.showerror("错误", f"保存日志失败: {e}")
@@ -1571,6 +1889,7 @@ CPU核心：{info.get('cpu_cores', 'N/A')}
 def main():
     """主函数"""
     try:
+        setup_logging()
         root = tk.Tk()
         app = ServerManagerGUI(root)
         
@@ -1583,6 +1902,7 @@ def main():
         app.log("")
         
         root.mainloop()
+        get_registry().save()
         
     except Exception as e:
         print(f"❌ 程序启动失败: {e}")